@@ -0,0 +1,105 @@
+import logging
+import threading
+
+import numpy as np
+
+# Backends import their runtime lazily, so a TFLite or ONNX deployment never pulls in
+# the full TensorFlow package.
+
+
+class KerasBackend:
+    """The original model_optimal.h5 through tensorflow.keras."""
+    name = "keras"
+
+    def __init__(self, model_path: str):
+        from tensorflow.keras.models import load_model
+        self.model = load_model(model_path)
+        self.precision = "float32"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0) # verbose=0 for less console output
+
+
+class TFLiteBackend:
+    """A .tflite export, run by tflite_runtime if installed, else by tf.lite."""
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # The interpreter is stateful (tensors are reused between calls), so calls are serialized
+        self._lock = threading.Lock()
+        self.precision = self._detect_precision()
+
+    def _detect_precision(self) -> str:
+        """Returns "int8" for fully quantized models, "dynamic-int8" for int8 weights with float I/O, else "float32"."""
+        if np.dtype(self._input["dtype"]) in (np.int8, np.uint8):
+            return "int8"
+        if any(np.dtype(t["dtype"]) == np.int8 for t in self.interpreter.get_tensor_details()):
+            return "dynamic-int8"
+        return "float32"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if len(batch) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], [len(batch), *self._input["shape"][1:]])
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = len(batch)
+            input_dtype = np.dtype(self._input["dtype"])
+            if input_dtype in (np.int8, np.uint8):
+                # Full-integer model: quantize the [0, 1] input with the tensor's own scale/zero point
+                scale, zero_point = self._input["quantization"]
+                info = np.iinfo(input_dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+            self.interpreter.set_tensor(self._input["index"], batch.astype(input_dtype, copy=False))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output["index"]).copy()
+            if np.dtype(self._output["dtype"]) in (np.int8, np.uint8):
+                scale, zero_point = self._output["quantization"]
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output
+
+
+class ONNXBackend:
+    """An .onnx export run by onnxruntime on the CPU."""
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+        self.precision = "float32"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    ONNXBackend.name: ONNXBackend,
+}
+
+
+def load_backend(name: str, model_path: str, num_threads: int = None):
+    """Instantiates the inference backend called `name` ("keras", "tflite" or "onnx")."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {sorted(BACKENDS)}.")
+    if name == KerasBackend.name:
+        backend = KerasBackend(model_path)
+    else:
+        backend = BACKENDS[name](model_path, num_threads=num_threads)
+    logging.info(f"Loaded {name} model backend ({backend.precision}) from {model_path}")
+    return backend
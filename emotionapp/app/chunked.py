@@ -0,0 +1,187 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import cv2
+
+from . import config
+from .processing import load_resources
+from .datalogger import log_emotion_data
+from .video import process_video, run_sequential_loop, PROCESS_EVERY_N_FRAMES, VideoCancelled
+
+logger = logging.getLogger(__name__)
+
+_chunk_pool = None
+_chunk_pool_lock = threading.Lock()
+_CANCEL_POLL_S = 0.5 # How often should_stop() is checked while waiting for a chunk
+
+
+def _get_chunk_pool() -> ProcessPoolExecutor:
+    """Shared pool: every worker process loads its own model and CascadeClassifier once."""
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            _chunk_pool = ProcessPoolExecutor(
+                max_workers=config.CHUNK_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=load_resources,
+            )
+            logger.info(f"Started chunk process pool with {config.CHUNK_WORKERS} workers.")
+        return _chunk_pool
+
+
+def shutdown_chunk_pool():
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is not None:
+            _chunk_pool.shutdown(wait=False, cancel_futures=True)
+            _chunk_pool = None
+
+
+def plan_chunks(total_frames: int, num_chunks: int, process_every_n: int):
+    """
+    Splits [0, total_frames) into frame ranges whose starts (except the first) are
+    processed frames of the every-Nth-frame cadence. A chunk therefore never needs the
+    previous chunk's detections, and its output matches the single-process loop.
+    """
+    starts = [0]
+    for k in range(1, num_chunks):
+        target = k * total_frames // num_chunks
+        # 0-based index s is processed when (s + 1) % N == 0
+        start = ((target + 1) // process_every_n) * process_every_n - 1
+        if start > starts[-1]:
+            starts.append(start)
+    ends = starts[1:] + [total_frames]
+    return list(zip(starts, ends))
+
+
+def _seek_before(cap, start: int, fps: float) -> bool:
+    """
+    Positions cap so that the next read() returns frame `start`, and checks it: the frame
+    before it is grabbed and its timestamp compared with (start - 1) / fps. CAP_PROP_POS_FRAMES
+    only echoes the requested index, even when the demuxer landed on a nearby keyframe.
+    Returns False if the capture ended up elsewhere.
+    """
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start - 1)
+    if not cap.grab():
+        return False
+    expected_ms = (start - 1) / fps * 1000.0
+    return abs(cap.get(cv2.CAP_PROP_POS_MSEC) - expected_ms) <= 500.0 / fps # Within half a frame
+
+
+def _process_chunk(input_path: str, chunk_path: str, start: int, end: int, video_filename: str, fps: float, frame_size):
+    """
+    Worker-process entry point: processes frames [start, end) into chunk_path.
+    Returns (frames_written, [(frame_count, detections), ...]) so the parent can log in order.
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_filename}")
+    if start > 0 and not _seek_before(cap, start, fps):
+        # Some containers (and variable frame rate videos) cannot seek frame-accurately; fall back to skipping
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(start):
+            if not cap.grab():
+                break
+
+    out_writer = cv2.VideoWriter(chunk_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, tuple(frame_size))
+    detections_by_frame = []
+    try:
+        frames_written = run_sequential_loop(
+            cap, out_writer, video_filename, total_frames=0, progress_callback=None,
+            start_index=start, max_frames=end - start,
+            on_detections=lambda frame_count, detections: detections_by_frame.append((frame_count, detections)),
+        )
+    finally:
+        cap.release()
+        out_writer.release()
+    return frames_written, detections_by_frame
+
+
+def _concatenate(chunk_paths, output_path: str, fps: float, frame_size):
+    """Joins the chunk mp4s losslessly with ffmpeg if available, else by re-encoding with OpenCV."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is not None:
+        list_path = output_path + ".chunks.txt"
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in chunk_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run(
+                [ffmpeg, "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+                 "-c", "copy", "-f", "mp4", output_path],
+                check=True, capture_output=True,
+            )
+            return
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"ffmpeg concat failed ({e.stderr.decode(errors='replace').strip()}), re-encoding instead.")
+        finally:
+            os.remove(list_path)
+
+    out_writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, tuple(frame_size))
+    try:
+        for path in chunk_paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out_writer.write(frame)
+            cap.release()
+    finally:
+        out_writer.release()
+
+
+def process_video_chunked(input_path: str, output_path: str, video_filename: str, total_frames: int,
+                          fps: float, frame_size, progress_callback=None, timeline=None, should_stop=None) -> int:
+    """
+    Processes a video as frame-range chunks on the shared process pool and concatenates
+    the partial outputs into output_path. Short videos (or an unknown frame count) fall
+    back to the sequential loop, with the same fixed cadence as the chunks (no tracking).
+    Progress is reported as chunks complete. should_stop() is polled while waiting for
+    chunks; when it returns True the chunks not started yet are cancelled (running ones
+    finish in their worker) and VideoCancelled is raised.
+    Returns the number of frames written.
+    """
+    num_chunks = min(config.CHUNK_WORKERS, total_frames // max(config.CHUNK_MIN_FRAMES, 1))
+    chunks = plan_chunks(total_frames, num_chunks, PROCESS_EVERY_N_FRAMES) if num_chunks > 1 else []
+    if len(chunks) <= 1:
+        logger.info(f"Video '{video_filename}' too short to split ({total_frames} frames), processing in one piece.")
+        return process_video(input_path, output_path, video_filename, progress_callback, engine="sequential",
+                             timeline=timeline, tracking=False, should_stop=should_stop)
+
+    logger.info(f"Processing video '{video_filename}' as {len(chunks)} chunks: {chunks}")
+    pool = _get_chunk_pool()
+    with tempfile.TemporaryDirectory(prefix="chunks_", dir=os.path.dirname(os.path.abspath(output_path)),
+                                     ignore_cleanup_errors=True) as chunk_dir:
+        chunk_paths = [os.path.join(chunk_dir, f"chunk_{i:04d}.mp4") for i in range(len(chunks))]
+        futures = [
+            pool.submit(_process_chunk, input_path, chunk_path, start, end, video_filename, fps, frame_size)
+            for chunk_path, (start, end) in zip(chunk_paths, chunks)
+        ]
+
+        frames_written = 0
+        for future in futures: # In chunk order, so detections are logged in frame order
+            while not wait([future], timeout=_CANCEL_POLL_S).done:
+                if should_stop is not None and should_stop():
+                    for pending in futures:
+                        pending.cancel()
+                    raise VideoCancelled(f"Processing of '{video_filename}' stopped after {frames_written} frames.")
+            chunk_frames, detections_by_frame = future.result()
+            frames_written += chunk_frames
+            for frame_count, detections in detections_by_frame:
+                # --- LOG THE DATA ---
+                log_emotion_data(source='video', detections=detections, video_filename=video_filename,
+                                 frame_index=frame_count - 1)
+                if timeline is not None:
+                    timeline.add(frame_count - 1, detections)
+            if progress_callback is not None:
+                progress_callback(frames_written, total_frames)
+
+        _concatenate(chunk_paths, output_path, fps, frame_size)
+    return frames_written
@@ -0,0 +1,178 @@
+import glob
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# pyarrow is only needed with LOG_BACKEND=parquet, so it is imported lazily.
+
+_PARTITION_FORMATS = {
+    "hour": os.path.join("date=%Y-%m-%d", "hour=%H"),
+    "day": "date=%Y-%m-%d",
+}
+
+
+def log_schema():
+    import pyarrow as pa
+    labels = pa.dictionary(pa.int32(), pa.string()) # Few distinct values: stored once per row group
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms")),
+        ("source", labels),
+        ("emotion", labels),
+        ("video_filename", labels),
+        ("frame_index", pa.int32()),
+        ("roi_x", pa.int32()),
+        ("roi_y", pa.int32()),
+        ("roi_w", pa.int32()),
+        ("roi_h", pa.int32()),
+        ("confidence", pa.float32()),
+        ("track_id", pa.int32()),
+    ])
+
+
+def records_to_table(records: list, schema):
+    import pyarrow as pa
+    columns = {name: [record.get(name) for record in records] for name in schema.names}
+    return pa.Table.from_arrays([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+
+
+class ParquetLogSink:
+    """
+    Writes emotion records as Parquet files partitioned by hour or day (Hive-style
+    'date=YYYY-MM-DD/hour=HH' directories, readable with pyarrow.dataset or pandas).
+
+    Each writer process appends row groups to its own part file, which is written under a
+    hidden name and renamed once closed, so readers and compaction only ever see complete
+    files. A part file is rotated when it reaches `max_file_bytes`, is older than
+    `max_file_age_s`, or its partition ends. Partitions that are over are then compacted
+    into a single file.
+    """
+
+    def __init__(self, root_dir: str, partition: str = "hour", max_file_bytes: int = 64 * 1024 * 1024,
+                 max_file_age_s: float = 600.0, compression: str = "zstd"):
+        if partition not in _PARTITION_FORMATS:
+            raise ValueError(f"Unknown log partitioning '{partition}', expected one of {sorted(_PARTITION_FORMATS)}.")
+        self.root_dir = root_dir
+        self.partition_format = _PARTITION_FORMATS[partition]
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age_s = max_file_age_s
+        self.compression = compression
+        self._schema = None
+        self._writer = None
+        self._partition = None
+        self._path = None
+        self._opened_at = 0.0
+        self._sequence = 0
+        self._compaction_due = True # Catch up on partitions left over from a previous run
+
+    def write(self, records: list):
+        if self._schema is None:
+            self._schema = log_schema()
+        # A batch can straddle a partition boundary
+        by_partition = {}
+        for record in records:
+            by_partition.setdefault(record["timestamp"].strftime(self.partition_format), []).append(record)
+        for partition, partition_records in by_partition.items():
+            if partition != self._partition:
+                self._rotate()
+            if self._writer is None:
+                self._open(partition)
+            self._writer.write_table(records_to_table(partition_records, self._schema))
+        if self._rotation_due():
+            self._rotate()
+
+    def maintain(self):
+        """Called by the writer thread on every flush interval, including idle ones."""
+        if self._rotation_due():
+            self._rotate()
+        if self._compaction_due:
+            self._compaction_due = False
+            self.compact_closed_partitions()
+
+    def close(self):
+        self._rotate()
+
+    def _open(self, partition: str):
+        import pyarrow.parquet as pq
+        directory = os.path.join(self.root_dir, partition)
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        name = f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._sequence:04d}.parquet"
+        self._path = os.path.join(directory, name)
+        self._writer = pq.ParquetWriter(self._in_progress_path(self._path), self._schema, compression=self.compression)
+        self._partition = partition
+        self._opened_at = time.monotonic()
+
+    def _rotation_due(self) -> bool:
+        if self._writer is None:
+            return False
+        if time.monotonic() - self._opened_at >= self.max_file_age_s:
+            return True
+        try:
+            return os.path.getsize(self._in_progress_path(self._path)) >= self.max_file_bytes
+        except OSError:
+            return False
+
+    def _rotate(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self._in_progress_path(self._path), self._path)
+        self._writer = None
+        self._partition = None
+        self._compaction_due = True
+
+    @staticmethod
+    def _in_progress_path(path: str) -> str:
+        # Leading '.' hides the file from pyarrow.dataset readers and from compaction
+        directory, name = os.path.split(path)
+        return os.path.join(directory, "." + name)
+
+    def compact_closed_partitions(self):
+        """Merges the part files of every partition that is over into one file."""
+        current = time.strftime(self.partition_format)
+        for directory in sorted(set(os.path.dirname(p) for p in glob.glob(os.path.join(self.root_dir, "**", "*.parquet"), recursive=True))):
+            if os.path.relpath(directory, self.root_dir) == current:
+                continue
+            try:
+                compact_partition(directory)
+            except Exception as e:
+                logger.error(f"Compaction of emotion log partition '{directory}' failed: {e}")
+
+
+def compact_partition(directory: str) -> bool:
+    """
+    Rewrites the closed part files of one partition as a single file. Another process
+    may still hold an in-progress file there; it is left alone and compacted next time.
+    Returns False if there was nothing to do or another process is compacting.
+    """
+    import pyarrow.parquet as pq
+    parts = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    if len(parts) < 2:
+        return False
+    lock_path = os.path.join(directory, ".compacting")
+    try:
+        if time.time() - os.path.getmtime(lock_path) > 3600:
+            os.remove(lock_path) # Left behind by a process that died while compacting
+    except OSError:
+        pass
+    try:
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    try:
+        import pyarrow as pa
+        # Reading with the current schema fills columns added since older parts were written
+        table = pa.concat_tables([pq.read_table(p, schema=log_schema()) for p in parts])
+        output_path = os.path.join(directory, f"compacted-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.parquet")
+        temp_path = os.path.join(directory, "." + os.path.basename(output_path))
+        pq.write_table(table.sort_by("timestamp"), temp_path, compression="zstd")
+        os.replace(temp_path, output_path)
+        for p in parts:
+            os.remove(p)
+        logger.info(f"Compacted {len(parts)} emotion log files ({table.num_rows} rows) into '{output_path}'.")
+        return True
+    finally:
+        os.close(lock_fd)
+        os.remove(lock_path)
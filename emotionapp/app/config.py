@@ -0,0 +1,118 @@
+import os
+
+# --- Runtime configuration ---
+# Every setting can be overridden with an environment variable of the same name,
+# e.g. `docker run -e INFERENCE_MAX_WAIT_MS=10 ...`.
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+# Cross-request micro-batching of face crops (see scheduler.py)
+INFERENCE_BATCHING_ENABLED = _env_bool("INFERENCE_BATCHING_ENABLED", True)
+INFERENCE_MAX_BATCH_SIZE = _env_int("INFERENCE_MAX_BATCH_SIZE", 32)  # Faces per forward pass
+INFERENCE_MAX_WAIT_MS = _env_float("INFERENCE_MAX_WAIT_MS", 5.0)     # How long to wait for more crops
+
+# Executors that keep decode/detect/encode and video processing off the event loop (see executor.py)
+CPU_EXECUTOR_KIND = _env_str("CPU_EXECUTOR_KIND", "thread")  # "thread" or "process"
+FRAME_EXECUTOR_WORKERS = _env_int("FRAME_EXECUTOR_WORKERS", os.cpu_count() or 1)
+FRAME_MAX_IN_FLIGHT = _env_int("FRAME_MAX_IN_FLIGHT", 4 * FRAME_EXECUTOR_WORKERS)  # Webcam requests before 503
+BUSY_RETRY_AFTER_S = _env_int("BUSY_RETRY_AFTER_S", 1)  # Retry-After header sent with 503
+WEBCAM_BATCH_MAX_IMAGES = _env_int("WEBCAM_BATCH_MAX_IMAGES", 16)  # Images per /predict_webcam_batch request
+
+# Background video jobs (see jobs.py)
+JOBS_DB_PATH = _env_str("JOBS_DB_PATH", "video_jobs.sqlite3")
+VIDEO_JOB_WORKERS = _env_int("VIDEO_JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2))  # CPU budget for videos
+VIDEO_MAX_QUEUED_JOBS = _env_int("VIDEO_MAX_QUEUED_JOBS", 100)  # Uploads beyond this get a 503
+JOB_POLL_INTERVAL_S = _env_float("JOB_POLL_INTERVAL_S", 1.0)
+JOB_HEARTBEAT_S = _env_float("JOB_HEARTBEAT_S", 10.0)  # How often a server marks its running jobs as alive
+JOB_STALE_AFTER_S = _env_float("JOB_STALE_AFTER_S", 60.0)  # Running jobs without a heartbeat this long are re-queued
+STREAM_INGEST_ENABLED = _env_bool("STREAM_INGEST_ENABLED", True)  # /predict_video_stream decodes while uploading
+STREAM_PROBE_BYTES = _env_int("STREAM_PROBE_BYTES", 4 * 1024 * 1024)  # Upload head used to check/probe the container
+STREAM_MAX_CONCURRENT = _env_int("STREAM_MAX_CONCURRENT", 2)  # Streamed jobs at once; more are staged and queued
+
+# Resumable chunked uploads: POST /uploads, PUT /uploads/{id}?offset=, POST /uploads/{id}/finalize (see uploads.py)
+UPLOADS_DB_PATH = _env_str("UPLOADS_DB_PATH", "uploads.sqlite3")
+UPLOAD_MAX_BYTES = _env_int("UPLOAD_MAX_BYTES", 20 * 1024 ** 3)  # Largest file accepted at init
+UPLOAD_CHUNK_BYTES = _env_int("UPLOAD_CHUNK_BYTES", 8 * 1024 * 1024)  # Chunk size suggested to clients
+UPLOAD_MAX_CHUNK_BYTES = _env_int("UPLOAD_MAX_CHUNK_BYTES", 64 * 1024 * 1024)  # Larger PUT bodies are rejected
+UPLOAD_TTL_S = _env_float("UPLOAD_TTL_S", 24 * 3600.0)  # Uploads untouched for this long are deleted
+
+# Reuse of processed videos for re-uploaded content (see result_cache.py)
+RESULT_CACHE_ENABLED = _env_bool("RESULT_CACHE_ENABLED", True)
+RESULT_CACHE_DB_PATH = _env_str("RESULT_CACHE_DB_PATH", "result_cache.sqlite3")
+RESULT_CACHE_MAX_BYTES = _env_int("RESULT_CACHE_MAX_BYTES", 10 * 1024 ** 3)  # Cached outputs kept before LRU eviction
+
+# Observability (see metrics.py)
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)  # Per-stage timings and sizes served by GET /metrics
+
+# Background emotion log writer (see datalogger.py)
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)  # Pending log calls before rows are dropped
+LOG_FLUSH_ROWS = _env_int("LOG_FLUSH_ROWS", 500)  # Write a batch once this many rows are pending
+LOG_FLUSH_INTERVAL_S = _env_float("LOG_FLUSH_INTERVAL_S", 1.0)  # ...or after this long
+LOG_BACKEND = _env_str("LOG_BACKEND", "csv")  # "csv", "parquet" (needs pyarrow) or "sqlite" (detection_store.py)
+LOG_DB_PATH = _env_str("LOG_DB_PATH", "")  # sqlite: empty = app/logs/emotion_detections.sqlite3
+LOG_PARTITION = _env_str("LOG_PARTITION", "hour")  # parquet: one directory per "hour" or "day"
+LOG_ROTATE_MAX_BYTES = _env_int("LOG_ROTATE_MAX_BYTES", 64 * 1024 * 1024)  # parquet: start a new part file...
+LOG_ROTATE_MAX_AGE_S = _env_float("LOG_ROTATE_MAX_AGE_S", 600.0)  # ...at this size or age
+
+# Analytics over the emotion log (see rollups.py)
+ANALYTICS_ROLLUPS_ENABLED = _env_bool("ANALYTICS_ROLLUPS_ENABLED", True)  # Per-minute/per-video counters at log time
+ANALYTICS_DB_PATH = _env_str("ANALYTICS_DB_PATH", "")  # Empty: app/logs/emotion_rollups.sqlite3
+ANALYTICS_MAX_BUCKETS = _env_int("ANALYTICS_MAX_BUCKETS", 5000)  # Larger /analytics/summary ranges need a coarser bucket
+
+# Video processing (see video.py / pipeline.py)
+PROCESS_EVERY_N_FRAMES = _env_int("PROCESS_EVERY_N_FRAMES", 5)  # Fresh detections every Nth frame
+VIDEO_ENGINE = _env_str("VIDEO_ENGINE", "pipeline")  # "sequential", "pipeline" or "chunked"
+PIPELINE_QUEUE_SIZE = _env_int("PIPELINE_QUEUE_SIZE", 16)  # Frames buffered between two stages
+PIPELINE_DETECT_WORKERS = _env_int("PIPELINE_DETECT_WORKERS", 2)  # Only with VIDEO_TRACKING_ENABLED off
+PIPELINE_MAX_BATCH_SIZE = _env_int("PIPELINE_MAX_BATCH_SIZE", INFERENCE_MAX_BATCH_SIZE)  # Faces per model call
+CHUNK_WORKERS = _env_int("CHUNK_WORKERS", os.cpu_count() or 1)  # Processes for the "chunked" engine
+CHUNK_MIN_FRAMES = _env_int("CHUNK_MIN_FRAMES", 500)  # Shorter videos are not worth splitting
+
+# Face tracking between detection passes (see tracker.py); not used by the "chunked" engine.
+# With tracking the "pipeline" engine runs detection in a single in-order tracking stage, so
+# PIPELINE_DETECT_WORKERS and cross-frame batching only apply with tracking off: tracking wins
+# when it skips many detection passes (few, slow-moving faces), the fixed cadence on many-core
+# hosts with busy scenes. Compare both with benchmarks/bench_video_pipeline.py.
+VIDEO_TRACKING_ENABLED = _env_bool("VIDEO_TRACKING_ENABLED", True)  # False: fixed every-Nth-frame reuse
+TRACKER_STALENESS_FRAMES = _env_int("TRACKER_STALENESS_FRAMES", 15)  # Max frames between detection passes
+TRACKER_IOU_THRESHOLD = _env_float("TRACKER_IOU_THRESHOLD", 0.3)
+TRACKER_MAX_MISSES = _env_int("TRACKER_MAX_MISSES", 1)  # Detection passes a track may go unmatched
+TRACKER_OPTICAL_FLOW = _env_bool("TRACKER_OPTICAL_FLOW", True)
+TRACKER_EMPTY_SCENE_FRAMES = _env_int("TRACKER_EMPTY_SCENE_FRAMES", PROCESS_EVERY_N_FRAMES)  # Detection cadence with no tracks
+
+# Per-track emotion cache and smoothing (see emotion_cache.py)
+EMOTION_SMOOTHING_ALPHA = _env_float("EMOTION_SMOOTHING_ALPHA", 0.5)  # Weight of the newest softmax
+EMOTION_CACHE_HASH_THRESHOLD = _env_int("EMOTION_CACHE_HASH_THRESHOLD", 6)  # dHash bits a crop may change
+EMOTION_CACHE_MAX_AGE_FRAMES = _env_int("EMOTION_CACHE_MAX_AGE_FRAMES", 30)  # Re-run the CNN at least this often
+WEBCAM_SESSION_TTL_S = _env_float("WEBCAM_SESSION_TTL_S", 60.0)
+WEBCAM_MAX_SESSIONS = _env_int("WEBCAM_MAX_SESSIONS", 1000)
+
+# Emotion model runtime (see backends.py); export other formats with convert_model.py
+MODEL_BACKEND = _env_str("MODEL_BACKEND", "keras")  # "keras", "tflite" or "onnx"
+MODEL_FILE = _env_str("MODEL_FILE", "")  # Empty: app/models/model_optimal.{h5,tflite,onnx}
+MODEL_NUM_THREADS = _env_int("MODEL_NUM_THREADS", 0) or None  # tflite/onnx intra-op threads; None = runtime default
+MODEL_PRECISION = _env_str("MODEL_PRECISION", "float32")  # tflite only: "float32", "dynamic" or "int8" (quantize_model.py)
+
+# Face detector (see detectors.py; compare them with benchmarks/bench_detectors.py)
+FACE_DETECTOR = _env_str("FACE_DETECTOR", "haar")  # "haar", "haar_pyramid", "yunet" or "ssd"
+FACE_DETECTOR_MODEL = _env_str("FACE_DETECTOR_MODEL", "")  # Empty: the detector's default file in app/models/ (or cascades/)
+FACE_DETECTOR_CONFIG = _env_str("FACE_DETECTOR_CONFIG", "")  # ssd: empty = app/models/deploy.prototxt
+FACE_MIN_SIZE = _env_int("FACE_MIN_SIZE", 30)  # Smallest face reported, in frame pixels
+FACE_SCORE_THRESHOLD = _env_float("FACE_SCORE_THRESHOLD", 0.6)  # yunet/ssd confidence cut-off
+# Detect on a copy downscaled to this longer side; 0 = full resolution. Faster on HD/4K frames, but the smallest
+# detectable face grows with the scale (Haar: 24 px at 640 -> ~72 px at 1080p), so only enable it for close-up footage
+DETECT_MAX_SIDE = _env_int("DETECT_MAX_SIDE", 0)
+HAAR_SCALE_FACTOR = _env_float("HAAR_SCALE_FACTOR", 1.1)
+HAAR_MIN_NEIGHBORS = _env_int("HAAR_MIN_NEIGHBORS", 5)
+HAAR_PYRAMID_MIN_FACE = _env_int("HAAR_PYRAMID_MIN_FACE", 60)  # haar_pyramid: smallest face searched, in frame pixels
+HAAR_PYRAMID_LEVELS = _env_int("HAAR_PYRAMID_LEVELS", 3)  # haar_pyramid: octaves searched, each on a half-size image
@@ -1,62 +1,282 @@
 import csv
+import logging
 import os
-from datetime import datetime
+import queue
 import threading
+import time
+from datetime import datetime
+
+from . import config
+from .columnar_log import ParquetLogSink
+from .rollups import RollupStore
+from .detection_store import DetectionStore
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE_PATH = os.path.join(BASE_DIR, 'logs', 'emotion_log.csv')
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
+LOG_HEADER = ['timestamp', 'source', 'emotion', 'video_filename']
+PARQUET_LOG_DIR = os.path.join(LOG_DIR, 'emotion_log_parquet')
+ROLLUP_DB_PATH = os.path.join(LOG_DIR, 'emotion_rollups.sqlite3')
+DETECTION_DB_PATH = os.path.join(LOG_DIR, 'emotion_detections.sqlite3')
 
 # Ensure the log directory exists
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# Use a lock to prevent race conditions when writing to the file from multiple requests
-file_lock = threading.Lock()
-
-def setup_log_file():
+def setup_log_file(path: str = LOG_FILE_PATH):
     """Initializes the log file with headers if it doesn't exist."""
-    with file_lock:
-        if not os.path.exists(LOG_FILE_PATH):
-            with open(LOG_FILE_PATH, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'timestamp', 
-                    'source', 
-                    'emotion', 
-                    'video_filename'
-                ])
-
-def log_emotion_data(source: str, detections: list, video_filename: str = "N/A"):
-    """
-    Logs detected emotions to the CSV file.
-    
+    if not os.path.exists(path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(LOG_HEADER)
+
+
+class CsvLogSink:
+    """
+    Appends records to emotion_log.csv through a file handle kept open by the writer thread.
+    Only the original four columns are written, so existing readers of the CSV keep working.
+    """
+
+    def __init__(self, path: str = LOG_FILE_PATH):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def write(self, records: list):
+        if self._file is None:
+            setup_log_file(self.path)
+            self._file = open(self.path, 'a', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+        self._writer.writerows([
+            [record['timestamp'].isoformat(), record['source'], record['emotion'], record['video_filename']]
+            for record in records
+        ])
+        self._file.flush()
+
+    def maintain(self):
+        pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class EmotionLogWriter:
+    """
+    Background writer for emotion records.
+
+    `log()` only puts the rows on a bounded in-memory queue, so request handlers and video
+    loops never touch the file. A daemon thread drains the queue and writes a batch once
+    `flush_rows` rows are pending or `flush_interval_s` has passed. When the queue is full
+    the rows are dropped and counted rather than blocking the caller.
+    Each batch goes to every sink in `sinks`: the first one stores the log itself, the
+    others maintain derived data such as the analytics rollups.
+    """
+
+    _STOP = object()
+
+    def __init__(self, sinks: list, max_queue: int, flush_rows: int, flush_interval_s: float):
+        self.sinks = sinks
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._rows_logged = 0
+        self._rows_written = 0
+        self._rows_dropped = 0
+        self._batches_written = 0
+        self._write_errors = 0
+        self._last_batch_size = 0
+
+    @property
+    def running(self) -> bool:
+        # A forked or spawned child does not inherit the thread, only the object
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def start(self):
+        with self._start_lock:
+            if self.running:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="emotion-log-writer", daemon=True)
+            self._thread.start()
+
+    def log(self, rows: list):
+        if not self.running:
+            self.start()
+        try:
+            self._queue.put_nowait(rows)
+            self._rows_logged += len(rows)
+        except queue.Full:
+            self._rows_dropped += len(rows)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued so far is written. Returns False on timeout."""
+        if not self.running:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """Writes the remaining rows and stops the thread (lifespan shutdown)."""
+        if not self.running:
+            return
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Emotion log queue still full at shutdown, pending rows may be lost.")
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"Emotion log writer stopped ({self._rows_written} rows written, {self._rows_dropped} dropped).")
+
+    def _run(self):
+        pending, waiters = [], []
+        deadline = next_maintenance = time.monotonic() + self.flush_interval_s
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is self._STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    pending.extend(item)
+            except queue.Empty:
+                pass
+            if stopping or waiters or len(pending) >= self.flush_rows or time.monotonic() >= deadline:
+                self._write(pending)
+                pending = []
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+                if time.monotonic() >= next_maintenance:
+                    self._maintain()
+                    next_maintenance = time.monotonic() + self.flush_interval_s
+                deadline = time.monotonic() + self.flush_interval_s
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.error(f"Error closing emotion log sink {type(sink).__name__}: {e}")
+
+    def _write(self, rows: list):
+        if not rows:
+            return
+        for i, sink in enumerate(self.sinks):
+            try:
+                with timed("log_write"):
+                    sink.write(rows)
+                if i == 0:
+                    self._rows_written += len(rows)
+                    self._batches_written += 1
+                    self._last_batch_size = len(rows)
+            except Exception as e:
+                self._write_errors += 1
+                if i == 0:
+                    self._rows_dropped += len(rows)
+                logger.error(f"Error writing {len(rows)} rows to emotion log sink {type(sink).__name__}: {e}")
+
+    def _maintain(self):
+        """Lets the sinks rotate or compact their files even while no rows arrive."""
+        for sink in self.sinks:
+            try:
+                sink.maintain()
+            except Exception as e:
+                logger.error(f"Maintenance of emotion log sink {type(sink).__name__} failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "rows_logged": self._rows_logged,
+            "rows_written": self._rows_written,
+            "rows_dropped": self._rows_dropped,
+            "batches_written": self._batches_written,
+            "last_batch_size": self._last_batch_size,
+            "write_errors": self._write_errors,
+        }
+
+
+def make_log_sink(backend: str):
+    """
+    Storage for the emotion log: "csv" (emotion_log.csv), "parquet" (partitioned columnar
+    files) or "sqlite" (indexed detection table, see detection_store.py).
+    """
+    if backend == "csv":
+        return CsvLogSink()
+    if backend == "sqlite":
+        return DetectionStore(config.LOG_DB_PATH or DETECTION_DB_PATH)
+    if backend == "parquet":
+        return ParquetLogSink(
+            PARQUET_LOG_DIR,
+            partition=config.LOG_PARTITION,
+            max_file_bytes=config.LOG_ROTATE_MAX_BYTES,
+            max_file_age_s=config.LOG_ROTATE_MAX_AGE_S,
+        )
+    raise ValueError(f"Unknown log backend '{backend}', expected 'csv', 'parquet' or 'sqlite'.")
+
+
+log_sink = make_log_sink(config.LOG_BACKEND)
+# Queryable per-detection store, only with LOG_BACKEND=sqlite
+detection_store = log_sink if isinstance(log_sink, DetectionStore) else None
+rollup_store = RollupStore(config.ANALYTICS_DB_PATH or ROLLUP_DB_PATH) if config.ANALYTICS_ROLLUPS_ENABLED else None
+
+emotion_log_writer = EmotionLogWriter(
+    [log_sink] + ([rollup_store] if rollup_store is not None else []),
+    max_queue=config.LOG_QUEUE_SIZE,
+    flush_rows=config.LOG_FLUSH_ROWS,
+    flush_interval_s=config.LOG_FLUSH_INTERVAL_S,
+)
+
+
+@timed("log")
+def log_emotion_data(source: str, detections: list, video_filename: str = "N/A", frame_index: int = None):
+    """
+    Queues detected emotions for the log; the background writer stores them in batches
+    with the backend selected by config.LOG_BACKEND.
+
     Args:
         source (str): The source of the detection (e.g., 'webcam', 'video').
         detections (list): The list of detection dicts from processing.py.
         video_filename (str, optional): The name of the video file if source is 'video'.
+        frame_index (int, optional): 0-based frame number within the video or webcam session.
     """
     if not detections:
         return
 
-    timestamp = datetime.now().isoformat()
-    
-    rows_to_write = []
+    timestamp = datetime.now()
+
+    records = []
     for detection in detections:
-        emotion = detection.get('emotion', 'UNKNOWN')
-        rows_to_write.append([
-            timestamp,
-            source,
-            emotion,
-            video_filename
-        ])
+        x, y, w, h = detection.get('roi') or (None, None, None, None)
+        probabilities = detection.get('probabilities')
+        records.append({
+            'timestamp': timestamp,
+            'source': source,
+            'emotion': detection.get('emotion', 'UNKNOWN'),
+            'video_filename': video_filename,
+            'frame_index': frame_index,
+            'roi_x': x, 'roi_y': y, 'roi_w': w, 'roi_h': h,
+            'confidence': max(probabilities) if probabilities else None,
+            'track_id': detection.get('track_id'),
+            'probabilities': probabilities,
+        })
 
-    with file_lock:
-        try:
-            with open(LOG_FILE_PATH, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerows(rows_to_write)
-        except IOError as e:
-            print(f"Error writing to log file: {e}") # Replace with proper logging if available
+    emotion_log_writer.log(records)
+
+def flush_emotion_log(timeout: float = 5.0) -> bool:
+    """Waits until all queued rows are handed to the storage backend (e.g. at the end of a video job)."""
+    return emotion_log_writer.flush(timeout)
 
-setup_log_file()
\ No newline at end of file
+setup_log_file()
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .processing import EMOTION_LABELS
+
+# One REAL column per softmax entry, so probability thresholds are plain SQL predicates
+PROBABILITY_COLUMNS = [f"p_{label.lower()}" for label in EMOTION_LABELS]
+
+
+class DetectionStore:
+    """
+    SQLite detection table used as an emotion log backend (LOG_BACKEND=sqlite).
+
+    Every detection is stored with its frame index, ROI, label and full softmax vector.
+    Indexes on (video_filename, timestamp) and (source, timestamp) keep per-video and
+    per-source lookups from scanning the table. The database runs in WAL mode and each
+    flushed batch is one short IMMEDIATE transaction, so several uvicorn workers (each
+    with its own log writer thread) can write to the same file concurrently.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS detections (
+                    id INTEGER PRIMARY KEY,
+                    timestamp REAL NOT NULL,
+                    source TEXT NOT NULL,
+                    video_filename TEXT NOT NULL,
+                    frame_index INTEGER,
+                    track_id INTEGER,
+                    roi_x INTEGER, roi_y INTEGER, roi_w INTEGER, roi_h INTEGER,
+                    emotion TEXT NOT NULL,
+                    confidence REAL,
+                    {", ".join(f"{column} REAL" for column in PROBABILITY_COLUMNS)}
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_video_time ON detections (video_filename, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_source_time ON detections (source, timestamp)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Autocommit
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _writer_connection(self):
+        """The log writer thread keeps one connection open instead of reconnecting per batch."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL") # Durable across crashes of the process, not of the OS
+            self._local.conn = conn
+        return conn
+
+    # --- Log writer sink interface ---
+    def write(self, records: list):
+        rows = []
+        for record in records:
+            probabilities = record.get("probabilities") or [None] * len(PROBABILITY_COLUMNS)
+            rows.append((
+                record["timestamp"].timestamp(), record["source"], record["video_filename"],
+                record.get("frame_index"), record.get("track_id"),
+                record.get("roi_x"), record.get("roi_y"), record.get("roi_w"), record.get("roi_h"),
+                record["emotion"], record.get("confidence"), *probabilities,
+            ))
+        columns = ["timestamp", "source", "video_filename", "frame_index", "track_id",
+                   "roi_x", "roi_y", "roi_w", "roi_h", "emotion", "confidence", *PROBABILITY_COLUMNS]
+        conn = self._writer_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"INSERT INTO detections ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def maintain(self):
+        pass
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Queries ---
+    def frames_where(self, video_filename: str, emotion: str = None, min_probability: float = 0.0,
+                     start: float = None, end: float = None, limit: int = 1000) -> list:
+        """
+        Detections of one video, optionally only those where `emotion` has at least
+        `min_probability` (e.g. all frames of video X where ANGRY > 0.6). Uses the
+        (video_filename, timestamp) index, so only that video's rows are read.
+        """
+        query = "SELECT * FROM detections WHERE video_filename = ?"
+        params = [video_filename]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp < ?"
+            params.append(end)
+        if emotion is not None:
+            if emotion not in EMOTION_LABELS:
+                raise ValueError(f"Unknown emotion '{emotion}', expected one of {EMOTION_LABELS}.")
+            # Column name comes from EMOTION_LABELS, never from the request
+            query += f" AND p_{emotion.lower()} >= ?"
+            params.append(min_probability)
+        query += " ORDER BY timestamp, frame_index LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._detection_from_row(row) for row in rows]
+
+    @staticmethod
+    def _detection_from_row(row) -> dict:
+        probabilities = [row[column] for column in PROBABILITY_COLUMNS]
+        return {
+            "timestamp": row["timestamp"],
+            "source": row["source"],
+            "video_filename": row["video_filename"],
+            "frame_index": row["frame_index"],
+            "track_id": row["track_id"],
+            "roi": [row["roi_x"], row["roi_y"], row["roi_w"], row["roi_h"]],
+            "emotion": row["emotion"],
+            "confidence": row["confidence"],
+            "probabilities": probabilities if probabilities[0] is not None else None,
+        }
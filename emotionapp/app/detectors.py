@@ -0,0 +1,274 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from . import config
+
+# Face detectors behind one interface: detect(frame, min_size=None) -> (N, 4) int32 array
+# of (x, y, w, h) boxes in frame coordinates; min_size overrides the smallest face (in
+# pixels of the given frame) the detector was configured with. The DNN detectors need
+# their model files in app/models/ (or FACE_DETECTOR_MODEL): `python fetch_detector_models.py`.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, 'models')
+HAAR_CASCADE_PATH = os.path.join(BASE_DIR, 'cascades', 'haarcascade_frontalface_default.xml')
+YUNET_MODEL_PATH = os.path.join(MODEL_DIR, 'face_detection_yunet_2023mar.onnx')
+SSD_MODEL_PATH = os.path.join(MODEL_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+SSD_CONFIG_PATH = os.path.join(MODEL_DIR, 'deploy.prototxt')
+
+HAAR_WINDOW = 30 # Smallest face, in pixels of the searched image, the cascade is asked to find
+
+NO_FACES = np.zeros((0, 4), dtype=np.int32)
+
+
+def _as_boxes(boxes, frame_shape) -> np.ndarray:
+    """Clips float or int boxes to the frame and drops empty ones."""
+    if boxes is None or len(boxes) == 0:
+        return NO_FACES
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    height, width = frame_shape[:2]
+    x1 = np.clip(boxes[:, 0], 0, width)
+    y1 = np.clip(boxes[:, 1], 0, height)
+    x2 = np.clip(boxes[:, 0] + boxes[:, 2], 0, width)
+    y2 = np.clip(boxes[:, 1] + boxes[:, 3], 0, height)
+    clipped = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).round().astype(np.int32)
+    return clipped[(clipped[:, 2] > 0) & (clipped[:, 3] > 0)]
+
+
+def suppress_overlaps(boxes: np.ndarray, iou_threshold: float = 0.4) -> np.ndarray:
+    """Greedy non-maximum suppression without scores: larger boxes win."""
+    if len(boxes) < 2:
+        return boxes
+    order = np.argsort(-(boxes[:, 2] * boxes[:, 3]))
+    kept = []
+    for i in order:
+        x, y, w, h = boxes[i]
+        overlaps = False
+        for j in kept:
+            kx, ky, kw, kh = boxes[j]
+            iw = max(0, min(x + w, kx + kw) - max(x, kx))
+            ih = max(0, min(y + h, ky + kh) - max(y, ky))
+            inter = iw * ih
+            if inter and inter / float(w * h + kw * kh - inter) > iou_threshold:
+                overlaps = True
+                break
+        if not overlaps:
+            kept.append(i)
+    return boxes[sorted(kept)]
+
+
+class HaarDetector:
+    """The original Haar cascade on the grayscale frame."""
+    name = "haar"
+
+    def __init__(self, cascade_path: str = HAAR_CASCADE_PATH, scale_factor: float = 1.1, min_neighbors: int = 5,
+                 min_size: int = HAAR_WINDOW):
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise IOError(f"Haar cascade file not found or is empty at {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.window = max(self.cascade.getOriginalWindowSize()) # Nothing smaller can be detected (24 px)
+
+    def detect(self, frame: np.ndarray, min_size: int = None) -> np.ndarray:
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        min_size = max(self.window, self.min_size if min_size is None else min_size)
+        faces = self.cascade.detectMultiScale(
+            gray_frame,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        return _as_boxes(faces, frame.shape)
+
+
+class HaarPyramidDetector(HaarDetector):
+    """
+    The Haar cascade on an explicit image pyramid. Level k is the frame scaled so that
+    faces of min_size * 2**k full-resolution pixels become HAAR_WINDOW pixels, and it is
+    searched only for faces up to twice that size; the last level has no upper bound.
+    Large faces are thus found on small images, the full-resolution frame is never
+    scanned, and boxes are mapped back to frame coordinates and de-duplicated.
+    """
+    name = "haar_pyramid"
+
+    def __init__(self, cascade_path: str = HAAR_CASCADE_PATH, scale_factor: float = 1.1, min_neighbors: int = 5,
+                 min_size: int = 60, levels: int = 3):
+        super().__init__(cascade_path, scale_factor, min_neighbors, min_size)
+        self.levels = max(1, levels)
+
+    def detect(self, frame: np.ndarray, min_size: int = None) -> np.ndarray:
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray_frame.shape
+        min_face = self.min_size if min_size is None else min_size
+        found = []
+        image, image_scale = gray_frame, 1.0
+        for level in range(self.levels):
+            band = min_face * 2 ** level # Smallest full-resolution face searched on this level
+            scale = min(1.0, HAAR_WINDOW / float(band))
+            if min(width, height) * scale < HAAR_WINDOW:
+                break
+            # Each level is resized from the previous, smaller one where possible
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            if size != image.shape[::-1]:
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                image_scale = scale
+            level_min = max(self.window, int(round(band * scale)))
+            band_limit = {} if level == self.levels - 1 else {"maxSize": (2 * level_min, 2 * level_min)}
+            faces = self.cascade.detectMultiScale(
+                image,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.min_neighbors,
+                minSize=(level_min, level_min),
+                flags=cv2.CASCADE_SCALE_IMAGE,
+                **band_limit
+            )
+            if len(faces):
+                found.append(np.asarray(faces, dtype=np.float32) / image_scale)
+        if not found:
+            return NO_FACES
+        return suppress_overlaps(_as_boxes(np.concatenate(found), frame.shape))
+
+
+class YuNetDetector:
+    """OpenCV's YuNet CNN face detector (cv2.FaceDetectorYN, OpenCV >= 4.8) from an .onnx file."""
+    name = "yunet"
+
+    def __init__(self, model_path: str = YUNET_MODEL_PATH, score_threshold: float = 0.6, nms_threshold: float = 0.3,
+                 min_size: int = HAAR_WINDOW):
+        if not os.path.exists(model_path):
+            raise IOError(f"YuNet model not found at {model_path}; run `python fetch_detector_models.py --detectors yunet`")
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.min_size = min_size
+        # FaceDetectorYN keeps its input size as state, so every thread gets its own instance
+        self._local = threading.local()
+        self._create()
+
+    def _create(self):
+        detector = cv2.FaceDetectorYN.create(self.model_path, "", (320, 320), self.score_threshold,
+                                             self.nms_threshold, 5000)
+        self._local.detector, self._local.input_size = detector, (320, 320)
+        return detector
+
+    def detect(self, frame: np.ndarray, min_size: int = None) -> np.ndarray:
+        detector = getattr(self._local, "detector", None) or self._create()
+        input_size = (frame.shape[1], frame.shape[0])
+        if self._local.input_size != input_size:
+            detector.setInputSize(input_size)
+            self._local.input_size = input_size
+        _, faces = detector.detect(frame)
+        if faces is None:
+            return NO_FACES
+        boxes = _as_boxes(faces[:, :4], frame.shape)
+        min_size = self.min_size if min_size is None else min_size
+        return boxes[(boxes[:, 2] >= min_size) & (boxes[:, 3] >= min_size)]
+
+
+class SSDDetector:
+    """The OpenCV DNN ResNet-10 SSD face detector (Caffe model, 300x300 input)."""
+    name = "ssd"
+
+    def __init__(self, model_path: str = SSD_MODEL_PATH, config_path: str = SSD_CONFIG_PATH,
+                 score_threshold: float = 0.6, min_size: int = HAAR_WINDOW):
+        for path in (model_path, config_path):
+            if not os.path.exists(path):
+                raise IOError(f"SSD face detector file not found at {path}; "
+                              f"run `python fetch_detector_models.py --detectors ssd`")
+        self.model_path = model_path
+        self.config_path = config_path
+        self.score_threshold = score_threshold
+        self.min_size = min_size
+        self._local = threading.local() # cv2.dnn.Net is not safe to run from several threads at once
+        self._net()
+
+    def _net(self):
+        net = getattr(self._local, "net", None)
+        if net is None:
+            net = self._local.net = cv2.dnn.readNetFromCaffe(self.config_path, self.model_path)
+        return net
+
+    def detect(self, frame: np.ndarray, min_size: int = None) -> np.ndarray:
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net = self._net()
+        net.setInput(blob)
+        detections = net.forward()[0, 0] # (N, 7): image_id, label, score, x1, y1, x2, y2 (relative)
+        detections = detections[detections[:, 2] >= self.score_threshold]
+        if not len(detections):
+            return NO_FACES
+        corners = detections[:, 3:7] * np.array([width, height, width, height], dtype=np.float32)
+        boxes = _as_boxes(np.column_stack([corners[:, :2], corners[:, 2:] - corners[:, :2]]), frame.shape)
+        min_size = self.min_size if min_size is None else min_size
+        return boxes[(boxes[:, 2] >= min_size) & (boxes[:, 3] >= min_size)]
+
+
+class DownscaledDetector:
+    """
+    Runs another detector on a copy of the frame whose longer side is capped at max_side.
+    The emotion CNN only sees 100x100 crops, so HD webcam frames and 4K uploads do not
+    need full-resolution detection. The minimum face size is scaled with the image, so it
+    keeps meaning frame pixels, and the boxes are scaled back, so faces are still cropped
+    from and drawn on the full-resolution frame. What the detector can see at the reduced
+    size is a floor, though: the Haar cascade's 24 px window becomes ~72 px at 1080p and
+    ~144 px at 4K with max_side=640, so small, distant faces are lost.
+    """
+
+    def __init__(self, detector, max_side: int):
+        self.detector = detector
+        self.name = detector.name
+        self.max_side = max_side
+        self.min_size = detector.min_size
+
+    def detect(self, frame: np.ndarray, min_size: int = None) -> np.ndarray:
+        min_size = self.min_size if min_size is None else min_size
+        height, width = frame.shape[:2]
+        scale = self.max_side / float(max(height, width))
+        if scale >= 1.0:
+            return self.detector.detect(frame, min_size)
+        small = cv2.resize(frame, (max(1, int(round(width * scale))), max(1, int(round(height * scale)))),
+                           interpolation=cv2.INTER_AREA)
+        boxes = self.detector.detect(small, max(1, int(round(min_size * scale))))
+        if not len(boxes):
+            return NO_FACES
+        return _as_boxes(boxes.astype(np.float32) / scale, frame.shape)
+
+
+DETECTORS = {
+    HaarDetector.name: HaarDetector,
+    HaarPyramidDetector.name: HaarPyramidDetector,
+    YuNetDetector.name: YuNetDetector,
+    SSDDetector.name: SSDDetector,
+}
+
+
+def load_detector(name: str, model_path: str = None, max_side: int = 0):
+    """
+    Instantiates the face detector called `name` ("haar", "haar_pyramid", "yunet" or "ssd")
+    with the FACE_*/HAAR_* settings from the config. model_path overrides the default model
+    file of the DNN detectors (the cascade file for the Haar ones). With max_side > 0, it
+    runs on frames downscaled to that longer side (DownscaledDetector).
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}', expected one of {sorted(DETECTORS)}.")
+    if name == HaarDetector.name:
+        detector = HaarDetector(model_path or HAAR_CASCADE_PATH, config.HAAR_SCALE_FACTOR, config.HAAR_MIN_NEIGHBORS,
+                                config.FACE_MIN_SIZE)
+    elif name == HaarPyramidDetector.name:
+        detector = HaarPyramidDetector(model_path or HAAR_CASCADE_PATH, config.HAAR_SCALE_FACTOR,
+                                       config.HAAR_MIN_NEIGHBORS, config.HAAR_PYRAMID_MIN_FACE, config.HAAR_PYRAMID_LEVELS)
+    elif name == YuNetDetector.name:
+        detector = YuNetDetector(model_path or YUNET_MODEL_PATH, config.FACE_SCORE_THRESHOLD, min_size=config.FACE_MIN_SIZE)
+    else:
+        detector = SSDDetector(model_path or SSD_MODEL_PATH, config.FACE_DETECTOR_CONFIG or SSD_CONFIG_PATH,
+                               config.FACE_SCORE_THRESHOLD, min_size=config.FACE_MIN_SIZE)
+    if max_side:
+        detector = DownscaledDetector(detector, max_side)
+    logging.info(f"Loaded {name} face detector" + (f" (detecting at <= {max_side} px)" if max_side else ""))
+    return detector
@@ -0,0 +1,93 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+def dhash(crop: np.ndarray) -> int:
+    """64-bit difference hash of a BGR crop; small Hamming distance means a visually similar face."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class _CacheStats:
+    """Process-wide hit/miss counters shared by every EmotionCache, exported at /stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+cache_stats = _CacheStats()
+
+
+class _Entry:
+    __slots__ = ("crop_hash", "probabilities", "refreshed_at")
+
+    def __init__(self, crop_hash: int, probabilities: np.ndarray, refreshed_at: int):
+        self.crop_hash = crop_hash
+        self.probabilities = probabilities
+        self.refreshed_at = refreshed_at
+
+
+class EmotionCache:
+    """
+    Per-track cache of exponentially smoothed softmax vectors.
+
+    `lookup` is a hit while the face crop's dHash stays within `hash_threshold` bits of
+    the crop last classified and that classification is less than `max_age_frames` old.
+    On a miss the caller runs the CNN and passes the new softmax to `update`, which blends
+    it into the track's running average: smoothed = alpha * new + (1 - alpha) * smoothed.
+    """
+
+    def __init__(self, alpha: float = 0.5, hash_threshold: int = 6, max_age_frames: int = 30):
+        self.alpha = alpha
+        self.hash_threshold = hash_threshold
+        self.max_age_frames = max_age_frames
+        self._entries = {}
+
+    def lookup(self, track_id: int, crop_hash: int, frame_index: int):
+        """Returns the cached smoothed probabilities, or None if the track needs the CNN."""
+        entry = self._entries.get(track_id)
+        hit = (
+            entry is not None
+            and frame_index - entry.refreshed_at < self.max_age_frames
+            and hamming(entry.crop_hash, crop_hash) <= self.hash_threshold
+        )
+        cache_stats.record(hit)
+        return entry.probabilities if hit else None
+
+    def update(self, track_id: int, crop_hash: int, probabilities: np.ndarray, frame_index: int) -> np.ndarray:
+        """Blends a fresh softmax vector into the track's smoothed probabilities and returns them."""
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        entry = self._entries.get(track_id)
+        if entry is not None:
+            probabilities = self.alpha * probabilities + (1.0 - self.alpha) * entry.probabilities
+        self._entries[track_id] = _Entry(crop_hash, probabilities, frame_index)
+        return probabilities
+
+    def forget(self, track_id: int):
+        self._entries.pop(track_id, None)
@@ -0,0 +1,103 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from . import config
+from .processing import load_face_detector
+
+logger = logging.getLogger(__name__)
+
+
+class ServerBusyError(Exception):
+    """Raised when an executor is saturated; mapped to HTTP 503 with Retry-After."""
+
+    def __init__(self, executor_name: str, retry_after: int):
+        super().__init__(f"Executor '{executor_name}' is saturated, retry in {retry_after}s.")
+        self.executor_name = executor_name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Runs blocking CPU work (decode, detection, encode) off the event loop.
+
+    `admit(slots)` is an async context manager that reserves `slots` (default one) of
+    `max_in_flight` slots for the duration of a request and raises ServerBusyError instead
+    of queueing when not enough are free; a request carrying several frames reserves one
+    per frame. `run()` executes a callable on the underlying thread or process pool.
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int, max_in_flight: int, retry_after: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind '{kind}', expected 'thread' or 'process'.")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self._pool = None
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                # Spawned workers load their own face detector; forking a process that already
+                # initialized TensorFlow is not safe. They only decode, detect, draw and encode
+                # (inference goes through the scheduler in the server process), so no model.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=load_face_detector,
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            logger.info(f"Started {self.kind} executor '{self.name}' with {self.max_workers} workers, {self.max_in_flight} in flight.")
+        return self._pool
+
+    @asynccontextmanager
+    async def admit(self, slots: int = 1):
+        slots = min(max(1, slots), self.max_in_flight) # An oversized batch still fits an idle executor
+        if self._in_flight + slots > self.max_in_flight:
+            self._rejected += 1
+            raise ServerBusyError(self.name, self.retry_after)
+        self._in_flight += slots
+        self._admitted += 1
+        try:
+            yield self
+        finally:
+            self._in_flight -= slots
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+        }
+
+
+# Short webcam requests: decode, detect, draw, encode.
+# Whole videos go through the job queue in jobs.py instead.
+frame_executor = BoundedExecutor(
+    name="frame",
+    kind=config.CPU_EXECUTOR_KIND,
+    max_workers=config.FRAME_EXECUTOR_WORKERS,
+    max_in_flight=config.FRAME_MAX_IN_FLIGHT,
+    retry_after=config.BUSY_RETRY_AFTER_S,
+)
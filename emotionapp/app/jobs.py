@@ -0,0 +1,436 @@
+import glob
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from . import config
+from .processing import load_resources
+from .datalogger import flush_emotion_log
+from .video import process_video, VideoCancelled
+from .timeline import VideoTimeline, timeline_path_for
+from .result_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Identifies the process running a job, so jobs of other live servers are not re-queued
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobStore:
+    """
+    SQLite-backed video job table. No external broker is needed and jobs survive
+    a restart: a 'running' job records the process that owns it and a heartbeat,
+    and is put back in the queue once its heartbeat has gone stale.
+    Every method opens its own short-lived connection, so one store can be shared
+    by the API, the dispatcher thread and worker processes.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    video_filename TEXT NOT NULL,
+                    input_path TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    processed_video_id TEXT NOT NULL,
+                    frames_done INTEGER NOT NULL DEFAULT 0,
+                    total_frames INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    error TEXT,
+                    cache_key TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "cache_key" not in columns: # Databases created before the result cache
+                conn.execute("ALTER TABLE jobs ADD COLUMN cache_key TEXT")
+            if "owner" not in columns: # Databases created before job heartbeats
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_cache_key ON jobs (cache_key)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Autocommit
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, video_filename: str, input_path: str, output_path: str, processed_video_id: str,
+                cache_key: str = None) -> str:
+        job_id = str(uuid.uuid4())
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, video_filename, input_path, output_path, processed_video_id, created_at, "
+                "cache_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, video_filename, input_path, output_path, processed_video_id, time.time(), cache_key),
+            )
+        return job_id
+
+    def claim_next(self, owner: str = WORKER_ID):
+        """Atomically moves the oldest queued job to 'running' for `owner` and returns it, or None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, frames_done = 0, owner = ?, heartbeat_at = ? "
+                        "WHERE id = ?",
+                        (JOB_RUNNING, now, owner, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return dict(row, status=JOB_RUNNING, started_at=now, frames_done=0, owner=owner, heartbeat_at=now)
+
+    def heartbeat(self, owner: str = WORKER_ID) -> int:
+        """Marks every job `owner` is running as alive."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?", (time.time(), JOB_RUNNING, owner)
+            )
+            return cursor.rowcount
+
+    def update_progress(self, job_id: str, frames_done: int, total_frames: int, owner: str = None) -> bool:
+        """
+        With an owner, only updates (and heartbeats) the job while that owner still runs it;
+        returns False once it was re-queued or taken over, so the caller can give up.
+        """
+        query, params = "UPDATE jobs SET frames_done = ?, total_frames = ? WHERE id = ?", [frames_done, total_frames, job_id]
+        if owner is not None:
+            query = query.replace(" WHERE", ", heartbeat_at = ? WHERE") + " AND status = ? AND owner = ?"
+            params = [frames_done, total_frames, time.time(), job_id, JOB_RUNNING, owner]
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount == 1
+
+    def finish(self, job_id: str, error: str = None, owner: str = None) -> bool:
+        """Marks the job done or failed; with an owner, only if that owner still runs it."""
+        query, params = "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?", \
+            [JOB_FAILED if error else JOB_DONE, time.time(), error, job_id]
+        if owner is not None:
+            query += " AND status = ? AND owner = ?"
+            params += [JOB_RUNNING, owner]
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount == 1
+
+    def start_streaming(self, video_filename: str, output_path: str, processed_video_id: str,
+                        owner: str = WORKER_ID) -> dict:
+        """Registers a job that is already running because it decodes its upload as it arrives."""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, video_filename, input_path, output_path, processed_video_id, "
+                "created_at, started_at, owner, heartbeat_at) VALUES (?, ?, ?, '', ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_RUNNING, video_filename, output_path, processed_video_id, now, now, owner, now),
+            )
+        return self.get(job_id)
+
+    def set_cache_key(self, job_id: str, cache_key: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET cache_key = ? WHERE id = ?", (cache_key, job_id))
+
+    def requeue_interrupted(self, stale_after_s: float) -> int:
+        """
+        Re-queues running jobs whose owner has not sent a heartbeat for `stale_after_s`
+        (it crashed or was shut down); jobs of other live processes are left alone.
+        """
+        now = time.time()
+        stale = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+        with self._connect() as conn:
+            # Streamed uploads were never staged, so there is nothing to run again
+            conn.execute(
+                f"UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE {stale} AND input_path = ''",
+                (JOB_FAILED, now, "Interrupted by a server restart while streaming.", JOB_RUNNING, now - stale_after_s),
+            )
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = ?, started_at = NULL, frames_done = 0, owner = NULL, heartbeat_at = NULL "
+                f"WHERE {stale}",
+                (JOB_QUEUED, JOB_RUNNING, now - stale_after_s),
+            )
+            return cursor.rowcount
+
+    def release(self, owner: str = WORKER_ID) -> int:
+        """Re-queues `owner`'s running jobs right away (streamed ones fail), e.g. when it shuts down."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE status = ? AND owner = ? AND input_path = ''",
+                (JOB_FAILED, time.time(), "Interrupted by a server restart while streaming.", JOB_RUNNING, owner),
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, frames_done = 0, owner = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND owner = ?",
+                (JOB_QUEUED, JOB_RUNNING, owner),
+            )
+            return cursor.rowcount
+
+    def count(self, status: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_by_status(self, status: str) -> list:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at", (status,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_active_by_cache_key(self, cache_key: str):
+        """A queued or running job for the same content and settings, so duplicate uploads can share it."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE cache_key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (cache_key, JOB_QUEUED, JOB_RUNNING),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_by_processed_video_id(self, processed_video_id: str):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE processed_video_id = ?", (processed_video_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+
+def job_status(job: dict) -> dict:
+    """Public view of a job row with throughput (fps) and ETA derived from its progress."""
+    frames_done, total_frames = job["frames_done"], job["total_frames"]
+    fps, eta_seconds = None, None
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+        if elapsed > 0 and frames_done > 0:
+            fps = frames_done / elapsed
+            if job["status"] == JOB_RUNNING and total_frames > frames_done:
+                eta_seconds = (total_frames - frames_done) / fps
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "video_filename": job["video_filename"],
+        "frames_done": frames_done,
+        "total_frames": total_frames,
+        # Streamed totals may be estimated from the duration (see streaming.probe_stream)
+        "progress": min(frames_done / total_frames, 1.0) if total_frames else None,
+        "fps": fps,
+        "eta_seconds": 0.0 if job["status"] == JOB_DONE else eta_seconds,
+        "processed_video_id": job["processed_video_id"],
+        "download_url": f"/download_video/{job['processed_video_id']}.mp4" if job["status"] == JOB_DONE else None,
+        "error": job["error"],
+    }
+
+
+def run_job(db_path: str, job: dict, capture=None, cancel=None):
+    """
+    Processes one claimed job. Module-level so it can run in a worker thread or process.
+    The output is written to a '.<run>.partial.mp4' file, unique to this run, and renamed
+    when complete, so /download_video never serves a half-written video. The per-frame
+    detections are saved next to it as '<id>.timeline.npy' (see timeline.py) before the
+    video is published. Streamed jobs pass the FFmpegPipeCapture fed by their upload as capture.
+    The job stops within a frame once `cancel` (a threading.Event, thread workers only) is
+    set, and at its next progress update once it is no longer its owner's (re-queued on
+    shutdown or as stale); it then removes its partial output and keeps the staged upload
+    for the next run.
+    """
+    store = JobStore(db_path)
+    owner = job.get("owner")
+    output_path = job["output_path"]
+    stem = output_path[:-len(".mp4")]
+    # Partial output of an earlier, abandoned run of this job; one still being written stops on its own
+    for stale_partial in glob.glob(glob.escape(stem) + ".*.partial.mp4"):
+        os.remove(stale_partial)
+    partial_path = f"{stem}.{uuid.uuid4().hex[:8]}.partial.mp4"
+    timeline = VideoTimeline()
+    lost = threading.Event()
+
+    def on_progress(done: int, total: int):
+        if not store.update_progress(job["id"], done, total, owner) and owner is not None:
+            lost.set()
+
+    cancelled = False
+    try:
+        process_video(
+            job["input_path"], partial_path, job["video_filename"],
+            progress_callback=on_progress, timeline=timeline, capture=capture,
+            should_stop=lambda: lost.is_set() or (cancel is not None and cancel.is_set()),
+        )
+        timeline.save(timeline_path_for(output_path))
+        os.replace(partial_path, output_path)
+        store.finish(job["id"], owner=owner)
+        # Re-read: a streamed job only learns its content hash once the upload has ended
+        cache_key = store.get(job["id"])["cache_key"]
+        if cache_key:
+            result_cache.put(cache_key, job["processed_video_id"], output_path, job["video_filename"])
+        logger.info(f"Job {job['id']} done: '{job['video_filename']}' -> '{output_path}'")
+    except VideoCancelled as e:
+        cancelled = True
+        logger.info(f"Job {job['id']} abandoned: {e}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed for '{job['video_filename']}': {e}", exc_info=True)
+        store.finish(job["id"], error=str(e), owner=owner)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    finally:
+        if not cancelled and os.path.exists(job["input_path"]): # Clean up the staged upload
+            os.remove(job["input_path"])
+        # Spawned worker processes have their own log writer thread and are not flushed at exit
+        flush_emotion_log()
+
+
+class JobWorkerPool:
+    """
+    Dispatcher thread that claims queued jobs and runs up to `max_workers` of them in
+    parallel on a thread or spawned process pool (config.CPU_EXECUTOR_KIND). It also
+    sends the heartbeat of this process's running jobs (streamed ones included) and
+    re-queues jobs left behind by processes that stopped sending theirs.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int, kind: str, poll_interval: float,
+                 heartbeat_interval: float, stale_after: float):
+        self.store = store
+        self.max_workers = max_workers
+        self.kind = kind
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._last_heartbeat = 0.0
+        self._slots = threading.Semaphore(max_workers)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        requeued = self.store.requeue_interrupted(self.stale_after)
+        if requeued:
+            logger.info(f"Re-queued {requeued} video jobs interrupted by a previous shutdown.")
+        if self.kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=load_resources,
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="video-job")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="video-job-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Video job pool started with {self.max_workers} {self.kind} workers.")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        # The dispatcher only blocks for one poll interval
+        self._thread.join(timeout=self.poll_interval + 5)
+        self._thread = None
+        # Running jobs are abandoned and re-queued at once for the next server to start. Thread
+        # workers see the stop flag before their next frame, so waiting for them is short and
+        # their last log rows reach the log writer; process workers notice the re-queue at
+        # their next progress update and exit on their own.
+        released = self.store.release()
+        self._pool.shutdown(wait=self.kind == "thread", cancel_futures=True)
+        self._pool = None
+        logger.info(f"Video job pool stopped ({released} running jobs re-queued).")
+
+    @property
+    def stopping(self) -> threading.Event:
+        """Set while the pool shuts down; in-process jobs (streamed ones too) pass it to run_job as cancel."""
+        return self._stopping
+
+    def notify(self):
+        """Wakes the dispatcher after a new job was enqueued."""
+        self._wakeup.set()
+
+    def _dispatch_loop(self):
+        while not self._stopping.is_set():
+            self._maintain()
+            # Bounded waits so stop() is noticed while every slot is busy
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            if self._stopping.is_set():
+                self._slots.release()
+                break
+            try:
+                job = self.store.claim_next()
+            except Exception as e:
+                logger.error(f"Could not claim video job: {e}", exc_info=True)
+                job = None
+            if job is None:
+                self._slots.release()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            # An Event cannot be sent to a worker process; those jobs notice the re-queue instead
+            cancel = self._stopping if self.kind == "thread" else None
+            future = self._pool.submit(run_job, self.store.db_path, job, None, cancel)
+            future.add_done_callback(lambda _: self._slots.release())
+
+    def _maintain(self):
+        """Heartbeat for our running jobs, and re-queueing of jobs whose owner went away."""
+        now = time.monotonic()
+        if now - self._last_heartbeat < self.heartbeat_interval:
+            return
+        self._last_heartbeat = now
+        try:
+            self.store.heartbeat()
+            requeued = self.store.requeue_interrupted(self.stale_after)
+            if requeued:
+                logger.warning(f"Re-queued {requeued} video jobs whose worker stopped sending heartbeats.")
+                self._wakeup.set()
+        except Exception as e:
+            logger.error(f"Video job heartbeat failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "queued": self.store.count(JOB_QUEUED),
+            "running": self.store.count(JOB_RUNNING),
+        }
+
+
+job_store = JobStore(config.JOBS_DB_PATH)
+job_pool = JobWorkerPool(
+    store=job_store,
+    max_workers=config.VIDEO_JOB_WORKERS,
+    kind=config.CPU_EXECUTOR_KIND,
+    poll_interval=config.JOB_POLL_INTERVAL_S,
+    heartbeat_interval=config.JOB_HEARTBEAT_S,
+    stale_after=config.JOB_STALE_AFTER_S,
+)
@@ -1,17 +1,39 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect, Query
+from typing import List
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware # For frontend development
-import cv2
+from starlette.requests import ClientDisconnect
+from starlette.websockets import WebSocketState
 import numpy as np
 import os
-import shutil
+import hashlib
 import uuid
 import logging
 import io
+import json
+import asyncio
+import itertools
+import threading
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 
-from .processing import load_resources, predict_emotions_on_frame_data, draw_labels_on_frame
-from .datalogger import log_emotion_data
+from .processing import load_resources, resources_loaded, model_info, decode_and_detect, draw_and_encode_jpeg, \
+    compact_detections, EMOTION_LABELS
+from .datalogger import log_emotion_data, emotion_log_writer, rollup_store, detection_store
+from .rollups import BUCKET_MINUTES, parse_time
+from .scheduler import inference_scheduler, predict_emotions_for_faces_async, predict_tracked_faces_async
+from .tracker import webcam_sessions, new_face_tracker
+from .emotion_cache import cache_stats
+from .executor import frame_executor, ServerBusyError
+from .chunked import shutdown_chunk_pool
+from .jobs import job_store, job_pool, job_status, run_job, JOB_QUEUED, JOB_RUNNING
+from .streaming import FFmpegPipeCapture, ffmpeg_available, needs_seeking, probe_stream
+from .timeline import query_timeline, timeline_path_for
+from .result_cache import result_cache, result_cache_key
+from .uploads import UploadStore, UploadError
+from .metrics import registry as metrics_registry
+from . import config
 
 
 # Configure basic logging
@@ -34,10 +56,18 @@ async def lifespan(app: FastAPI):
         logger.error(f"Fatal error during startup: {e}")
         # Depending on policy, you might want to prevent FastAPI from starting
         # or let it start in a degraded state. For now, it will log and continue.
+    if config.INFERENCE_BATCHING_ENABLED:
+        await inference_scheduler.start()
+    job_pool.start()
+    emotion_log_writer.start()
     yield
     # Clean up the ML models and release the resources
     logger.info("Application shutdown: Cleaning up resources...")
-    # Add any cleanup logic here if necessary
+    await inference_scheduler.stop()
+    frame_executor.shutdown()
+    job_pool.stop()
+    shutdown_chunk_pool()
+    emotion_log_writer.stop() # Last, so rows logged by finishing requests and jobs are written
 
 app = FastAPI(title="Emotion Recognition API", lifespan=lifespan)
 
@@ -50,53 +80,203 @@ app.add_middleware(
     allow_headers=["*"], # Allows all headers
 )
 
+# --- Backpressure: saturated executors answer 503 with Retry-After ---
+@app.exception_handler(ServerBusyError)
+async def server_busy_handler(request: Request, exc: ServerBusyError):
+    logger.warning(f"Rejecting {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry later."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
 TEMP_VIDEO_DIR = "temp_videos_api" 
 PROCESSED_VIDEO_DIR = "processed_videos_api"
 os.makedirs(TEMP_VIDEO_DIR, exist_ok=True)
 os.makedirs(PROCESSED_VIDEO_DIR, exist_ok=True)
+# Chunked uploads are staged next to regular ones, so a finalized file is queued without copying
+upload_store = UploadStore(config.UPLOADS_DB_PATH, TEMP_VIDEO_DIR, config.UPLOAD_TTL_S)
 
 # --- Health Check ---
 @app.get("/")
 async def read_root():
     return {"message": "Emotion Recognition API is running. Model and cascade should be loaded."}
 
+# --- Model Information ---
+@app.get("/model")
+async def read_model_info():
+    """Reports the inference backend, model file and precision in use."""
+    return model_info()
+
+# --- Runtime Statistics ---
+@app.get("/stats")
+async def read_stats():
+    """Exposes queue depths, batch sizes and wait times of the background workers."""
+    # The job and result cache figures come from SQLite
+    video_jobs = await run_in_threadpool(job_pool.stats)
+    result_cache_stats = await run_in_threadpool(result_cache.stats)
+    return {
+        "inference_scheduler": inference_scheduler.stats(),
+        "frame_executor": frame_executor.stats(),
+        "video_jobs": video_jobs,
+        "result_cache": result_cache_stats,
+        "emotion_log": emotion_log_writer.stats(),
+        "emotion_cache": {**cache_stats.snapshot(), "webcam_sessions": len(webcam_sessions)},
+    }
+
+# --- Prometheus Metrics ---
+def _queue_depths() -> dict:
+    scheduler_stats, log_stats = inference_scheduler.stats(), emotion_log_writer.stats()
+    return {
+        ("inference_requests",): scheduler_stats["queue_depth_requests"],
+        ("inference_faces",): scheduler_stats["queue_depth_faces"],
+        ("frame_executor",): frame_executor.stats()["in_flight"],
+        ("video_jobs_queued",): job_store.count(JOB_QUEUED),
+        ("video_jobs_running",): job_store.count(JOB_RUNNING),
+        ("emotion_log",): log_stats["queue_depth"],
+    }
+
+def _video_fps() -> float:
+    # From the job table, so jobs running in worker processes are included
+    return sum(job_status(job)["fps"] or 0.0 for job in job_store.list_by_status(JOB_RUNNING))
+
+metrics_registry.gauge("emotion_queue_depth", "Items waiting or in flight per internal queue.",
+                       labelnames=("queue",), function=_queue_depths)
+metrics_registry.gauge("emotion_video_fps", "Combined frames per second of the running video jobs.", function=_video_fps)
+metrics_registry.gauge("emotion_model_load_seconds", "Time it took to load the emotion model at startup.",
+                       function=lambda: model_info()["load_seconds"])
+metrics_registry.gauge("emotion_webcam_sessions", "Webcam sessions with face tracking state.",
+                       function=lambda: len(webcam_sessions))
+
+@app.get("/metrics")
+async def read_metrics():
+    """
+    Per-stage latency histograms (decode, detect, preprocess, predict, draw, encode, log
+    writes), faces per frame, inference batch sizes, queue depths, video fps and model
+    load time in the Prometheus text format.
+    """
+    body = await run_in_threadpool(metrics_registry.render) # Queue-depth gauges query SQLite
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- Analytics over the Emotion Log ---
+def _parse_time(value: str, name: str):
+    try:
+        return parse_time(value) if value else None # Naive local time, like the rollups
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be an ISO 8601 date/time, got '{value}'.")
+
+def _require_rollups():
+    if rollup_store is None:
+        raise HTTPException(status_code=404, detail="Analytics rollups are disabled (ANALYTICS_ROLLUPS_ENABLED=false).")
+
+@app.get("/analytics/summary")
+async def analytics_summary(source: str = None, video: str = None, bucket: str = "1m",
+                            from_: str = Query(None, alias="from"), to: str = None):
+    """
+    Emotion counts and distribution over time, read from the per-minute rollup table.
+    'from'/'to' are ISO 8601 times (default: the last 24 hours); 'bucket' is one of 1m, 5m, 15m, 1h, 1d.
+    """
+    _require_rollups()
+    if bucket not in BUCKET_MINUTES:
+        raise HTTPException(status_code=400, detail=f"'bucket' must be one of {list(BUCKET_MINUTES)}.")
+    end = _parse_time(to, "to") or datetime.now()
+    start = _parse_time(from_, "from") or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'.")
+    if (end - start) / timedelta(minutes=BUCKET_MINUTES[bucket]) > config.ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range spans more than {config.ANALYTICS_MAX_BUCKETS} buckets, use a coarser bucket.")
+    return await run_in_threadpool(rollup_store.summary, start, end, bucket, source, video)
+
+@app.get("/analytics/videos")
+async def analytics_videos(source: str = None):
+    """Per-video emotion totals, read from the per-video rollup table."""
+    _require_rollups()
+    return {"videos": await run_in_threadpool(rollup_store.videos, source)}
+
+@app.get("/detections/{video_filename}")
+async def video_detections(video_filename: str, emotion: str = None, min_probability: float = 0.0, limit: int = 1000):
+    """
+    Logged detections of one video, e.g. ?emotion=ANGRY&min_probability=0.6 for all frames
+    where ANGRY scored above 0.6. Needs LOG_BACKEND=sqlite.
+    """
+    if detection_store is None:
+        raise HTTPException(status_code=404, detail="Detection queries need LOG_BACKEND=sqlite.")
+    try:
+        detections = await run_in_threadpool(detection_store.frames_where, video_filename, emotion, min_probability,
+                                             None, None, min(limit, 10000))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"video": video_filename, "count": len(detections), "detections": detections}
+
 # --- API Endpoint for Webcam Frame Prediction ---
+def _wants_json(request: Request, response_format: str = None) -> bool:
+    """Detections-only mode, chosen with ?format=json or an Accept header preferring JSON over images."""
+    if response_format:
+        return response_format.lower() == "json"
+    accept = request.headers.get("accept", "")
+    return "application/json" in accept and "image/" not in accept
+
+async def _predict_webcam_detections(frame: np.ndarray, faces, session_id: str = None) -> list:
+    if resources_loaded() and session_id:
+        tracker, session_lock, frame_index = webcam_sessions.get(session_id)
+        async with session_lock:
+            return await predict_tracked_faces_async(frame, faces, tracker, frame_index)
+    if resources_loaded():
+        # Face crops are classified together with those of other in-flight requests
+        return await predict_emotions_for_faces_async(frame, faces)
+    logger.warning("Model or cascade not loaded, returning frame without detections.")
+    return []
+
+def _detections_payload(frame: np.ndarray, detections: list) -> dict:
+    return {"width": frame.shape[1], "height": frame.shape[0], "detections": compact_detections(detections)}
+
 @app.post("/predict_webcam")
-async def predict_webcam_frame(file: UploadFile = File(...)):
+async def predict_webcam_frame(request: Request, file: UploadFile = File(...), session_id: str = None,
+                               response_format: str = Query(None, alias="format")):
     """
     Receives a single webcam frame image, predicts emotions,
     and returns the frame with emotion labels drawn.
+    With ?format=json (or Accept: application/json) only the detections are returned as JSON,
+    skipping the server-side drawing and JPEG re-encode; the client draws the boxes itself.
+    Decoding, detection and encoding run on the frame executor; responds 503 when it is saturated.
+    With a session_id, faces are tracked across the client's frames and unchanged faces
+    reuse their cached, smoothed emotion instead of re-running the model.
     """
     try:
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        async with frame_executor.admit():
+            contents = await file.read()
+            frame, faces = await frame_executor.run(decode_and_detect, contents)
 
-        if frame is None:
-            logger.warning("Received empty or invalid frame for webcam prediction.")
-            raise HTTPException(status_code=400, detail="Could not decode image from received data.")
+            if frame is None:
+                logger.warning("Received empty or invalid frame for webcam prediction.")
+                raise HTTPException(status_code=400, detail="Could not decode image from received data.")
 
-        detections = predict_emotions_on_frame_data(frame)
+            detections = await _predict_webcam_detections(frame, faces, session_id)
 
-        # --- LOG THE DATA ---
-        log_emotion_data(source='webcam', detections=detections)
-        # --------------------
+            # --- LOG THE DATA ---
+            log_emotion_data(source='webcam', detections=detections)
+            # --------------------
 
-        labeled_frame = draw_labels_on_frame(frame.copy(), detections) # Use a copy
+            if _wants_json(request, response_format):
+                return _detections_payload(frame, detections)
 
-        # Encode the labeled frame to JPEG
-        is_success, buffer = cv2.imencode(".jpg", labeled_frame)
-        if not is_success:
-            logger.error("Failed to encode labeled frame to JPEG.")
-            raise HTTPException(status_code=500, detail="Failed to encode processed image.")
-        
-        io_buf = io.BytesIO(buffer)
+            # Draw on a copy and encode the labeled frame to JPEG
+            jpeg_bytes = await frame_executor.run(draw_and_encode_jpeg, frame, detections)
+            if jpeg_bytes is None:
+                logger.error("Failed to encode labeled frame to JPEG.")
+                raise HTTPException(status_code=500, detail="Failed to encode processed image.")
+
+        io_buf = io.BytesIO(jpeg_bytes)
         
         # Return the image as a streaming response
         return StreamingResponse(io_buf, media_type="image/jpeg")
 
-    except HTTPException as e:
-        # Re-raise HTTPException to let FastAPI handle it
+    except (HTTPException, ServerBusyError) as e:
+        # Re-raise to let FastAPI (and the ServerBusyError handler) deal with it
         raise e
     except Exception as e:
         logger.error(f"Error in /predict_webcam: {e}", exc_info=True)
@@ -105,98 +285,426 @@ async def predict_webcam_frame(file: UploadFile = File(...)):
         if file:
             await file.close()
 
+# --- API Endpoint for Batched Frame Prediction ---
+@app.post("/predict_webcam_batch")
+async def predict_webcam_batch(files: List[UploadFile] = File(...)):
+    """
+    Receives several images in one request and returns the detections of each, in order.
+    All images are decoded and detected on the frame executor, which admits the request
+    with one slot per image, and their faces are classified together by the inference
+    scheduler. Undecodable images get an "error" entry.
+    """
+    if len(files) > config.WEBCAM_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {config.WEBCAM_BATCH_MAX_IMAGES} images per request.")
+    try:
+        async with frame_executor.admit(slots=len(files)):
+            contents = [await file.read() for file in files]
+            decoded = await asyncio.gather(*(frame_executor.run(decode_and_detect, data) for data in contents))
+            frames = [(frame, faces) for frame, faces in decoded if frame is not None]
+            all_detections = iter(await asyncio.gather(
+                *(_predict_webcam_detections(frame, faces) for frame, faces in frames)))
+
+            results = []
+            for file, (frame, _) in zip(files, decoded):
+                if frame is None:
+                    results.append({"filename": file.filename, "error": "Could not decode image."})
+                    continue
+                detections = next(all_detections)
+                # --- LOG THE DATA ---
+                log_emotion_data(source='webcam', detections=detections)
+                # --------------------
+                results.append({"filename": file.filename, **_detections_payload(frame, detections)})
+        return {"results": results}
+
+    except (HTTPException, ServerBusyError) as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error in /predict_webcam_batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {str(e)}")
+    finally:
+        for file in files:
+            await file.close()
+
+
+# --- WebSocket Endpoint for Streaming Webcam Inference ---
+@app.websocket("/ws/webcam")
+async def webcam_websocket(websocket: WebSocket):
+    """
+    Persistent webcam stream: the client sends JPEG frames as binary messages and gets
+    back compact JSON detections (boxes, labels, probabilities) to draw itself.
+    Only the newest unprocessed frame is kept, so when the server falls behind stale
+    frames are dropped instead of queueing up latency. Faces are tracked per connection.
+    """
+    await websocket.accept()
+    tracker = new_face_tracker()
+    latest = {"data": None}
+    frame_ready = asyncio.Event()
+    counters = {"received": 0, "dropped": 0}
+
+    async def receive_frames():
+        while True:
+            data = await websocket.receive_bytes()
+            counters["received"] += 1
+            if latest["data"] is not None:
+                counters["dropped"] += 1 # Replaced before it was processed
+            latest["data"] = data
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    await websocket.send_text(json.dumps({"type": "hello", "labels": EMOTION_LABELS}))
+    try:
+        for frame_index in itertools.count(): # 0-based, like the video frame indexes in the log
+            wait_for_frame = asyncio.create_task(frame_ready.wait())
+            done, _ = await asyncio.wait({receiver, wait_for_frame}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                wait_for_frame.cancel()
+                receiver.result() # Re-raises WebSocketDisconnect
+            frame_ready.clear()
+            data, latest["data"] = latest["data"], None
+
+            try:
+                async with frame_executor.admit():
+                    frame, faces = await frame_executor.run(decode_and_detect, data)
+            except ServerBusyError:
+                counters["dropped"] += 1
+                await websocket.send_text(json.dumps({"type": "busy", "frame": frame_index}))
+                continue
+            if frame is None:
+                await websocket.send_text(json.dumps({"type": "error", "frame": frame_index, "detail": "Could not decode image."}))
+                continue
+
+            detections = []
+            if resources_loaded():
+                detections = await predict_tracked_faces_async(frame, faces, tracker, frame_index)
+
+            # --- LOG THE DATA ---
+            log_emotion_data(source='webcam', detections=detections, frame_index=frame_index)
+            # --------------------
+
+            await websocket.send_text(json.dumps({
+                "type": "detections",
+                "frame": frame_index,
+                "width": frame.shape[1],
+                "height": frame.shape[0],
+                "dropped": counters["dropped"],
+                "detections": compact_detections(detections),
+            }, separators=(",", ":")))
+    except WebSocketDisconnect:
+        logger.info(f"Webcam WebSocket closed after {counters['received']} frames ({counters['dropped']} dropped).")
+    except Exception as e:
+        logger.error(f"Error in /ws/webcam: {e}", exc_info=True)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close(code=1011)
+    finally:
+        receiver.cancel()
+
 
 # --- API Endpoint for Uploading and Processing Video ---
-@app.post("/predict_video")
+@app.post("/predict_video", status_code=202)
 async def predict_video_emotions(file: UploadFile = File(...)):
     """
-    Receives an uploaded video file, processes it to detect and label emotions
-    on each frame (or Nth frame), and returns the processed video file.
+    Receives an uploaded video file and queues it for processing.
+    Returns right away with a job ID; progress is reported by GET /jobs/{job_id}
+    and the result is served by /download_video once the job is done.
+    The upload is hashed while it is saved: content already processed with the current
+    model and settings is answered from the result cache (200, "cached": true), and
+    content with a job still in progress shares that job instead of queueing another.
     """
     if not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.webm')):
         raise HTTPException(status_code=400, detail="Invalid video file type. Please upload MP4, AVI, MOV, or WebM.")
 
+    if await run_in_threadpool(job_store.count, JOB_QUEUED) >= config.VIDEO_MAX_QUEUED_JOBS:
+        raise ServerBusyError("video-jobs", config.BUSY_RETRY_AFTER_S)
+
     temp_file_path = os.path.join(TEMP_VIDEO_DIR, f"{uuid.uuid4()}_{file.filename}")
+    try:
+        # Save uploaded file; it stays on disk until its job has run
+        content_sha256 = await run_in_threadpool(_save_upload, file.file, temp_file_path)
+        logger.info(f"Video '{file.filename}' uploaded and saved to '{temp_file_path}' (sha256 {content_sha256[:12]}).")
+        return await _queue_staged_video(file.filename, temp_file_path, content_sha256)
+
+    except Exception as e:
+        logger.error(f"Error queueing video '{file.filename}': {e}", exc_info=True)
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise HTTPException(status_code=500, detail=f"Error queueing video: {str(e)}")
+    finally:
+        if file:
+            await file.close()
+
+def _video_job_response(message: str, job_id: str, processed_video_id: str, cached: bool = False) -> dict:
+    return {
+        "message": message,
+        "cached": cached,
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}" if job_id else None,
+        "processed_video_id": processed_video_id, # ID to use for downloading
+        "download_url": f"/download_video/{processed_video_id}.mp4", # Available once the job is done
+        "timeline_url": f"/video_timeline/{processed_video_id}",
+    }
+
+async def _queue_staged_video(video_filename: str, temp_file_path: str, content_sha256: str):
+    """
+    Queues a fully saved upload as a video job, unless the result cache already has its
+    output (200, "cached": true) or the same content is still being processed by another job.
+    """
+    cache_key = None
+    if config.RESULT_CACHE_ENABLED:
+        cache_key = result_cache_key(content_sha256)
+        cached = await run_in_threadpool(result_cache.lookup, cache_key)
+        existing_job = None if cached else await run_in_threadpool(job_store.find_active_by_cache_key, cache_key)
+        if cached or existing_job:
+            os.remove(temp_file_path)
+        if cached:
+            logger.info(f"Result cache hit for '{video_filename}': reusing {cached['processed_video_id']}.")
+            return JSONResponse(status_code=200, content=_video_job_response(
+                "Video already processed, returning the cached result.", None, cached["processed_video_id"], cached=True))
+        if existing_job:
+            logger.info(f"Video '{video_filename}' is already being processed by job {existing_job['id']}.")
+            return _video_job_response("The same video is already queued, sharing its job.",
+                                       existing_job["id"], existing_job["processed_video_id"])
+
     processed_file_id = str(uuid.uuid4())
     # Ensure output is mp4 for broader compatibility, even if input is different
     output_video_path = os.path.join(PROCESSED_VIDEO_DIR, f"{processed_file_id}.mp4")
+    job_id = await run_in_threadpool(job_store.enqueue, video_filename, temp_file_path, output_video_path,
+                                     processed_file_id, cache_key=cache_key)
+    job_pool.notify()
+    logger.info(f"Queued job {job_id} for video '{video_filename}'.")
+    return _video_job_response("Video queued for processing.", job_id, processed_file_id)
+
+# --- API Endpoint for Streaming Video Ingestion ---
+_streaming_slots = threading.BoundedSemaphore(config.STREAM_MAX_CONCURRENT)
 
+@app.post("/predict_video_stream", status_code=202)
+async def predict_video_stream(request: Request, filename: str):
+    """
+    Receives a video as the raw request body and starts processing it while it is still
+    being uploaded: the bytes are piped into an ffmpeg decoder (see streaming.py) instead
+    of being staged in temp_videos_api first. Returns once the upload is complete, with a
+    job ID to poll like /predict_video. Containers that need seeking (mp4 with the moov
+    atom at the end), a missing ffmpeg or all streaming slots busy fall back to staging
+    the upload and queueing a regular job.
+    """
+    if not filename.lower().endswith(('.mp4', '.avi', '.mov', '.webm')):
+        raise HTTPException(status_code=400, detail="Invalid video file type. Please upload MP4, AVI, MOV, or WebM.")
+    video_filename = os.path.basename(filename)
+
+    # Buffer the start of the upload to decide whether it can be decoded as it arrives.
+    # The same async generator is resumed by the loops below.
+    stream = request.stream()
+    head, digest = bytearray(), hashlib.sha256()
     try:
-        # Save uploaded file temporarily
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info(f"Video '{file.filename}' uploaded and saved to '{temp_file_path}'.")
-
-        cap = cv2.VideoCapture(temp_file_path)
-        if not cap.isOpened():
-            logger.error(f"Could not open video file: {temp_file_path}")
-            raise HTTPException(status_code=500, detail=f"Could not open video file: {file.filename}")
-
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        if fps == 0: fps = 25 # Default fps if not readable
-
-        # Use 'mp4v' for .mp4 output
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out_writer = cv2.VideoWriter(output_video_path, fourcc, fps, (frame_width, frame_height))
-        
-        logger.info(f"Processing video '{file.filename}' to '{output_video_path}'. Resolution: {frame_width}x{frame_height}, FPS: {fps}")
+        async for chunk in stream:
+            head += chunk
+            if len(head) >= config.STREAM_PROBE_BYTES:
+                break
+    except ClientDisconnect:
+        logger.warning(f"Client disconnected while sending the start of '{video_filename}'.")
+        raise HTTPException(status_code=400, detail="Upload interrupted.")
+    digest.update(head)
 
-        frame_count = 0
-        PROCESS_EVERY_N_FRAMES = 5 # Optimization: process every 5th frame
-        last_detections = []
+    capture = None
+    if config.STREAM_INGEST_ENABLED and ffmpeg_available() and not needs_seeking(head) \
+            and _streaming_slots.acquire(blocking=False):
+        try:
+            stream_info = await run_in_threadpool(probe_stream, bytes(head))
+            capture = FFmpegPipeCapture(**stream_info)
+        except Exception as e:
+            logger.warning(f"Cannot stream '{video_filename}' ({e}), staging it instead.")
+            _streaming_slots.release()
+        except BaseException: # Cancelled: the slot must not leak either
+            _streaming_slots.release()
+            raise
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break # End of video
-            
-            frame_count += 1
-            current_detections_to_draw = []
+    if capture is None:
+        if await run_in_threadpool(job_store.count, JOB_QUEUED) >= config.VIDEO_MAX_QUEUED_JOBS:
+            raise ServerBusyError("video-jobs", config.BUSY_RETRY_AFTER_S)
+        temp_file_path = os.path.join(TEMP_VIDEO_DIR, f"{uuid.uuid4()}_{video_filename}")
+        try:
+            with open(temp_file_path, "wb") as buffer:
+                await run_in_threadpool(buffer.write, bytes(head))
+                async for chunk in stream:
+                    digest.update(chunk)
+                    await run_in_threadpool(buffer.write, chunk)
+            logger.info(f"Video '{video_filename}' staged to '{temp_file_path}' (sha256 {digest.hexdigest()[:12]}).")
+            return await _queue_staged_video(video_filename, temp_file_path, digest.hexdigest())
+        except ClientDisconnect:
+            logger.warning(f"Client disconnected while staging '{video_filename}'.")
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise HTTPException(status_code=400, detail="Upload interrupted.")
+        except Exception as e:
+            logger.error(f"Error staging video '{video_filename}': {e}", exc_info=True)
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise HTTPException(status_code=500, detail=f"Error queueing video: {str(e)}")
 
-            if frame_count % PROCESS_EVERY_N_FRAMES == 0:
-                detections = predict_emotions_on_frame_data(frame)
+    processed_file_id = str(uuid.uuid4())
+    output_video_path = os.path.join(PROCESSED_VIDEO_DIR, f"{processed_file_id}.mp4")
+    try:
+        job = await run_in_threadpool(job_store.start_streaming, video_filename, output_video_path, processed_file_id)
+        threading.Thread(target=_run_streaming_job, args=(job, capture), name=f"video-stream-{job['id'][:8]}",
+                         daemon=True).start()
+    except BaseException:
+        # The job thread never started, so it cannot release the slot or the decoder
+        capture.abort()
+        capture.release()
+        _streaming_slots.release()
+        raise
+    logger.info(f"Streaming job {job['id']} started for '{video_filename}'.")
 
-                # --- LOG THE DATA ---
-                log_emotion_data(source='video', detections=detections, video_filename=file.filename)
-                # --------------------
-                
-                last_detections = detections # Store for intermediate frames
-                current_detections_to_draw = detections
-                if frame_count % (PROCESS_EVERY_N_FRAMES * 10) == 0: # Log progress less frequently
-                    logger.info(f"Processing video '{file.filename}', around frame {frame_count}...")
-            else:
-                # For intermediate frames, use the last known detections
-                current_detections_to_draw = last_detections
-            
-            frame_with_emotions = draw_labels_on_frame(frame.copy(), current_detections_to_draw)
-            out_writer.write(frame_with_emotions)
-
-        cap.release()
-        out_writer.release()
-        logger.info(f"Video processing complete for '{file.filename}'. Output: '{output_video_path}'")
-        
-        # Provide a way to download the processed video
-        # The frontend will typically call a GET endpoint for this ID
-        return {
-            "message": "Video processed successfully.", 
-            "processed_video_id": processed_file_id, # ID to use for downloading
-            "download_url": f"/download_video/{processed_file_id}.mp4" # Relative URL for download
-        }
-
-    except HTTPException as e:
-        raise e # Re-raise FastAPI's HTTP exceptions
-    except Exception as e:
-        logger.error(f"Error processing video '{file.filename}': {e}", exc_info=True)
-        if os.path.exists(output_video_path): # Clean up partially processed file
-            os.remove(output_video_path)
-        raise HTTPException(status_code=500, detail=f"Error processing video: {str(e)}")
+    try:
+        await run_in_threadpool(capture.write, bytes(head))
+        async for chunk in stream:
+            digest.update(chunk)
+            await run_in_threadpool(capture.write, chunk)
+    except ClientDisconnect:
+        logger.warning(f"Client disconnected while streaming '{video_filename}', aborting job {job['id']}.")
+        capture.abort()
+        raise HTTPException(status_code=400, detail="Upload interrupted.")
+    except (BrokenPipeError, ValueError, OSError) as e:
+        # The decoder stopped early; the job reports why
+        logger.warning(f"Decoder for job {job['id']} stopped before the upload ended: {e}")
+    else:
+        if config.RESULT_CACHE_ENABLED: # Set before EOF reaches the decoder, so the finished job can register it
+            await run_in_threadpool(job_store.set_cache_key, job["id"], result_cache_key(digest.hexdigest(), streamed=True))
     finally:
-        if os.path.exists(temp_file_path): # Clean up temporary uploaded file
-            os.remove(temp_file_path)
-        if file:
-            await file.close()
+        capture.close_input()
+
+    return _video_job_response("Video uploaded, processing started while it was arriving.", job["id"], processed_file_id)
+
+def _run_streaming_job(job: dict, capture):
+    try:
+        run_job(job_store.db_path, job, capture=capture, cancel=job_pool.stopping)
+    finally:
+        _streaming_slots.release()
+
+# --- Resumable Chunked Upload API ---
+@app.post("/uploads", status_code=201)
+async def create_upload(request: Request):
+    """
+    Starts a resumable upload. JSON body: {"filename": ..., "size": <bytes>, "sha256": <optional hex>}.
+    The client then PUTs the file in chunks (any order, retries allowed) and finalizes it;
+    after a dropped connection, GET /uploads/{id} tells which byte ranges are still missing.
+    """
+    try:
+        body = await request.json()
+        filename, size = os.path.basename(str(body["filename"])), int(body["size"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail='Expected a JSON body with "filename" and "size".')
+    if not filename.lower().endswith(('.mp4', '.avi', '.mov', '.webm')):
+        raise HTTPException(status_code=400, detail="Invalid video file type. Please upload MP4, AVI, MOV, or WebM.")
+    if not 0 < size <= config.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload size must be between 1 and {config.UPLOAD_MAX_BYTES} bytes.")
+    sha256 = body.get("sha256")
+    if sha256 is not None and (len(sha256) != 64 or any(c not in "0123456789abcdefABCDEF" for c in sha256)):
+        raise HTTPException(status_code=400, detail='"sha256" must be a hex SHA-256 digest.')
+    if await run_in_threadpool(job_store.count, JOB_QUEUED) >= config.VIDEO_MAX_QUEUED_JOBS:
+        raise ServerBusyError("video-jobs", config.BUSY_RETRY_AFTER_S)
+
+    upload = await run_in_threadpool(upload_store.create, filename, size, sha256)
+    logger.info(f"Chunked upload {upload['upload_id']} started for '{filename}' ({size} bytes).")
+    return {**upload, "chunk_size": config.UPLOAD_CHUNK_BYTES, "upload_url": f"/uploads/{upload['upload_id']}"}
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Received byte ranges ([start, end) pairs) of an upload, to resume after an interruption."""
+    upload = await run_in_threadpool(upload_store.status, upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return upload
+
+@app.put("/uploads/{upload_id}")
+async def put_upload_chunk(request: Request, upload_id: str, offset: int):
+    """
+    Writes the raw request body at `offset` of the staging file. The body is streamed to
+    disk with os.pwrite piece by piece and hashed on the way, so neither the chunk nor the
+    file is held in memory. If an X-Chunk-SHA256 header is sent, the chunk only counts as
+    received when it matches; otherwise the client has to re-send it.
+    """
+    expected_sha256 = request.headers.get("x-chunk-sha256")
+    content_length = request.headers.get("content-length")
+    length = int(content_length) if content_length and content_length.isdigit() else None
+    if length is not None and length > config.UPLOAD_MAX_CHUNK_BYTES:
+        raise HTTPException(status_code=413, detail=f"Chunks are limited to {config.UPLOAD_MAX_CHUNK_BYTES} bytes.")
+    upload = await run_in_threadpool(upload_store.open_chunk, upload_id, offset, length or 1)
+
+    digest, written = hashlib.sha256(), 0
+    fd = os.open(upload["path"], os.O_WRONLY)
+    try:
+        async for piece in request.stream():
+            if not piece:
+                continue
+            if offset + written + len(piece) > upload["size"] or written + len(piece) > config.UPLOAD_MAX_CHUNK_BYTES:
+                raise UploadError(416, "Chunk extends past the declared file size or the chunk size limit.")
+            digest.update(piece)
+            await run_in_threadpool(upload_store.write_at, fd, piece, offset + written)
+            written += len(piece)
+        if written == 0:
+            raise UploadError(400, "Empty chunk.")
+        if expected_sha256 and expected_sha256.lower() != digest.hexdigest():
+            raise UploadError(422, f"Chunk checksum mismatch at offset {offset}, please re-send it.")
+    except (UploadError, ClientDisconnect) as e:
+        if written:
+            await run_in_threadpool(upload_store.discard_range, upload_id, offset, written)
+        if isinstance(e, ClientDisconnect):
+            logger.warning(f"Client disconnected during chunk at offset {offset} of upload {upload_id}.")
+            raise HTTPException(status_code=400, detail="Upload interrupted.")
+        raise
+    finally:
+        os.close(fd)
+
+    await run_in_threadpool(upload_store.commit_chunk, upload_id, offset, written)
+    status = await run_in_threadpool(upload_store.status, upload_id)
+    return {"offset": offset, "length": written, "sha256": digest.hexdigest(),
+            "received_bytes": status["received_bytes"], "complete": status["complete"]}
+
+@app.post("/uploads/{upload_id}/finalize", status_code=202)
+async def finalize_upload(upload_id: str):
+    """
+    Verifies that every byte arrived (and the whole-file SHA-256, if one was declared) and
+    queues the staged file for processing. Answers like /predict_video, including result
+    cache hits, since the file hash is computed here anyway.
+    """
+    if await run_in_threadpool(job_store.count, JOB_QUEUED) >= config.VIDEO_MAX_QUEUED_JOBS:
+        raise ServerBusyError("video-jobs", config.BUSY_RETRY_AFTER_S)
+    upload, content_sha256 = await run_in_threadpool(upload_store.finalize, upload_id)
+    logger.info(f"Chunked upload {upload_id} of '{upload['filename']}' finalized (sha256 {content_sha256[:12]}).")
+    try:
+        return await _queue_staged_video(upload["filename"], upload["path"], content_sha256)
+    except Exception as e:
+        logger.error(f"Error queueing video '{upload['filename']}': {e}", exc_info=True)
+        if os.path.exists(upload["path"]):
+            os.remove(upload["path"])
+        raise HTTPException(status_code=500, detail=f"Error queueing video: {str(e)}")
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Abandons an upload and deletes its staging file."""
+    if not await run_in_threadpool(upload_store.delete, upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return {"message": "Upload deleted.", "upload_id": upload_id}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Reports status, frames done/total, fps and ETA of a video job."""
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_status(job)
+
+def _save_upload(source, destination_path: str) -> str:
+    """Copies the upload to disk and returns its SHA-256, computed on the same pass."""
+    digest = hashlib.sha256()
+    with open(destination_path, "wb") as buffer:
+        while True:
+            chunk = source.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
 
 @app.get("/download_video/{video_file_name}")
 async def download_video(video_file_name: str):
@@ -207,7 +715,32 @@ async def download_video(video_file_name: str):
     file_path = os.path.join(PROCESSED_VIDEO_DIR, video_file_name)
     if os.path.exists(file_path):
         return FileResponse(path=file_path, media_type='video/mp4', filename=video_file_name)
+    job = await run_in_threadpool(job_store.get_by_processed_video_id, os.path.splitext(video_file_name)[0])
+    if job is not None and job["status"] in (JOB_QUEUED, JOB_RUNNING):
+        raise HTTPException(status_code=409, detail=f"Video is still being processed (job {job['id']} is {job['status']}).")
     else:
         logger.warning(f"Download request for non-existent video: {video_file_name}")
         raise HTTPException(status_code=404, detail="Processed video not found.")
 
+@app.get("/video_timeline/{processed_video_id}")
+async def video_timeline(processed_video_id: str, start: float = None, end: float = None,
+                         response_format: str = Query("json", alias="format")):
+    """
+    Per-frame detections (frame index, time, track, box, label, probabilities) of a processed
+    video, optionally limited to [start, end) seconds. A frame's detections hold until the next
+    frame listed. format=npy returns the whole structured NumPy file (see timeline.py) instead.
+    """
+    if os.path.basename(processed_video_id) != processed_video_id:
+        raise HTTPException(status_code=400, detail="Invalid video ID.")
+    timeline_path = timeline_path_for(os.path.join(PROCESSED_VIDEO_DIR, f"{processed_video_id}.mp4"))
+    if not os.path.exists(timeline_path):
+        job = await run_in_threadpool(job_store.get_by_processed_video_id, processed_video_id)
+        if job is not None and job["status"] in (JOB_QUEUED, JOB_RUNNING):
+            raise HTTPException(status_code=409, detail=f"Video is still being processed (job {job['id']} is {job['status']}).")
+        raise HTTPException(status_code=404, detail="Timeline not found.")
+    if response_format == "npy":
+        return FileResponse(path=timeline_path, media_type="application/octet-stream",
+                            filename=os.path.basename(timeline_path))
+    frames = await run_in_threadpool(query_timeline, timeline_path, start, end)
+    return {"processed_video_id": processed_video_id, "labels": EMOTION_LABELS, "start": start, "end": end,
+            "frames": frames}
@@ -0,0 +1,211 @@
+import bisect
+import functools
+import logging
+import math
+import threading
+import time
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# --- Minimal Prometheus-style metrics ---
+# Counters, gauges and histograms rendered in the Prometheus text exposition format by
+# GET /metrics. Values live in the process that observes them: with CPU_EXECUTOR_KIND=process
+# the stages run inside the worker processes are not seen by the server's registry.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, 128)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names, values, extra: tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Yields (suffix, label values, extra labels, value) tuples for rendering."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield "", key, (), value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. With `function`, the value is read at scrape time
+    instead: the function returns a number, or a {label values tuple: number} dict.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is None:
+            yield from super().samples()
+            return
+        try:
+            value = self.function()
+        except Exception as e:
+            logger.warning(f"Could not collect gauge {self.name}: {e}")
+            return
+        values = value if isinstance(value, dict) else {(): value}
+        for key, v in sorted(values.items()):
+            if v is not None:
+                yield "", tuple(str(k) for k in key), (), v
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1 # Per-bucket counts, made cumulative when rendered
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Per-stage latency and work sizes (observed in processing.py, video.py, pipeline.py, datalogger.py) ---
+STAGE_SECONDS = registry.histogram(
+    "emotion_stage_seconds",
+    "Wall time of one processing stage: decode, detect, preprocess, predict, draw, encode, frame, log, log_write.",
+    labelnames=("stage",),
+)
+FACES_PER_FRAME = registry.histogram(
+    "emotion_faces_per_frame", "Faces found by each face detection pass.", buckets=COUNT_BUCKETS,
+)
+INFERENCE_BATCH_SIZE = registry.histogram(
+    "emotion_inference_batch_size", "Face crops per emotion model call.", buckets=COUNT_BUCKETS[1:],
+)
+
+
+class timed:
+    """
+    Observes the wall time of a block (`with timed("encode"): ...`) or of every call of a
+    function (`@timed("draw")`) in emotion_stage_seconds{stage=...}.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if config.METRICS_ENABLED:
+            STAGE_SECONDS.observe(time.perf_counter() - self._started, stage=self.stage)
+        return False
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage): # A fresh instance per call, so concurrent calls do not share a start time
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def observe(histogram: Histogram, value: float, **labels):
+    """histogram.observe() unless metrics are disabled."""
+    if config.METRICS_ENABLED:
+        histogram.observe(value, **labels)
@@ -0,0 +1,256 @@
+import logging
+import queue
+import threading
+
+import numpy as np
+
+from .processing import detect_faces, prepare_faces, classify_face_batch, detections_from_predictions, draw_labels_on_frame
+from .datalogger import log_emotion_data
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+_END = object() # Sentinel that flows through the queues after the last frame
+_QUEUE_POLL_S = 0.1
+
+
+class _FrameItem:
+    __slots__ = ("index", "frame", "process", "faces", "batch", "valid", "detections")
+
+    def __init__(self, index: int, frame: np.ndarray, process: bool):
+        self.index = index
+        self.frame = frame
+        self.process = process  # Whether this frame gets fresh detection + classification
+        self.faces = []
+        self.batch = None
+        self.valid = None
+        self.detections = []
+
+
+class _PipelineAborted(Exception):
+    pass
+
+
+class VideoCancelled(Exception):
+    """Raised by process_video (and the pipeline) when its should_stop() callback asks it to give up."""
+
+
+class VideoPipeline:
+    """
+    Streaming decode -> detect -> classify -> draw -> encode engine.
+
+    Each stage runs on its own thread(s) and hands frames to the next one through a
+    bounded queue, so all stages are busy at once and memory stays bounded. Detection
+    can use several workers; the classify stage restores frame order with a reorder
+    buffer and batches the face crops of consecutive frames into one model call.
+    Frames between processed frames reuse the last detections, exactly like the
+    sequential loop in video.py.
+
+    With a FaceTracker, detect and classify are replaced by a single tracking stage that
+    sees every frame in order (tracking is inherently sequential); decode, draw and
+    encode still overlap with it.
+    """
+
+    def __init__(self, cap, out_writer, video_filename: str, process_every_n: int,
+                 queue_size: int, detect_workers: int, max_batch_size: int,
+                 total_frames: int = 0, progress_callback=None, progress_every_n: int = 25, tracker=None,
+                 timeline=None, should_stop=None):
+        self.cap = cap
+        self.out_writer = out_writer
+        self.video_filename = video_filename
+        self.process_every_n = process_every_n
+        self.detect_workers = max(1, detect_workers)
+        self.max_batch_size = max_batch_size
+        self.total_frames = total_frames
+        self.progress_callback = progress_callback
+        self.progress_every_n = progress_every_n
+        self.tracker = tracker
+        self.timeline = timeline
+        self.should_stop = should_stop # Checked before every decoded frame
+
+        self._decoded = queue.Queue(maxsize=queue_size)
+        self._detected = queue.Queue(maxsize=queue_size)
+        self._classified = queue.Queue(maxsize=queue_size)
+        self._drawn = queue.Queue(maxsize=queue_size)
+        self._abort = threading.Event()
+        self._errors = []
+        self.frames_written = 0
+
+    # --- Queue helpers that give up when another stage has failed ---
+    def _put(self, q: queue.Queue, item):
+        while True:
+            if self._abort.is_set():
+                raise _PipelineAborted()
+            try:
+                q.put(item, timeout=_QUEUE_POLL_S)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue, block: bool = True):
+        while True:
+            if self._abort.is_set():
+                raise _PipelineAborted()
+            try:
+                return q.get(timeout=_QUEUE_POLL_S) if block else q.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return None
+
+    def _stage(self, fn):
+        def runner():
+            try:
+                fn()
+            except _PipelineAborted:
+                pass
+            except VideoCancelled as e:
+                self._errors.append(e)
+                self._abort.set()
+            except Exception as e:
+                logger.error(f"Video pipeline stage '{fn.__name__}' failed for '{self.video_filename}': {e}", exc_info=True)
+                self._errors.append(e)
+                self._abort.set()
+        return runner
+
+    # --- Stages ---
+    def _decode_stage(self):
+        index = 0
+        while True:
+            if self.should_stop is not None and self.should_stop():
+                raise VideoCancelled(f"Processing of '{self.video_filename}' stopped after {index} frames.")
+            with timed("decode"):
+                ret, frame = self.cap.read()
+            if not ret:
+                break # End of video
+            # frame_count in the sequential loop is 1-based
+            self._put(self._decoded, _FrameItem(index, frame, (index + 1) % self.process_every_n == 0))
+            index += 1
+        for _ in range(1 if self.tracker is not None else self.detect_workers):
+            self._put(self._decoded, _END)
+
+    def _detect_stage(self):
+        while True:
+            item = self._get(self._decoded)
+            if item is _END:
+                self._put(self._detected, _END)
+                return
+            if item.process:
+                item.faces, item.batch, item.valid = prepare_faces(item.frame, detect_faces(item.frame))
+            self._put(self._detected, item)
+
+    def _classify_stage(self):
+        reorder = {}
+        next_index = 0
+        workers_done = 0
+        last_detections = []
+
+        while True:
+            # Gather consecutive in-order frames until enough faces for a batch are ready
+            ready, faces_ready = [], 0
+            while faces_ready < self.max_batch_size:
+                if next_index in reorder:
+                    item = reorder.pop(next_index)
+                    next_index += 1
+                    ready.append(item)
+                    if item.process:
+                        faces_ready += int(item.valid.sum())
+                    continue
+                if workers_done == self.detect_workers:
+                    break
+                # Block only while we have nothing to hand on
+                item = self._get(self._detected, block=not ready)
+                if item is None:
+                    break
+                if item is _END:
+                    workers_done += 1
+                else:
+                    reorder[item.index] = item
+
+            if not ready:
+                if workers_done == self.detect_workers and not reorder:
+                    self._put(self._classified, _END)
+                    return
+                continue
+
+            self._classify_items([item for item in ready if item.process], faces_ready)
+            for item in ready:
+                if item.process:
+                    # --- LOG THE DATA ---
+                    log_emotion_data(source='video', detections=item.detections, video_filename=self.video_filename,
+                                 frame_index=item.index)
+                    last_detections = item.detections
+                else:
+                    # For intermediate frames, use the last known detections
+                    item.detections = last_detections
+                self._put(self._classified, item)
+
+    def _classify_items(self, items, faces: int):
+        """Runs one model call for the valid crops of several processed frames and fills in their detections."""
+        predictions = None
+        if faces:
+            try:
+                predictions = classify_face_batch(np.concatenate([item.batch[item.valid] for item in items], axis=0))
+            except Exception as e:
+                logger.error(f"Error during batched prediction for {faces} faces across {len(items)} frames: {e}", exc_info=True)
+        offset = 0
+        for item in items:
+            count = int(item.valid.sum())
+            item_predictions = None if predictions is None else predictions[offset:offset + count]
+            item.detections = detections_from_predictions(item.faces, item.valid, item_predictions)
+            item.batch = None # Free the crops as soon as possible
+            offset += count
+
+    def _track_stage(self):
+        while True:
+            item = self._get(self._decoded)
+            if item is _END:
+                self._put(self._classified, _END)
+                return
+            item.detections, detected = self.tracker.update(item.frame, item.index + 1)
+            if detected:
+                # --- LOG THE DATA ---
+                log_emotion_data(source='video', detections=item.detections, video_filename=self.video_filename,
+                                 frame_index=item.index)
+            self._put(self._classified, item)
+
+    def _draw_stage(self):
+        while True:
+            item = self._get(self._classified)
+            if item is _END:
+                self._put(self._drawn, _END)
+                return
+            if self.timeline is not None:
+                self.timeline.add(item.index, item.detections)
+            # The pipeline owns the decoded frame, so it can be drawn on in place
+            draw_labels_on_frame(item.frame, item.detections)
+            self._put(self._drawn, item)
+
+    def _encode_stage(self):
+        while True:
+            item = self._get(self._drawn)
+            if item is _END:
+                return
+            with timed("encode"):
+                self.out_writer.write(item.frame)
+            self.frames_written += 1
+            if self.progress_callback is not None and self.frames_written % self.progress_every_n == 0:
+                self.progress_callback(self.frames_written, self.total_frames)
+
+    def run(self) -> int:
+        """Runs all stages to completion and returns the number of frames written."""
+        if self.tracker is not None:
+            stages = [self._decode_stage, self._track_stage, self._draw_stage, self._encode_stage]
+        else:
+            stages = [self._decode_stage] + [self._detect_stage] * self.detect_workers + \
+                     [self._classify_stage, self._draw_stage, self._encode_stage]
+        threads = [
+            threading.Thread(target=self._stage(fn), name=f"video-{fn.__name__.strip('_')}-{i}", daemon=True)
+            for i, fn in enumerate(stages)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.frames_written
@@ -1,83 +1,238 @@
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array
 import os
 import logging
+import time
+
+from . import config
+from .backends import load_backend
+from .detectors import load_detector
+from .metrics import timed, observe, FACES_PER_FRAME, INFERENCE_BATCH_SIZE
 
 # --- Configuration ---
 # Assuming this script is in emotion-recognition-app/app/
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, 'models', 'model_optimal.h5')
-HAAR_CASCADE_PATH = os.path.join(BASE_DIR, 'cascades', 'haarcascade_frontalface_default.xml')
+MODEL_DIR = os.path.join(BASE_DIR, 'models')
+MODEL_PATH = os.path.join(MODEL_DIR, 'model_optimal.h5')
+# Exports written by convert_model.py, one per backend
+MODEL_FILES = {
+    "keras": 'model_optimal.h5',
+    "tflite": 'model_optimal.tflite',
+    "onnx": 'model_optimal.onnx',
+}
 
 EMOTION_LABELS = ['SURPRISED', 'FEARFUL', 'DISGUSTED', 'HAPPY', 'SAD', 'ANGRY', 'NEUTRAL']
 CNN_INPUT_SIZE = (100, 100) # Should match targetx, targety from your cnn.py
 
 # --- Load Model and Face Detector ---
-emotion_model = None
-face_cascade = None
+emotion_model = None # One of the backends in backends.py
+face_detector = None # One of the detectors in detectors.py
+model_load_seconds = None
+
+def model_path_for(backend: str, precision: str = None) -> str:
+    """
+    MODEL_FILE from the config if set, else the default export for the backend.
+    For tflite, a MODEL_PRECISION of "dynamic" or "int8" selects the quantized artifact
+    published by quantize_model.py (model_optimal_dynamic.tflite / model_optimal_int8.tflite).
+    """
+    if config.MODEL_FILE:
+        return config.MODEL_FILE
+    precision = precision or config.MODEL_PRECISION
+    if backend == "tflite" and precision != "float32":
+        return os.path.join(MODEL_DIR, f'model_optimal_{precision}.tflite')
+    return os.path.join(MODEL_DIR, MODEL_FILES[backend])
 
 def load_resources():
-    global emotion_model, face_cascade
+    global emotion_model, model_load_seconds
     if emotion_model is None:
+        model_path = model_path_for(config.MODEL_BACKEND)
         try:
-            emotion_model = load_model(MODEL_PATH)
-            logging.info(f"Keras model loaded successfully from {MODEL_PATH}")
+            started = time.perf_counter()
+            emotion_model = load_backend(config.MODEL_BACKEND, model_path, num_threads=config.MODEL_NUM_THREADS)
+            model_load_seconds = time.perf_counter() - started
+            logging.info(f"Emotion model loaded successfully from {model_path} in {model_load_seconds:.2f}s")
         except Exception as e:
-            logging.error(f"Error loading Keras model from {MODEL_PATH}: {e}", exc_info=True)
+            logging.error(f"Error loading {config.MODEL_BACKEND} model from {model_path}: {e}", exc_info=True)
             raise RuntimeError(f"Could not load emotion model: {e}")
+    load_face_detector()
 
-    if face_cascade is None:
+def load_face_detector():
+    """Only the face detector, for processes that never classify (the frame executor's workers)."""
+    global face_detector
+    if face_detector is None:
         try:
-            face_cascade = cv2.CascadeClassifier(HAAR_CASCADE_PATH)
-            if face_cascade.empty():
-                raise IOError(f"Haar cascade file not found or is empty at {HAAR_CASCADE_PATH}")
-            logging.info(f"Haar cascade loaded successfully from {HAAR_CASCADE_PATH}")
+            face_detector = load_detector(config.FACE_DETECTOR, config.FACE_DETECTOR_MODEL or None,
+                                          max_side=config.DETECT_MAX_SIDE)
         except Exception as e:
-            logging.error(f"Error loading Haar Cascade from {HAAR_CASCADE_PATH}: {e}", exc_info=True)
-            raise RuntimeError(f"Could not load face cascade: {e}")
+            logging.error(f"Error loading {config.FACE_DETECTOR} face detector: {e}", exc_info=True)
+            raise RuntimeError(f"Could not load face detector: {e}")
+
+def model_info() -> dict:
+    """Which backend, file and precision the server is running."""
+    return {
+        "loaded": emotion_model is not None,
+        "backend": config.MODEL_BACKEND,
+        "path": model_path_for(config.MODEL_BACKEND),
+        "requested_precision": config.MODEL_PRECISION,
+        "precision": getattr(emotion_model, "precision", None), # What the loaded model actually runs
+        "load_seconds": model_load_seconds,
+        "face_detector": config.FACE_DETECTOR,
+    }
+
+def resources_loaded() -> bool:
+    return emotion_model is not None and face_detector is not None
 
-def predict_emotions_on_frame_data(frame: np.ndarray):
+@timed("detect")
+def detect_faces(frame: np.ndarray):
     """
-    Detects faces in a frame and predicts emotions.
-    Returns a list of dictionaries, each containing 'roi' (x,y,w,h) and 'emotion'.
+    Runs the configured face detector (config.FACE_DETECTOR, see detectors.py) on a BGR frame.
+    Returns an (N, 4) array of (x, y, w, h) boxes (possibly empty).
     """
-    if emotion_model is None or face_cascade is None:
-        logging.warning("Model or cascade not loaded. Call load_resources() first.")
-        return []
+    faces = face_detector.detect(frame)
+    observe(FACES_PER_FRAME, len(faces))
+    return faces
+
+@timed("preprocess")
+def preprocess_faces(frame: np.ndarray, faces):
+    """
+    Crops and resizes every face ROI into one preallocated (N, 100, 100, 3) float32 batch.
+    Returns (batch, valid) where valid[i] is False if face i could not be prepared;
+    rows of invalid faces are left zeroed.
+    """
+    batch = np.zeros((len(faces), CNN_INPUT_SIZE[1], CNN_INPUT_SIZE[0], 3), dtype=np.float32)
+    valid = np.zeros(len(faces), dtype=bool)
+    for i, (x, y, w, h) in enumerate(faces):
+        try:
+            batch[i] = cv2.resize(frame[y:y+h, x:x+w], CNN_INPUT_SIZE)
+            valid[i] = True
+        except Exception as e:
+            logging.error(f"Error preprocessing face ROI at ({x},{y},{w},{h}): {e}", exc_info=True)
+    batch *= 1.0 / 255.0  # Normalize in place
+    return batch, valid
 
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(
-        gray_frame,
-        scaleFactor=1.1,
-        minNeighbors=5,
-        minSize=(30, 30),
-        flags=cv2.CASCADE_SCALE_IMAGE
-    )
+@timed("predict")
+def classify_face_batch(batch: np.ndarray) -> np.ndarray:
+    """
+    Runs the emotion model once on a (N, 100, 100, 3) batch.
+    Returns the (N, 7) softmax matrix.
+    """
+    observe(INFERENCE_BATCH_SIZE, len(batch))
+    return emotion_model.predict(batch)
 
-    detections = []
+def prepare_faces(frame: np.ndarray, faces):
+    """
+    Drops empty ROIs and builds the model input batch for the remaining faces.
+    Returns (faces, batch, valid) as used by detections_from_predictions.
+    """
+    non_empty_faces = []
     for (x, y, w, h) in faces:
-        face_roi_color = frame[y:y+h, x:x+w]
-        if face_roi_color.size == 0:
+        if frame[y:y+h, x:x+w].size == 0:
             logging.warning(f"Empty face ROI at ({x},{y},{w},{h}), skipping.")
             continue
+        non_empty_faces.append((x, y, w, h))
+    batch, valid = preprocess_faces(frame, non_empty_faces)
+    return non_empty_faces, batch, valid
+
+def detections_from_predictions(faces, valid: np.ndarray, predictions):
+    """
+    Builds the detection dicts (roi, emotion, probabilities) for prepared faces.
+    'predictions' holds one softmax row per valid face, or is None if the model call failed;
+    faces without a prediction get emotion "Error".
+    """
+    detections = []
+    pred_row = 0
+    for i, (x, y, w, h) in enumerate(faces):
+        roi = [int(x), int(y), int(w), int(h)]
+        if not valid[i] or predictions is None:
+            detections.append({"roi": roi, "emotion": "Error", "probabilities": None})
+        else:
+            emotion_index = int(np.argmax(predictions[pred_row]))
+            detections.append({
+                "roi": roi,
+                "emotion": EMOTION_LABELS[emotion_index],
+                "probabilities": [float(p) for p in predictions[pred_row]], # Softmax, ordered like EMOTION_LABELS
+            })
+        if valid[i]:
+            pred_row += 1
+    return detections
+
+def predict_emotions_for_faces(frame: np.ndarray, faces):
+    """
+    Classifies already detected face boxes with a single model call.
+    Faces that fail preprocessing, or all faces if the batched call fails, get emotion "Error".
+    """
+    faces, batch, valid = prepare_faces(frame, faces)
+    if not faces:
+        return []
+
+    predictions = None
+    if valid.any():
         try:
-            resized_face = cv2.resize(face_roi_color, CNN_INPUT_SIZE)
-            face_array = img_to_array(resized_face)
-            face_array = face_array / 255.0  # Normalize
-            face_batch = np.expand_dims(face_array, axis=0)
-
-            predictions = emotion_model.predict(face_batch, verbose=0) # verbose=0 for less console output
-            emotion_index = np.argmax(predictions[0])
-            predicted_emotion = EMOTION_LABELS[emotion_index]
-            detections.append({"roi": [int(x), int(y), int(w), int(h)], "emotion": predicted_emotion})
+            predictions = classify_face_batch(batch if valid.all() else batch[valid])
         except Exception as e:
-            logging.error(f"Error during prediction for a face ROI: {e}", exc_info=True)
-            detections.append({"roi": [int(x), int(y), int(w), int(h)], "emotion": "Error"})
-            
-    return detections
+            logging.error(f"Error during batched prediction for {int(valid.sum())} face ROIs: {e}", exc_info=True)
+    return detections_from_predictions(faces, valid, predictions)
+
+@timed("frame")
+def predict_emotions_on_frame_data(frame: np.ndarray, tracker=None, frame_index: int = 0):
+    """
+    Detects faces in a frame and predicts emotions.
+    All faces of the frame are classified in one batched model call.
+    Returns a list of dictionaries, each containing 'roi' (x,y,w,h), 'emotion' and
+    'probabilities'. With a FaceTracker (see tracker.py) faces are associated with the
+    previous frames' tracks and each dict also has 'track_id' and 'cache_hit'; the
+    probabilities are then the track's smoothed, possibly cached, softmax.
+    """
+    if not resources_loaded():
+        logging.warning("Model or cascade not loaded. Call load_resources() first.")
+        return []
+
+    faces = detect_faces(frame)
+    if tracker is not None:
+        detections, _ = tracker.update(frame, frame_index, faces=faces)
+        return detections
+    return predict_emotions_for_faces(frame, faces)
+
+def decode_and_detect(image_bytes: bytes):
+    """
+    Decodes an encoded image (JPEG/PNG) and detects faces in it.
+    Returns (frame, faces); frame is None if the data could not be decoded.
+    """
+    with timed("decode"):
+        frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None, []
+    if face_detector is None:
+        logging.warning("Face detector not loaded. Call load_resources() first.")
+        return frame, []
+    return frame, detect_faces(frame)
+
+def draw_and_encode_jpeg(frame: np.ndarray, detections: list):
+    """
+    Draws the detections on a copy of the frame and JPEG-encodes it.
+    Returns the encoded bytes, or None if encoding failed.
+    """
+    labeled_frame = draw_labels_on_frame(frame.copy(), detections)
+    with timed("encode"):
+        is_success, buffer = cv2.imencode(".jpg", labeled_frame)
+    return buffer.tobytes() if is_success else None
+
+def compact_detections(detections: list, decimals: int = 3) -> list:
+    """
+    JSON-ready copy of detection dicts for clients that draw their own overlays:
+    probabilities are rounded and internal-only keys are dropped.
+    """
+    compact = []
+    for detection in detections:
+        item = {"roi": detection["roi"], "emotion": detection["emotion"]}
+        if detection.get("probabilities") is not None:
+            item["probabilities"] = [round(p, decimals) for p in detection["probabilities"]]
+        if detection.get("track_id") is not None:
+            item["track_id"] = detection["track_id"]
+        compact.append(item)
+    return compact
 
+@timed("draw")
 def draw_labels_on_frame(frame: np.ndarray, detections: list) -> np.ndarray:
     """
     Draws bounding boxes and emotion labels on the frame.
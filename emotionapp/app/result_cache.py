@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from . import config
+from .processing import model_path_for
+from .timeline import timeline_path_for
+from .video import effective_engine, tracking_enabled
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=2)
+def processing_fingerprint(streamed: bool = False) -> str:
+    """
+    Short hash of everything besides the input that changes a processed video: the model
+    file (name, size, mtime) and precision, the video engine that actually runs (streamed
+    uploads cannot use "chunked") and the detection/tracking/smoothing settings.
+    """
+    engine = effective_engine(streamed=streamed)
+    model_path = model_path_for(config.MODEL_BACKEND)
+    try:
+        stat = os.stat(model_path)
+        model_version = [os.path.basename(model_path), stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        model_version = [os.path.basename(model_path)]
+    params = {
+        "model": [config.MODEL_BACKEND, config.MODEL_PRECISION, *model_version],
+        "face_detector": [config.FACE_DETECTOR, config.FACE_DETECTOR_MODEL, config.DETECT_MAX_SIDE, config.FACE_MIN_SIZE,
+                          config.FACE_SCORE_THRESHOLD, config.HAAR_SCALE_FACTOR, config.HAAR_MIN_NEIGHBORS,
+                          config.HAAR_PYRAMID_MIN_FACE, config.HAAR_PYRAMID_LEVELS],
+        "process_every_n_frames": config.PROCESS_EVERY_N_FRAMES,
+        "engine": engine,
+        "tracking": [tracking_enabled(engine), config.TRACKER_STALENESS_FRAMES, config.TRACKER_IOU_THRESHOLD,
+                     config.TRACKER_MAX_MISSES, config.TRACKER_OPTICAL_FLOW, config.TRACKER_EMPTY_SCENE_FRAMES],
+        "emotion_cache": [config.EMOTION_SMOOTHING_ALPHA, config.EMOTION_CACHE_HASH_THRESHOLD,
+                          config.EMOTION_CACHE_MAX_AGE_FRAMES],
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def result_cache_key(content_sha256: str, streamed: bool = False) -> str:
+    return f"{content_sha256}:{processing_fingerprint(streamed)}"
+
+
+class ResultCache:
+    """
+    Maps upload content hash + processing fingerprint to an already processed video, so a
+    re-uploaded clip is answered without reprocessing. Entries are kept in SQLite next to
+    the job table; when the cached outputs exceed `max_bytes`, the least recently used
+    entries are evicted together with their mp4 and timeline files.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    cache_key TEXT PRIMARY KEY,
+                    processed_video_id TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    video_filename TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Autocommit
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, cache_key: str):
+        """Returns the cached entry (and marks it recently used), or None on a miss."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM results WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is not None and not os.path.exists(row["output_path"]):
+                # Output deleted behind the cache's back: forget it
+                conn.execute("DELETE FROM results WHERE cache_key = ?", (cache_key,))
+                row = None
+            if row is None:
+                self._misses += 1
+                return None
+            conn.execute("UPDATE results SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+                         (time.time(), cache_key))
+        self._hits += 1
+        return dict(row)
+
+    def put(self, cache_key: str, processed_video_id: str, output_path: str, video_filename: str):
+        size_bytes = sum(os.path.getsize(p) for p in (output_path, timeline_path_for(output_path)) if os.path.exists(p))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (cache_key, processed_video_id, output_path, video_filename, "
+                "size_bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, processed_video_id, output_path, video_filename, size_bytes, now, now),
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Deletes least recently used outputs until the cache fits in max_bytes."""
+        evicted = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM results").fetchone()[0]
+                for row in conn.execute("SELECT * FROM results ORDER BY last_access").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM results WHERE cache_key = ?", (row["cache_key"],))
+                    total -= row["size_bytes"]
+                    evicted.append(row)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for row in evicted:
+            for path in (row["output_path"], timeline_path_for(row["output_path"])):
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info(f"Evicted cached result {row['processed_video_id']} ('{row['video_filename']}', {row['size_bytes']} bytes).")
+        self._evictions += len(evicted)
+        return len(evicted)
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, size_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+        lookups = self._hits + self._misses
+        return {
+            "enabled": config.RESULT_CACHE_ENABLED,
+            "entries": entries,
+            "size_bytes": size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else None,
+            "evictions": self._evictions,
+        }
+
+
+result_cache = ResultCache(config.RESULT_CACHE_DB_PATH, config.RESULT_CACHE_MAX_BYTES)
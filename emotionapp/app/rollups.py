@@ -0,0 +1,190 @@
+import math
+import sqlite3
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+BUCKET_MINUTES = {"1m": 1, "5m": 5, "15m": 15, "1h": 60, "1d": 1440}
+
+
+def parse_time(value: str) -> datetime:
+    """
+    ISO 8601 date/time as a naive local datetime, like the logged timestamps. Values with
+    an offset ("Z", "+07:00") are converted to local time. Raises ValueError.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+class RollupStore:
+    """
+    Pre-aggregated emotion counters kept in SQLite and updated as records are logged.
+
+    minute_counts holds one row per (minute, source, video, emotion) and video_counts one
+    per (video, emotion); confidence_count counts the detections that had a confidence,
+    which is what confidence_sum is averaged over. Analytics queries read a few thousand counter rows instead of
+    scanning the raw log, however many detections it holds. Used as an extra sink of the
+    emotion log writer: each flushed batch is aggregated in memory first and applied as
+    additive upserts in one transaction, so several processes can update the same store.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS minute_counts (
+                    minute INTEGER NOT NULL,
+                    source TEXT NOT NULL,
+                    video_filename TEXT NOT NULL,
+                    emotion TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    confidence_sum REAL NOT NULL,
+                    confidence_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (minute, source, video_filename, emotion)
+                ) WITHOUT ROWID
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(minute_counts)")}
+            if "confidence_count" not in columns: # Stores created before detections without confidence were counted apart
+                conn.execute("ALTER TABLE minute_counts ADD COLUMN confidence_count INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE minute_counts SET confidence_count = count WHERE confidence_sum > 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_minute_counts_video ON minute_counts (video_filename, minute)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS video_counts (
+                    video_filename TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    emotion TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    PRIMARY KEY (video_filename, source, emotion)
+                ) WITHOUT ROWID
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Autocommit
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    # --- Log writer sink interface ---
+    def write(self, records: list):
+        minutes = defaultdict(lambda: [0, 0.0, 0])
+        videos = {}
+        for record in records:
+            epoch = record["timestamp"].timestamp()
+            key = (int(epoch // 60), record["source"], record["video_filename"], record["emotion"])
+            minutes[key][0] += 1
+            if record.get("confidence") is not None:
+                minutes[key][1] += record["confidence"]
+                minutes[key][2] += 1
+            video_key = key[1:]
+            count, first_seen, last_seen = videos.get(video_key, (0, epoch, epoch))
+            videos[video_key] = (count + 1, min(first_seen, epoch), max(last_seen, epoch))
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO minute_counts (minute, source, video_filename, emotion, count, confidence_sum, "
+                    "confidence_count) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (minute, source, video_filename, emotion) DO UPDATE SET "
+                    "count = count + excluded.count, confidence_sum = confidence_sum + excluded.confidence_sum, "
+                    "confidence_count = confidence_count + excluded.confidence_count",
+                    [(*key, *values) for key, values in minutes.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO video_counts (video_filename, source, emotion, count, first_seen, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (video_filename, source, emotion) DO UPDATE SET count = count + excluded.count, "
+                    "first_seen = MIN(first_seen, excluded.first_seen), last_seen = MAX(last_seen, excluded.last_seen)",
+                    [(video, source, emotion, *values) for (source, video, emotion), values in videos.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def maintain(self):
+        pass
+
+    def close(self):
+        pass
+
+    # --- Queries ---
+    def summary(self, start: datetime, end: datetime, bucket: str = "1m", source: str = None, video: str = None) -> dict:
+        """
+        Emotion counts per time bucket, plus totals, the overall distribution and the mean
+        confidence. Counters have minute resolution: every minute overlapping [start, end)
+        is included, so the current, still partial minute is counted as well.
+        """
+        bucket_minutes = BUCKET_MINUTES[bucket]
+        first_minute, end_minute = int(start.timestamp() // 60), math.ceil(end.timestamp() / 60)
+        query = ("SELECT (minute / ?) * ? AS bucket, emotion, SUM(count) AS count, SUM(confidence_sum) AS confidence_sum, "
+                 "SUM(confidence_count) AS confidence_count FROM minute_counts WHERE minute >= ? AND minute < ?")
+        params = [bucket_minutes, bucket_minutes, first_minute, end_minute]
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+        if video:
+            query += " AND video_filename = ?"
+            params.append(video)
+        query += " GROUP BY bucket, emotion ORDER BY bucket"
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        series, totals = {}, defaultdict(int)
+        confidence, with_confidence = defaultdict(float), defaultdict(int)
+        for row in rows:
+            series.setdefault(row["bucket"], {})[row["emotion"]] = row["count"]
+            totals[row["emotion"]] += row["count"]
+            confidence[row["emotion"]] += row["confidence_sum"]
+            with_confidence[row["emotion"]] += row["confidence_count"]
+        total = sum(totals.values())
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "bucket": bucket,
+            "source": source,
+            "video": video,
+            "total": total,
+            "counts": dict(totals),
+            "distribution": {emotion: count / total for emotion, count in totals.items()} if total else {},
+            # Over the detections that had a confidence; None if none had
+            "mean_confidence": {emotion: confidence[emotion] / with_confidence[emotion] if with_confidence[emotion] else None
+                                for emotion in totals},
+            "series": [
+                {"start": datetime.fromtimestamp(minute * 60).isoformat(), "total": sum(counts.values()), "counts": counts}
+                for minute, counts in series.items()
+            ],
+        }
+
+    def videos(self, source: str = None) -> list:
+        """Per-video emotion totals with the time range each video was logged over."""
+        query = "SELECT * FROM video_counts"
+        params = []
+        if source:
+            query += " WHERE source = ?"
+            params.append(source)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY video_filename", params).fetchall()
+
+        videos = {}
+        for row in rows:
+            video = videos.setdefault((row["video_filename"], row["source"]), {
+                "video": row["video_filename"], "source": row["source"], "total": 0, "counts": {},
+                "first_seen": row["first_seen"], "last_seen": row["last_seen"],
+            })
+            video["counts"][row["emotion"]] = row["count"]
+            video["total"] += row["count"]
+            video["first_seen"] = min(video["first_seen"], row["first_seen"])
+            video["last_seen"] = max(video["last_seen"], row["last_seen"])
+        for video in videos.values():
+            video["first_seen"] = datetime.fromtimestamp(video["first_seen"]).isoformat()
+            video["last_seen"] = datetime.fromtimestamp(video["last_seen"]).isoformat()
+        return list(videos.values())
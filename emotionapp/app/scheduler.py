@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from . import config
+from .processing import classify_face_batch, prepare_faces, detections_from_predictions
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """
+    Collects face crops from all in-flight requests and classifies them together.
+
+    Requests call `await classify(batch)`. A background task takes the first pending
+    request, keeps collecting more until `max_batch_size` faces are queued or `max_wait_ms`
+    has passed, runs one forward pass on a dedicated inference thread and resolves each
+    request's future with its own rows of the softmax output.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = None
+        self._task = None
+        self._collecting = []
+        # A single thread keeps model calls serialized and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._pending_faces = 0
+        self._batches_run = 0
+        self._faces_classified = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+        self._total_wait_ms = 0.0
+        self._last_wait_ms = 0.0
+        self._total_inference_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="inference-scheduler")
+        logger.info(f"Inference scheduler started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms}).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Fail whatever is still queued or half-collected so no request hangs forever
+        leftover = list(self._collecting)
+        self._collecting = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        for _, future, _ in leftover:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference scheduler stopped."))
+        logger.info("Inference scheduler stopped.")
+
+    async def classify(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Classifies a (N, 100, 100, 3) batch, possibly together with other requests' faces.
+        Falls back to a direct model call when the scheduler is not running.
+        """
+        if len(batch) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        if not self.running:
+            return await loop.run_in_executor(self._executor, classify_face_batch, batch)
+
+        future = loop.create_future()
+        self._pending_faces += len(batch)
+        await self._queue.put((batch, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        """Waits for the first request, then gathers more until the batch is full or the window closes."""
+        items = self._collecting = [await self._queue.get()]
+        faces = len(items[0][0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while faces < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            faces += len(item[0])
+        return items, faces
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items, faces = await self._collect() # Stays in self._collecting until resolved
+            self._pending_faces -= faces
+            started = time.perf_counter()
+            wait_ms = max((started - enqueued) * 1000.0 for _, _, enqueued in items)
+
+            batch = items[0][0] if len(items) == 1 else np.concatenate([b for b, _, _ in items], axis=0)
+            try:
+                predictions = await loop.run_in_executor(self._executor, classify_face_batch, batch)
+            except Exception as e:
+                logger.error(f"Batched inference failed for {faces} faces from {len(items)} requests: {e}", exc_info=True)
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_batch, future, _ in items:
+                if not future.done(): # The request may have been cancelled meanwhile
+                    future.set_result(predictions[offset:offset + len(request_batch)])
+                offset += len(request_batch)
+
+            self._batches_run += 1
+            self._faces_classified += faces
+            self._last_batch_size = faces
+            self._max_batch_seen = max(self._max_batch_seen, faces)
+            self._last_wait_ms = wait_ms
+            self._total_wait_ms += wait_ms
+            self._total_inference_ms += (time.perf_counter() - started) * 1000.0
+
+    def stats(self) -> dict:
+        batches = max(self._batches_run, 1)
+        return {
+            "running": self.running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth_requests": self._queue.qsize() if self._queue is not None else 0,
+            "queue_depth_faces": self._pending_faces,
+            "batches_run": self._batches_run,
+            "faces_classified": self._faces_classified,
+            "last_batch_size": self._last_batch_size,
+            "max_batch_size_seen": self._max_batch_seen,
+            "avg_batch_size": self._faces_classified / batches,
+            "last_wait_ms": self._last_wait_ms,
+            "avg_wait_ms": self._total_wait_ms / batches,
+            "avg_inference_ms": self._total_inference_ms / batches,
+        }
+
+
+inference_scheduler = InferenceScheduler(
+    max_batch_size=config.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=config.INFERENCE_MAX_WAIT_MS,
+)
+
+
+async def predict_emotions_for_faces_async(frame: np.ndarray, faces) -> list:
+    """
+    Async counterpart of processing.predict_emotions_for_faces that routes the
+    model call through the shared inference scheduler.
+    """
+    faces, batch, valid = prepare_faces(frame, faces)
+    if not faces:
+        return []
+
+    predictions = None
+    if valid.any():
+        try:
+            predictions = await inference_scheduler.classify(batch if valid.all() else batch[valid])
+        except Exception as e:
+            logger.error(f"Error during scheduled prediction for {int(valid.sum())} face ROIs: {e}", exc_info=True)
+    return detections_from_predictions(faces, valid, predictions)
+
+
+async def predict_tracked_faces_async(frame: np.ndarray, faces, tracker, frame_index: int) -> list:
+    """
+    Like predict_emotions_for_faces_async, but associates the faces with the tracker's
+    tracks first; only crops its EmotionCache cannot answer go to the scheduler.
+    """
+    step = await run_in_threadpool(tracker.begin, frame, frame_index, faces)
+    predictions = None
+    model_input = step.model_input()
+    if model_input is not None:
+        try:
+            predictions = await inference_scheduler.classify(model_input)
+        except Exception as e:
+            logger.error(f"Error during scheduled prediction for {len(model_input)} tracked faces: {e}", exc_info=True)
+    return tracker.complete(step, predictions)
@@ -0,0 +1,164 @@
+import json
+import logging
+import shutil
+import struct
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ISO BMFF (mp4/mov) top-level boxes that start the media data. If 'mdat' comes before
+# 'moov', the decoder needs the end of the file before it can decode anything.
+_MP4_HEADER_BOXES = {b"moov", b"moof"}
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def needs_seeking(head: bytes) -> bool:
+    """
+    True if the container cannot be decoded front to back from its first bytes:
+    an mp4/mov whose moov atom comes after the media data (not 'faststart'),
+    or one whose header does not even fit in `head`. Other containers
+    (WebM/Matroska, AVI, fragmented mp4) are decoded sequentially by ffmpeg.
+    """
+    if len(head) < 8 or head[4:8] != b"ftyp":
+        return False # Not ISO BMFF
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box_type = struct.unpack(">I4s", head[offset:offset + 8])
+        if box_type in _MP4_HEADER_BOXES:
+            return False
+        if box_type == b"mdat":
+            return True
+        if size == 1: # 64-bit size follows the type
+            if offset + 16 > len(head):
+                break
+            size = struct.unpack(">Q", head[offset + 8:offset + 16])[0]
+        if size < 8:
+            break # Box extends to end of file, or a malformed size
+        offset += size
+    return True # moov not found within the probed bytes
+
+
+def probe_stream(head: bytes) -> dict:
+    """
+    Width, height, fps and frame count of the first video stream, read by ffprobe from `head`.
+    Without nb_frames the count is estimated from the stream duration and fps; it is 0 if
+    neither is known.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration", "-of", "json", "pipe:0"],
+        input=head, capture_output=True, timeout=30,
+    )
+    streams = json.loads(result.stdout or b"{}").get("streams") or []
+    if not streams or not streams[0].get("width"):
+        raise IOError(f"ffprobe found no video stream: {result.stderr.decode(errors='replace').strip()}")
+    stream = streams[0]
+    fps = 0.0
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        num, _, den = (stream.get(key) or "0/0").partition("/")
+        if float(den or 0) > 0 and float(num) > 0:
+            fps = float(num) / float(den)
+            break
+    nb_frames = stream.get("nb_frames")
+    if nb_frames and str(nb_frames).isdigit():
+        frame_count = int(nb_frames)
+    else:
+        try:
+            frame_count = max(round(float(stream.get("duration")) * fps), 0)
+        except (TypeError, ValueError): # Missing or "N/A"
+            frame_count = 0
+    return {
+        "width": int(stream["width"]),
+        "height": int(stream["height"]),
+        "fps": fps,
+        "frame_count": frame_count,
+    }
+
+
+class FFmpegPipeCapture:
+    """
+    cv2.VideoCapture stand-in that decodes a video while its bytes are still arriving.
+
+    The encoded stream is written to an ffmpeg subprocess through `write()` and decoded
+    BGR frames are read back from its stdout by `read()`, so process_video can run its
+    usual engines on an upload in progress. The pipes give natural backpressure: when
+    processing falls behind, ffmpeg stops reading and `write()` blocks.
+    """
+
+    def __init__(self, width: int, height: int, fps: float, frame_count: int = 0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = frame_count
+        self._frame_bytes = width * height * 3
+        self._stderr = tempfile.TemporaryFile()
+        self._aborted = False
+        self._proc = subprocess.Popen(
+            ["ffmpeg", "-loglevel", "error", "-noautorotate", "-i", "pipe:0",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-vsync", "0", "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr,
+        )
+
+    # --- Producer side (the upload) ---
+    def write(self, chunk: bytes):
+        """Feeds encoded bytes to ffmpeg. Raises BrokenPipeError if the decoder has gone away."""
+        self._proc.stdin.write(chunk)
+
+    def close_input(self):
+        """Signals the end of the upload; ffmpeg then drains its remaining frames."""
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def abort(self):
+        """Upload failed: stop decoding and make the next read() raise."""
+        self._aborted = True
+        self._proc.kill()
+
+    # --- cv2.VideoCapture interface used by process_video ---
+    def isOpened(self) -> bool:
+        return self._proc.poll() is None or self._proc.returncode == 0
+
+    def get(self, prop_id):
+        return {
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_FRAME_COUNT: self.frame_count,
+        }.get(prop_id, 0)
+
+    def read(self):
+        buffer = bytearray(self._frame_bytes) # Writable, so engines can draw on the frame in place
+        view, filled = memoryview(buffer), 0
+        while filled < self._frame_bytes:
+            n = self._proc.stdout.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        if self._aborted:
+            raise IOError("Upload was interrupted before the video was complete.")
+        if filled < self._frame_bytes:
+            if self._proc.wait() != 0:
+                self._stderr.seek(0)
+                raise IOError(f"ffmpeg failed to decode the upload: {self._stderr.read().decode(errors='replace').strip()[-500:]}")
+            return False, None # End of stream
+        return True, np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def release(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+        for pipe in (self._proc.stdin, self._proc.stdout):
+            try:
+                pipe.close()
+            except (BrokenPipeError, OSError):
+                pass
+        self._stderr.close()
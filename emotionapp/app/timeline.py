@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+from .processing import EMOTION_LABELS
+
+# One row per face per recorded frame, sorted by frame_index. A frame's rows stay valid
+# until the next recorded frame, so frames that reuse the previous detections (between
+# detection passes) are not repeated; a frame in which all faces disappeared is recorded
+# as a single LABEL_NO_FACES row.
+TIMELINE_DTYPE = np.dtype([
+    ("frame_index", "<i4"),
+    ("time_s", "<f4"),
+    ("track_id", "<i4"),  # -1 when the video was processed without tracking
+    ("x", "<i4"), ("y", "<i4"), ("w", "<i4"), ("h", "<i4"),
+    ("label", "i1"),  # Index into EMOTION_LABELS
+    ("probabilities", "<f4", (len(EMOTION_LABELS),)),  # NaN when classification failed
+])
+LABEL_ERROR = -1
+LABEL_NO_FACES = -2
+
+TIMELINE_SUFFIX = ".timeline.npy"
+
+
+def timeline_path_for(video_path: str) -> str:
+    """'processed/<id>.mp4' -> 'processed/<id>.timeline.npy'"""
+    return os.path.splitext(video_path)[0] + TIMELINE_SUFFIX
+
+
+class VideoTimeline:
+    """
+    Collects the detections drawn on each frame of a video and saves them as a
+    structured .npy file that /video_timeline can memory-map and slice by time.
+    """
+
+    def __init__(self, fps: float = 25.0):
+        self.fps = fps
+        self._rows = []
+        self._last_detections = None
+
+    def add(self, frame_index: int, detections: list):
+        """Records a frame's detections; a list already recorded for the previous frame is skipped."""
+        if detections is self._last_detections:
+            return
+        self._last_detections = detections
+        time_s = frame_index / self.fps
+        if not detections:
+            self._rows.append((frame_index, time_s, -1, 0, 0, 0, 0, LABEL_NO_FACES, [np.nan] * len(EMOTION_LABELS)))
+            return
+        for detection in detections:
+            x, y, w, h = detection["roi"]
+            probabilities = detection.get("probabilities")
+            label = EMOTION_LABELS.index(detection["emotion"]) if detection["emotion"] in EMOTION_LABELS else LABEL_ERROR
+            track_id = detection.get("track_id")
+            self._rows.append((
+                frame_index, time_s, -1 if track_id is None else track_id, x, y, w, h, label,
+                probabilities if probabilities is not None else [np.nan] * len(EMOTION_LABELS),
+            ))
+
+    def save(self, path: str):
+        """Writes the timeline atomically, so readers never see a partial file."""
+        timeline = np.array(self._rows, dtype=TIMELINE_DTYPE)
+        timeline.sort(order="frame_index", kind="stable") # The chunked engine may record out of order
+        partial_path = path + ".partial"
+        with open(partial_path, "wb") as f:
+            np.save(f, timeline)
+        os.replace(partial_path, path)
+        return len(timeline)
+
+
+def query_timeline(path: str, start_s: float = None, end_s: float = None) -> list:
+    """
+    Frames of a saved timeline with time_s in [start_s, end_s), grouped per frame.
+    The file is memory-mapped and the range found by binary search, so only the
+    requested rows are read.
+    """
+    timeline = np.load(path, mmap_mode="r")
+    times = timeline["time_s"]
+    first = 0 if start_s is None else int(np.searchsorted(times, start_s, side="left"))
+    last = len(timeline) if end_s is None else int(np.searchsorted(times, end_s, side="left"))
+    if start_s is not None and first > 0 and (first == len(timeline) or times[first] > start_s):
+        # Include the frame in effect at start_s (the last one recorded before it)
+        first = int(np.searchsorted(times, times[first - 1], side="left"))
+
+    frames = []
+    for row in np.asarray(timeline[first:last]):
+        if not frames or frames[-1]["frame_index"] != int(row["frame_index"]):
+            frames.append({"frame_index": int(row["frame_index"]), "time_s": round(float(row["time_s"]), 3), "detections": []})
+        if row["label"] == LABEL_NO_FACES:
+            continue
+        probabilities = row["probabilities"]
+        detection = {
+            "roi": [int(row["x"]), int(row["y"]), int(row["w"]), int(row["h"])],
+            "emotion": EMOTION_LABELS[row["label"]] if row["label"] >= 0 else "Error",
+            "probabilities": None if np.isnan(probabilities[0]) else [round(float(p), 3) for p in probabilities],
+        }
+        if row["track_id"] >= 0:
+            detection["track_id"] = int(row["track_id"])
+        frames[-1]["detections"].append(detection)
+    return frames
@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from . import config
+from .processing import detect_faces, prepare_faces, classify_face_batch, EMOTION_LABELS
+from .emotion_cache import EmotionCache, dhash
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = ix * iy
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def _centroid_distance(a, b) -> float:
+    return float(np.hypot((a[0] + a[2] / 2) - (b[0] + b[2] / 2), (a[1] + a[3] / 2) - (b[1] + b[3] / 2)))
+
+
+def _crop(frame: np.ndarray, roi):
+    x, y, w, h = roi
+    return frame[y:y + h, x:x + w]
+
+
+class Track:
+    __slots__ = ("track_id", "box", "emotion", "probabilities", "last_detected", "last_classified", "misses")
+
+    def __init__(self, track_id: int, box, frame_index: int):
+        self.track_id = track_id
+        self.box = [float(v) for v in box]  # x, y, w, h; float so flow shifts accumulate
+        self.emotion = None                 # Label of the smoothed probabilities, or "Error"
+        self.probabilities = None           # Smoothed softmax vector (see emotion_cache.py)
+        self.last_detected = frame_index    # Frame of the last Haar match
+        self.last_classified = -1           # Frame of the last CNN run
+        self.misses = 0                     # Consecutive detection passes without a match
+
+    def roi(self):
+        x, y, w, h = self.box
+        return [int(round(x)), int(round(y)), int(round(w)), int(round(h))]
+
+
+class TrackerStep:
+    """What FaceTracker.begin() decided for one frame: the tracks that need the CNN and their input batch."""
+    __slots__ = ("frame_index", "detected", "tracks", "hashes", "batch", "valid")
+
+    def __init__(self, frame_index: int, detected: bool):
+        self.frame_index = frame_index
+        self.detected = detected
+        self.tracks = []
+        self.hashes = []
+        self.batch = None
+        self.valid = None
+
+    def model_input(self):
+        """The rows of the batch the model has to classify (may be empty)."""
+        if self.batch is None or not self.valid.any():
+            return None
+        return self.batch if self.valid.all() else self.batch[self.valid]
+
+
+class FaceTracker:
+    """
+    Keeps faces associated across frames so detection and classification can be skipped.
+
+    Every frame, track boxes are optionally moved with sparse Lucas-Kanade optical flow.
+    Full Haar detection runs when a track was lost (flow failed) or the last detection pass
+    is older than `staleness_frames`; with no tracks at all (an empty scene, or faces the
+    detector misses) it runs every `empty_scene_frames` frames. Detections are associated
+    with tracks greedily by IoU, with a centroid-distance fallback for fast motion. The CNN
+    only runs for tracks the per-track EmotionCache cannot answer (new tracks, changed
+    crops, or cached results older than the cache's age budget).
+
+    `update()` does everything synchronously. Async callers use `begin()`, classify
+    `step.model_input()` however they like, then pass the softmax rows to `complete()`.
+    """
+
+    def __init__(self, staleness_frames: int = 15, iou_threshold: float = 0.3, max_misses: int = 1,
+                 use_optical_flow: bool = True, cache: EmotionCache = None, empty_scene_frames: int = 5):
+        self.staleness_frames = staleness_frames
+        self.empty_scene_frames = max(1, empty_scene_frames)
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.use_optical_flow = use_optical_flow
+        self.cache = cache or EmotionCache()
+        self.tracks = []
+        self._next_track_id = 1
+        self._prev_gray = None
+        self._last_detection_pass = None
+        self.detection_passes = 0
+        self.classified_faces = 0
+
+    def _propagate(self, gray: np.ndarray):
+        """Moves every track with the median optical flow of corner features inside its box."""
+        lost = False
+        if self._prev_gray is None or not self.tracks:
+            return lost
+        for track in self.tracks:
+            x, y, w, h = track.roi()
+            x0, y0 = max(x, 0), max(y, 0)
+            patch = self._prev_gray[y0:y + h, x0:x + w]
+            if patch.size == 0:
+                lost = True
+                continue
+            corners = cv2.goodFeaturesToTrack(patch, maxCorners=30, qualityLevel=0.01, minDistance=3)
+            if corners is None or len(corners) < 4:
+                lost = True
+                continue
+            points = (corners.reshape(-1, 2) + np.array([x0, y0], dtype=np.float32)).astype(np.float32)
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None,
+                                                        winSize=(15, 15), maxLevel=2)
+            ok = status.reshape(-1) == 1
+            if ok.sum() < 4:
+                lost = True
+                continue
+            dx, dy = np.median(moved[ok] - points[ok], axis=0)
+            # Keep the box inside the frame so its crop stays valid
+            frame_h, frame_w = gray.shape[:2]
+            track.box[0] = min(max(track.box[0] + float(dx), 0.0), max(frame_w - track.box[2], 0.0))
+            track.box[1] = min(max(track.box[1] + float(dy), 0.0), max(frame_h - track.box[3], 0.0))
+        return lost
+
+    def _associate(self, faces):
+        """Greedy matching of detected boxes to tracks; returns (matches, unmatched face indices)."""
+        candidates = []
+        for t_index, track in enumerate(self.tracks):
+            for f_index, face in enumerate(faces):
+                iou = box_iou(track.box, face)
+                if iou >= self.iou_threshold:
+                    candidates.append((iou, t_index, f_index))
+                elif _centroid_distance(track.box, face) < 0.5 * max(track.box[2], face[2]):
+                    candidates.append((0.0, t_index, f_index)) # Weakest kind of match
+        candidates.sort(reverse=True)
+        matches, used_tracks, used_faces = [], set(), set()
+        for _, t_index, f_index in candidates:
+            if t_index in used_tracks or f_index in used_faces:
+                continue
+            matches.append((t_index, f_index))
+            used_tracks.add(t_index)
+            used_faces.add(f_index)
+        return matches, [i for i in range(len(faces)) if i not in used_faces]
+
+    def update(self, frame: np.ndarray, frame_index: int, faces=None):
+        """
+        Advances the tracker by one frame, running the CNN inline when needed.
+        faces: boxes already detected on this frame (forces a detection pass with them).
+        Returns (detections, detected): detection dicts with 'track_id' and 'cache_hit' for
+        every active track, and whether a detection pass ran on this frame.
+        """
+        step = self.begin(frame, frame_index, faces=faces)
+        predictions = None
+        model_input = step.model_input()
+        if model_input is not None:
+            try:
+                predictions = classify_face_batch(model_input)
+            except Exception as e:
+                logger.error(f"Error during prediction for {len(model_input)} tracked faces: {e}", exc_info=True)
+        return self.complete(step, predictions), step.detected
+
+    def begin(self, frame: np.ndarray, frame_index: int, faces=None) -> TrackerStep:
+        """Moves tracks, runs detection + association if needed and looks crops up in the cache."""
+        lost = False
+        if self.use_optical_flow and faces is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            lost = self._propagate(gray)
+            self._prev_gray = gray
+
+        since_pass = None if self._last_detection_pass is None else frame_index - self._last_detection_pass
+        if self.tracks:
+            due = lost or since_pass is None or since_pass >= self.staleness_frames
+        else: # Nothing to follow: look for new faces at the normal cadence, not on every frame
+            due = since_pass is None or since_pass >= self.empty_scene_frames
+        step = TrackerStep(frame_index, faces is not None or due)
+        if step.detected:
+            self._detection_pass(frame, frame_index, detect_faces(frame) if faces is None else faces, step)
+        return step
+
+    def complete(self, step: TrackerStep, predictions) -> list:
+        """Stores fresh softmax rows (None if the model call failed) and returns the frame's detections."""
+        pred_row = 0
+        for i, (track, crop_hash) in enumerate(zip(step.tracks, step.hashes)):
+            if step.valid[i] and predictions is not None:
+                track.probabilities = self.cache.update(track.track_id, crop_hash, predictions[pred_row], step.frame_index)
+                track.emotion = EMOTION_LABELS[int(np.argmax(track.probabilities))]
+            else:
+                self.cache.forget(track.track_id)
+                track.probabilities = None
+                track.emotion = "Error"
+            if step.valid[i]:
+                pred_row += 1
+            track.last_classified = step.frame_index
+        self.classified_faces += len(step.tracks)
+
+        detections = []
+        for track in self.tracks:
+            if track.emotion is None:
+                continue
+            detections.append({
+                "roi": track.roi(),
+                "emotion": track.emotion,
+                "probabilities": None if track.probabilities is None else [float(p) for p in track.probabilities],
+                "track_id": track.track_id,
+                "cache_hit": track.last_classified != step.frame_index,
+            })
+        return detections
+
+    def _detection_pass(self, frame: np.ndarray, frame_index: int, faces, step: TrackerStep):
+        self.detection_passes += 1
+        self._last_detection_pass = frame_index
+        faces = [tuple(int(v) for v in face) for face in faces]
+        matches, new_faces = self._associate(faces)
+
+        matched_tracks = set()
+        for t_index, f_index in matches:
+            track = self.tracks[t_index]
+            track.box = [float(v) for v in faces[f_index]]
+            track.last_detected = frame_index
+            track.misses = 0
+            matched_tracks.add(t_index)
+        for t_index, track in enumerate(self.tracks):
+            if t_index not in matched_tracks:
+                track.misses += 1
+        for track in self.tracks:
+            if track.misses > self.max_misses:
+                self.cache.forget(track.track_id)
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for f_index in new_faces:
+            self.tracks.append(Track(self._next_track_id, faces[f_index], frame_index))
+            self._next_track_id += 1
+
+        # Only tracks seen in this pass are classified; the cache answers unchanged faces
+        for track in self.tracks:
+            if track.misses != 0:
+                continue
+            crop = _crop(frame, track.roi())
+            if crop.size == 0:
+                continue
+            crop_hash = dhash(crop)
+            cached = self.cache.lookup(track.track_id, crop_hash, frame_index)
+            if cached is not None:
+                track.probabilities = cached
+                track.emotion = EMOTION_LABELS[int(np.argmax(cached))]
+                continue
+            step.tracks.append(track)
+            step.hashes.append(crop_hash)
+
+        if step.tracks:
+            # Crops are non-empty, so prepare_faces keeps every track and the lists stay aligned
+            _, step.batch, step.valid = prepare_faces(frame, [track.roi() for track in step.tracks])
+        else:
+            step.valid = np.zeros(0, dtype=bool)
+
+
+def new_face_tracker() -> FaceTracker:
+    """A FaceTracker (with its own EmotionCache) configured from config.py."""
+    return FaceTracker(
+        staleness_frames=config.TRACKER_STALENESS_FRAMES,
+        iou_threshold=config.TRACKER_IOU_THRESHOLD,
+        max_misses=config.TRACKER_MAX_MISSES,
+        use_optical_flow=config.TRACKER_OPTICAL_FLOW,
+        empty_scene_frames=config.TRACKER_EMPTY_SCENE_FRAMES,
+        cache=EmotionCache(
+            alpha=config.EMOTION_SMOOTHING_ALPHA,
+            hash_threshold=config.EMOTION_CACHE_HASH_THRESHOLD,
+            max_age_frames=config.EMOTION_CACHE_MAX_AGE_FRAMES,
+        ),
+    )
+
+
+class TrackingSessions:
+    """
+    FaceTrackers for webcam clients, keyed by a client-chosen session ID.
+    Sessions idle for longer than `ttl_s` are dropped; at most `max_sessions` are kept.
+    """
+
+    def __init__(self, ttl_s: float, max_sessions: int):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self._sessions = {}
+
+    def get(self, session_id: str):
+        """Returns (tracker, lock, frame_index) for the session's next frame."""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            self._evict(now)
+            session = {"tracker": new_face_tracker(), "lock": asyncio.Lock(), "frames": 0}
+            self._sessions[session_id] = session
+        session["last_seen"] = now
+        session["frames"] += 1
+        return session["tracker"], session["lock"], session["frames"]
+
+    def _evict(self, now: float):
+        for session_id in [sid for sid, s in self._sessions.items() if now - s["last_seen"] > self.ttl_s]:
+            del self._sessions[session_id]
+        while len(self._sessions) >= self.max_sessions:
+            oldest = min(self._sessions, key=lambda sid: self._sessions[sid]["last_seen"])
+            del self._sessions[oldest]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+webcam_sessions = TrackingSessions(ttl_s=config.WEBCAM_SESSION_TTL_S, max_sessions=config.WEBCAM_MAX_SESSIONS)
@@ -0,0 +1,217 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_OPEN = "open"
+UPLOAD_FINALIZING = "finalizing"
+UPLOAD_FINALIZED = "finalized"
+
+
+class UploadError(Exception):
+    """A chunk or finalize request that does not fit the upload; carries the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def merge_ranges(ranges) -> list:
+    """[(offset, length), ...] -> sorted, coalesced [[start, end), ...]."""
+    merged = []
+    for offset, length in sorted(ranges):
+        if merged and offset <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], offset + length)
+        else:
+            merged.append([offset, offset + length])
+    return merged
+
+
+class UploadStore:
+    """
+    Resumable chunked uploads: init, PUT chunks at byte offsets, finalize.
+
+    The staging file is created at its full size up front and every chunk is written
+    straight to its offset with os.pwrite as the body streams in, so memory use does not
+    depend on the file or chunk size and chunks may arrive in any order or be retried.
+    A chunk sent with a SHA-256 (X-Chunk-SHA256) only counts as received once it matches;
+    chunks sent without one are recorded unverified, and only the whole-file hash given
+    at init (if any) is checked at finalize. The received byte ranges are kept in SQLite,
+    so an upload survives a dropped connection or a server restart and the client can ask
+    where to resume.
+    """
+
+    def __init__(self, db_path: str, staging_dir: str, ttl_s: float):
+        self.db_path = db_path
+        self.staging_dir = staging_dir
+        self.ttl_s = ttl_s
+        os.makedirs(staging_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT,
+                    path TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS upload_chunks (
+                    upload_id TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    PRIMARY KEY (upload_id, offset, length)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Autocommit
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self, filename: str, size: int, sha256: str = None) -> dict:
+        self.expire_stale()
+        upload_id = str(uuid.uuid4())
+        path = os.path.join(self.staging_dir, f"{upload_id}_{os.path.basename(filename)}")
+        with open(path, "wb") as f:
+            f.truncate(size) # Sparse until the chunks are written
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO uploads (id, status, filename, size, sha256, path, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, UPLOAD_OPEN, os.path.basename(filename), size, sha256.lower() if sha256 else None, path, now, now),
+            )
+        return self.status(upload_id)
+
+    def get(self, upload_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        return dict(row) if row else None
+
+    def status(self, upload_id: str):
+        """The upload with its received ranges and the bytes still missing."""
+        upload = self.get(upload_id)
+        if upload is None:
+            return None
+        with self._connect() as conn:
+            chunks = conn.execute("SELECT offset, length FROM upload_chunks WHERE upload_id = ?", (upload_id,)).fetchall()
+        received = merge_ranges((c["offset"], c["length"]) for c in chunks)
+        received_bytes = sum(end - start for start, end in received)
+        return {
+            "upload_id": upload_id,
+            "status": upload["status"],
+            "filename": upload["filename"],
+            "size": upload["size"],
+            "received": received,
+            "received_bytes": received_bytes,
+            "complete": received_bytes == upload["size"],
+        }
+
+    def open_chunk(self, upload_id: str, offset: int, length: int):
+        """Validates a chunk before its body is read; returns the open upload row."""
+        upload = self.get(upload_id)
+        if upload is None:
+            raise UploadError(404, "Upload not found.")
+        if upload["status"] != UPLOAD_OPEN:
+            raise UploadError(409, f"Upload is {upload['status']}.")
+        if offset < 0 or length <= 0 or offset + length > upload["size"]:
+            raise UploadError(416, f"Chunk [{offset}, {offset + length}) is outside the file size {upload['size']}.")
+        return upload
+
+    @staticmethod
+    def write_at(fd: int, data: bytes, offset: int):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view, offset = view[written:], offset + written
+
+    def commit_chunk(self, upload_id: str, offset: int, length: int):
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO upload_chunks (upload_id, offset, length) VALUES (?, ?, ?)",
+                         (upload_id, offset, length))
+            conn.execute("UPDATE uploads SET updated_at = ? WHERE id = ?", (time.time(), upload_id))
+
+    def discard_range(self, upload_id: str, offset: int, length: int):
+        """
+        Forgets received ranges overlapping a chunk that failed its checksum or was cut off:
+        its bytes were already written in place, so those ranges must be sent again.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ? AND offset < ? AND offset + length > ?",
+                         (upload_id, offset + length, offset))
+
+    def _set_status(self, upload_id: str, status: str, expected: str) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE uploads SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                                  (status, time.time(), upload_id, expected))
+        return cursor.rowcount == 1
+
+    def finalize(self, upload_id: str) -> tuple:
+        """
+        Checks that every byte arrived and, if the client declared one at init, that the
+        whole-file SHA-256 matches. Returns (upload row, sha256 hex). The staging file then
+        belongs to the caller (it becomes a video job's input).
+        """
+        status = self.status(upload_id)
+        if status is None:
+            raise UploadError(404, "Upload not found.")
+        if status["status"] != UPLOAD_OPEN:
+            raise UploadError(409, f"Upload is {status['status']}.")
+        if not status["complete"]:
+            raise UploadError(409, f"Upload incomplete: {status['received_bytes']} of {status['size']} bytes received.")
+        if not self._set_status(upload_id, UPLOAD_FINALIZING, UPLOAD_OPEN):
+            raise UploadError(409, "Upload is already being finalized.") # A concurrent finalize won
+
+        upload = self.get(upload_id)
+        digest = hashlib.sha256()
+        with open(upload["path"], "rb") as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        if upload["sha256"] and upload["sha256"] != sha256:
+            self._set_status(upload_id, UPLOAD_OPEN, UPLOAD_FINALIZING)
+            raise UploadError(422, f"Checksum mismatch: declared {upload['sha256']}, received {sha256}.")
+        self._set_status(upload_id, UPLOAD_FINALIZED, UPLOAD_FINALIZING)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        return upload, sha256
+
+    def delete(self, upload_id: str) -> bool:
+        upload = self.get(upload_id)
+        if upload is None:
+            return False
+        if upload["status"] == UPLOAD_OPEN and os.path.exists(upload["path"]):
+            os.remove(upload["path"])
+        with self._connect() as conn:
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+            conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+        return True
+
+    def expire_stale(self) -> int:
+        """Drops uploads not touched within the TTL; staging files are only deleted for unfinished ones."""
+        with self._connect() as conn:
+            stale = conn.execute("SELECT id FROM uploads WHERE updated_at < ?", (time.time() - self.ttl_s,)).fetchall()
+        for row in stale:
+            self.delete(row["id"])
+        if stale:
+            logger.info(f"Expired {len(stale)} chunked uploads.")
+        return len(stale)
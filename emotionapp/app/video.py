@@ -0,0 +1,176 @@
+import cv2
+import logging
+
+from . import config
+from .processing import predict_emotions_on_frame_data, draw_labels_on_frame
+from .datalogger import log_emotion_data
+from .metrics import timed
+from .pipeline import VideoPipeline, VideoCancelled
+from .tracker import new_face_tracker
+
+logger = logging.getLogger(__name__)
+
+PROCESS_EVERY_N_FRAMES = config.PROCESS_EVERY_N_FRAMES # Optimization: process every Nth frame
+PROGRESS_EVERY_N_FRAMES = 25 # How often progress_callback is invoked
+
+
+def effective_engine(engine: str = None, streamed: bool = False) -> str:
+    """The engine process_video really runs: "chunked" needs a seekable file, so streams use "pipeline"."""
+    engine = engine or config.VIDEO_ENGINE
+    return "pipeline" if engine == "chunked" and streamed else engine
+
+
+def tracking_enabled(engine: str) -> bool:
+    """Whether faces are followed by a FaceTracker; the chunked engine always uses the fixed cadence."""
+    return config.VIDEO_TRACKING_ENABLED and engine != "chunked"
+
+
+def process_video(input_path: str, output_path: str, video_filename: str, progress_callback=None, engine: str = None,
+                  timeline=None, capture=None, tracking: bool = None, should_stop=None):
+    """
+    Reads a video, labels the emotions of every Nth frame (reusing the last detections
+    in between) and writes the annotated result as mp4 to output_path.
+    engine is "sequential", "pipeline" (see pipeline.py) or "chunked" (see chunked.py);
+    defaults to config.VIDEO_ENGINE. With VIDEO_TRACKING_ENABLED the sequential and pipeline
+    engines follow faces with a FaceTracker (see tracker.py) instead of the fixed cadence;
+    tracking overrides that (the chunked engine's short-video fallback passes False, so its
+    output does not depend on the video's length).
+    Blocking; meant to run on a worker thread or process, not on the event loop.
+    progress_callback(frames_done, total_frames) is called periodically and once at the end;
+    total_frames is 0 when the container does not report a frame count.
+    A VideoTimeline (see timeline.py) passed as timeline records the detections drawn on each frame.
+    capture replaces cv2.VideoCapture(input_path), e.g. with an FFmpegPipeCapture decoding an
+    upload still in progress (see streaming.py); such a stream cannot seek, so "chunked" falls
+    back to "pipeline".
+    should_stop() is checked before every frame (between chunks for "chunked"); when it
+    returns True, VideoCancelled is raised and output_path is left half-written.
+    Raises IOError if the input cannot be opened.
+    Returns the number of frames written.
+    """
+    cap = capture if capture is not None else cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_filename}")
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps == 0: fps = 25 # Default fps if not readable
+    total_frames = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    if timeline is not None:
+        timeline.fps = fps
+
+    logger.info(f"Processing video '{video_filename}' to '{output_path}'. Resolution: {frame_width}x{frame_height}, FPS: {fps}")
+
+    engine = effective_engine(engine, streamed=capture is not None)
+    if tracking is None:
+        tracking = tracking_enabled(engine)
+    tracker = new_face_tracker() if tracking and engine != "chunked" else None
+    if engine == "chunked":
+        cap.release()
+        # Imported here: chunked.py builds on this module
+        from .chunked import process_video_chunked
+        frame_count = process_video_chunked(
+            input_path, output_path, video_filename, total_frames, fps, (frame_width, frame_height),
+            progress_callback=progress_callback, timeline=timeline, should_stop=should_stop,
+        )
+        logger.info(f"Video processing complete for '{video_filename}'. Output: '{output_path}'")
+        return frame_count
+
+    # Use 'mp4v' for .mp4 output
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out_writer = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+
+    try:
+        if engine == "pipeline":
+            pipeline = VideoPipeline(
+                cap, out_writer, video_filename,
+                process_every_n=PROCESS_EVERY_N_FRAMES,
+                queue_size=config.PIPELINE_QUEUE_SIZE,
+                detect_workers=config.PIPELINE_DETECT_WORKERS,
+                max_batch_size=config.PIPELINE_MAX_BATCH_SIZE,
+                total_frames=total_frames,
+                progress_callback=progress_callback,
+                progress_every_n=PROGRESS_EVERY_N_FRAMES,
+                tracker=tracker,
+                timeline=timeline,
+                should_stop=should_stop,
+            )
+            frame_count = pipeline.run()
+        elif engine == "sequential":
+            frame_count = run_sequential_loop(cap, out_writer, video_filename, total_frames, progress_callback,
+                                              tracker=tracker, timeline=timeline, should_stop=should_stop)
+        else:
+            raise ValueError(f"Unknown video engine '{engine}', expected 'sequential', 'pipeline' or 'chunked'.")
+    finally:
+        cap.release()
+        out_writer.release()
+
+    if progress_callback is not None:
+        progress_callback(frame_count, max(total_frames, frame_count))
+    logger.info(f"Video processing complete for '{video_filename}'. Output: '{output_path}'")
+    return frame_count
+
+
+def run_sequential_loop(cap, out_writer, video_filename: str, total_frames: int, progress_callback,
+                    start_index: int = 0, max_frames: int = None, on_detections=None, tracker=None, timeline=None,
+                    should_stop=None):
+    """
+    One-frame-at-a-time loop: decode, detect, classify, draw and encode in turn.
+    start_index/max_frames restrict it to a frame range of an already positioned capture
+    (see chunked.py); the every-Nth-frame cadence is based on the absolute frame index.
+    on_detections(frame_count, detections) replaces logging for processed frames.
+    With a tracker, every frame goes through tracker.update() and frames on which it ran
+    a detection pass count as processed.
+    Raises VideoCancelled as soon as should_stop() returns True.
+    Returns the number of frames written.
+    """
+    frame_count = start_index
+    frames_written = 0
+    last_detections = []
+    while max_frames is None or frames_written < max_frames:
+        if should_stop is not None and should_stop():
+            raise VideoCancelled(f"Processing of '{video_filename}' stopped after {frames_written} frames.")
+        with timed("decode"):
+            ret, frame = cap.read()
+        if not ret:
+            break # End of video
+
+        frame_count += 1
+        current_detections_to_draw = []
+
+        if tracker is not None:
+            detections, processed = tracker.update(frame, frame_count)
+        else:
+            processed = frame_count % PROCESS_EVERY_N_FRAMES == 0
+            detections = predict_emotions_on_frame_data(frame) if processed else None
+
+        if processed:
+            if on_detections is not None:
+                on_detections(frame_count, detections)
+            else:
+                # --- LOG THE DATA ---
+                log_emotion_data(source='video', detections=detections, video_filename=video_filename,
+                                 frame_index=frame_count - 1)
+                # --------------------
+
+            last_detections = detections # Store for intermediate frames
+            current_detections_to_draw = detections
+            if frame_count % (PROCESS_EVERY_N_FRAMES * 10) == 0: # Log progress less frequently
+                logger.info(f"Processing video '{video_filename}', around frame {frame_count}...")
+        elif tracker is not None:
+            # Tracked boxes are up to date on every frame
+            current_detections_to_draw = detections
+        else:
+            # For intermediate frames, use the last known detections
+            current_detections_to_draw = last_detections
+
+        if timeline is not None:
+            timeline.add(frame_count - 1, current_detections_to_draw)
+        frame_with_emotions = draw_labels_on_frame(frame.copy(), current_detections_to_draw)
+        with timed("encode"):
+            out_writer.write(frame_with_emotions)
+        frames_written += 1
+
+        if progress_callback is not None and frames_written % PROGRESS_EVERY_N_FRAMES == 0:
+            progress_callback(frames_written, total_frames)
+    return frames_written
@@ -0,0 +1,85 @@
+"""
+Latency of the /analytics queries against a rollup store filled with synthetic history.
+
+Rollup size depends on minutes x sources x videos x emotions, not on the number of
+detections, so --days of traffic at --detections-per-minute stands in for a log of any
+size (30 days x 2,300 detections/minute is about 100M detections).
+
+Run from the emotionapp/ directory:
+    python -m benchmarks.bench_analytics --days 30 --videos 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.processing import EMOTION_LABELS
+from app.rollups import RollupStore
+
+
+def populate(store: RollupStore, days: int, videos: int, detections_per_minute: int):
+    """Writes one aggregated record per (minute, emotion) so filling 100M detections stays quick."""
+    rng = random.Random(0)
+    start = datetime.now() - timedelta(days=days)
+    batch = []
+    for minute in range(days * 24 * 60):
+        timestamp = start + timedelta(minutes=minute)
+        video = f"video_{rng.randrange(videos)}.mp4"
+        for emotion in EMOTION_LABELS:
+            batch.append({"timestamp": timestamp, "source": "video", "video_filename": video,
+                          "emotion": emotion, "confidence": 0.7})
+        if len(batch) >= 50000:
+            store.write(batch)
+            batch = []
+    store.write(batch)
+    # Scale the counters up to the requested detection rate
+    with store._connect() as conn:
+        conn.execute("UPDATE minute_counts SET count = count * ?", (max(1, detections_per_minute // len(EMOTION_LABELS)),))
+    return start
+
+
+def time_queries(fn, repeats: int):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--detections-per-minute", type=int, default=2300)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = RollupStore(os.path.join(tmp_dir, "rollups.sqlite3"))
+        t0 = time.perf_counter()
+        start = populate(store, args.days, args.videos, args.detections_per_minute)
+        print(f"Populated {args.days} days in {time.perf_counter() - t0:.1f}s "
+              f"({args.days * 1440 * args.detections_per_minute / 1e6:.0f}M detections represented)")
+
+        end = start + timedelta(days=args.days)
+        queries = {
+            "last hour, 1m": lambda: store.summary(end - timedelta(hours=1), end, "1m"),
+            "last day, 5m": lambda: store.summary(end - timedelta(days=1), end, "5m"),
+            "last week, 1h": lambda: store.summary(end - timedelta(days=7), end, "1h"),
+            "all, 1d": lambda: store.summary(start, end, "1d"),
+            "one video, all, 1h": lambda: store.summary(start, end, "1h", video="video_7.mp4"),
+            "videos list": lambda: store.videos(),
+        }
+        print(f"{'query':>20} | {'p50 ms':>7} {'p99 ms':>7}")
+        for name, fn in queries.items():
+            p50, p99 = time_queries(fn, args.repeats)
+            print(f"{name:>20} | {p50:>7.2f} {p99:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
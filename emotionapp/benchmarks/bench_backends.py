@@ -0,0 +1,122 @@
+"""
+Parity, latency and memory comparison of the model backends in app/backends.py.
+
+Each backend runs in its own subprocess so load time and peak RSS are not polluted by
+the others. Top-1 agreement is measured against the Keras model on the same inputs;
+the script exits with status 1 if any backend agrees on less than --min-agreement.
+
+Run from the emotionapp/ directory (after `python convert_model.py`):
+    python -m benchmarks.bench_backends --images data/DATASET/test --limit 500
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+
+def load_inputs(images_dir: str, limit: int, size=(100, 100)) -> np.ndarray:
+    """Face crops from an image folder (recursively), or random noise if none is given."""
+    if not images_dir:
+        return np.random.default_rng(0).random((limit, size[1], size[0], 3), dtype=np.float32)
+    paths = sorted(glob.glob(os.path.join(images_dir, '**', '*.jpg'), recursive=True))[:limit]
+    if not paths:
+        raise SystemExit(f"No .jpg images found under {images_dir}")
+    # Same preprocessing as the server: BGR crop resized to the CNN input, scaled to [0, 1]
+    return np.stack([cv2.resize(cv2.imread(p), size) for p in paths]).astype(np.float32) / 255.0
+
+
+def run_worker(backend_name: str, inputs_path: str, outputs_path: str, batch_sizes):
+    """Subprocess entry point: loads one backend, classifies the inputs and reports timings as JSON."""
+    from app import processing
+    from app.backends import load_backend
+
+    started = time.perf_counter()
+    backend = load_backend(backend_name, processing.model_path_for(backend_name))
+    load_seconds = time.perf_counter() - started
+
+    inputs = np.load(inputs_path)
+    outputs = np.concatenate([backend.predict(inputs[i:i + 32]) for i in range(0, len(inputs), 32)])
+    np.save(outputs_path, outputs)
+
+    latency = {}
+    for batch_size in batch_sizes:
+        batch = inputs[:batch_size]
+        backend.predict(batch) # Warm-up (and tensor resize for tflite)
+        samples = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            backend.predict(batch)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        latency[batch_size] = float(np.median(samples))
+
+    print(json.dumps({
+        "backend": backend_name,
+        "precision": backend.precision,
+        "load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, # ru_maxrss is KiB on Linux
+        "latency_ms": latency,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["keras", "tflite", "onnx"])
+    parser.add_argument("--images", help="Folder of face images; random inputs if omitted")
+    parser.add_argument("--limit", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--inputs", help=argparse.SUPPRESS)
+    parser.add_argument("--outputs", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.inputs, args.outputs, args.batch_sizes)
+        return
+
+    inputs = load_inputs(args.images, args.limit)
+    results, predictions = {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs_path = os.path.join(tmp_dir, "inputs.npy")
+        np.save(inputs_path, inputs)
+        for name in args.backends:
+            outputs_path = os.path.join(tmp_dir, f"{name}.npy")
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_backends", "--worker", name,
+                 "--inputs", inputs_path, "--outputs", outputs_path,
+                 "--batch-sizes", *map(str, args.batch_sizes)],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{name}: failed to run\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+                continue
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+            predictions[name] = np.load(outputs_path)
+
+    reference = predictions.get("keras")
+    failed = False
+    print(f"{'backend':>8} {'precision':>9} {'load s':>7} {'RSS MB':>7} {'top-1 agree':>11}  latency ms by batch size")
+    for name, r in results.items():
+        agreement = None
+        if reference is not None:
+            agreement = float(np.mean(np.argmax(predictions[name], axis=1) == np.argmax(reference, axis=1)))
+            failed |= agreement < args.min_agreement
+        latency = "  ".join(f"{bs}:{ms:.1f}" for bs, ms in r["latency_ms"].items())
+        agreement_text = f"{agreement:.2%}" if agreement is not None else "n/a"
+        print(f"{name:>8} {r['precision']:>9} {r['load_seconds']:>7.2f} {r['peak_rss_mb']:>7.0f} {agreement_text:>11}  {latency}")
+
+    if failed:
+        print(f"FAIL: top-1 agreement below {args.min_agreement:.2%} for at least one backend")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-frame latency of emotion classification against the number of faces in the frame.
+
+Compares the old path (one model.predict per face, batch of one) with the batched
+path used by predict_emotions_on_frame_data (all faces in a single call).
+Frames and face boxes are synthetic (see synthetic.py) and the planted boxes are used
+as they are, so the numbers isolate preprocessing + classification.
+
+Run from the emotionapp/ directory:
+    python -m benchmarks.bench_batch_inference --faces 1 2 5 10 20
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app import processing
+from benchmarks.synthetic import synthetic_frame
+
+
+def synthetic_frame_and_faces(num_faces: int, width: int = 1280, height: int = 720, face_size: int = 120):
+    frame, boxes = synthetic_frame(width, height, num_faces, seed=num_faces, face_size=face_size)
+    return frame, np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+
+def per_face_predict(frame: np.ndarray, faces):
+    """The pre-batching implementation: one model call per face."""
+    detections = []
+    for (x, y, w, h) in faces:
+        resized_face = cv2.resize(frame[y:y+h, x:x+w], processing.CNN_INPUT_SIZE).astype(np.float32) / 255.0
+        predictions = processing.classify_face_batch(np.expand_dims(resized_face, axis=0))
+        detections.append({"roi": [int(x), int(y), int(w), int(h)],
+                           "emotion": processing.EMOTION_LABELS[int(np.argmax(predictions[0]))]})
+    return detections
+
+
+def time_ms(fn, frame, faces, repeats: int):
+    fn(frame, faces) # Warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(frame, faces)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples)), float(np.percentile(samples, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 2, 5, 10, 15, 20])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    processing.load_resources()
+
+    print(f"{'faces':>5} | {'per-face p50':>12} {'p95':>8} | {'batched p50':>11} {'p95':>8} | {'speedup':>7}")
+    for num_faces in args.faces:
+        frame, faces = synthetic_frame_and_faces(num_faces)
+        old_p50, old_p95 = time_ms(per_face_predict, frame, faces, args.repeats)
+        new_p50, new_p95 = time_ms(processing.predict_emotions_for_faces, frame, faces, args.repeats)
+        print(f"{num_faces:>5} | {old_p50:>10.1f}ms {old_p95:>6.1f}ms | {new_p50:>9.1f}ms {new_p95:>6.1f}ms | {old_p50 / new_p50:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Speed and recall of the face detectors in app/detectors.py (FACE_DETECTOR), and of
+detection on downscaled frames (DETECT_MAX_SIDE).
+
+Every detector runs on the same frames: synthetic ones with planted faces at each
+--resolutions and --faces combination (see synthetic.py; --face-image pastes a real face
+crop, which is far more representative than the drawn faces), or real frames listed in
+an --annotations JSON file ({"path/to/frame.jpg": [[x, y, w, h], ...], ...}).
+A planted/annotated face counts as found when a detection overlaps it with IoU >= --iou;
+unmatched detections are reported as false positives per frame. Detectors whose model
+files are missing from app/models/ are skipped; `python fetch_detector_models.py`
+downloads them.
+
+--max-sides sweeps the detection resolution (0 = full frame): every detector is also
+run on copies downscaled to each longer side, with boxes mapped back, which gives the
+recall/latency tradeoff of DETECT_MAX_SIDE. --face-sizes plants faces of fixed sizes
+(frame pixels), since downscaling first loses the small ones.
+
+Run from the emotionapp/ directory:
+    python -m benchmarks.bench_detectors --face-image face.jpg --resolutions 640x480 1920x1080
+    python -m benchmarks.bench_detectors --annotations frames/boxes.json --detectors haar yunet
+    python -m benchmarks.bench_detectors --detectors haar --resolutions 1920x1080 3840x2160 \
+        --faces 4 --face-sizes 40 80 160 --max-sides 0 480 640 960
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+from app.detectors import DETECTORS, DownscaledDetector, load_detector
+from benchmarks.synthetic import synthetic_frame
+
+
+def iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter) if inter else 0.0
+
+
+def match(truth: list, detections, threshold: float):
+    """Greedy one-to-one matching; returns (true positives, false positives)."""
+    unmatched = [tuple(int(v) for v in d) for d in detections]
+    found = 0
+    for box in truth:
+        best = max(unmatched, key=lambda d: iou(box, d), default=None)
+        if best is not None and iou(box, best) >= threshold:
+            found += 1
+            unmatched.remove(best)
+    return found, len(unmatched)
+
+
+def frame_sets(args):
+    """(name, [(frame, truth boxes), ...]) groups to evaluate."""
+    if args.annotations:
+        with open(args.annotations) as f:
+            annotations = json.load(f)
+        root = os.path.dirname(os.path.abspath(args.annotations))
+        frames = []
+        for path, boxes in annotations.items():
+            frame = cv2.imread(path if os.path.isabs(path) else os.path.join(root, path))
+            if frame is None:
+                raise SystemExit(f"Cannot read {path}")
+            frames.append((frame, [tuple(b) for b in boxes]))
+        return [("annotated", frames)]
+    face_image = cv2.imread(args.face_image) if args.face_image else None
+    sets = []
+    for resolution in args.resolutions:
+        width, height = (int(v) for v in resolution.split("x"))
+        for faces in args.faces:
+            for face_size in args.face_sizes or [None]:
+                frames = [synthetic_frame(width, height, faces, seed=i, face_image=face_image, face_size=face_size)
+                          for i in range(args.frames)]
+                sets.append((f"{resolution} f={faces}" + (f" {face_size}px" if face_size else ""), frames))
+    return sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detectors", nargs="+", default=sorted(DETECTORS), choices=sorted(DETECTORS))
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--faces", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--face-sizes", nargs="+", type=int, help="Fixed planted face sizes; default: fill the layout")
+    parser.add_argument("--max-sides", nargs="+", type=int, default=[0], help="Detection resolutions (0 = full frame)")
+    parser.add_argument("--frames", type=int, default=20, help="Synthetic frames per resolution/face count")
+    parser.add_argument("--face-image", help="Real face crop pasted at every planted face position")
+    parser.add_argument("--annotations", help="JSON of real frames and their face boxes instead of synthetic frames")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the frames (best is kept)")
+    parser.add_argument("--iou", type=float, default=0.4)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    detectors = {}
+    for name in args.detectors:
+        try:
+            base = load_detector(name)
+        except IOError as e: # Model file not downloaded
+            print(f"Skipping {name}: {e}")
+            continue
+        except (cv2.error, AttributeError) as e: # FaceDetectorYN needs OpenCV >= 4.8
+            print(f"Skipping {name}: this OpenCV ({cv2.__version__}) cannot load it: {e}")
+            continue
+        for max_side in args.max_sides:
+            detectors[(name, max_side)] = DownscaledDetector(base, max_side) if max_side else base
+
+    results = []
+    print(f"{'frames':>26} | {'detector':>12} | {'max side':>8} | {'ms/frame':>8} | {'recall':>6} | {'FP/frame':>8}")
+    for set_name, frames in frame_sets(args):
+        for (name, max_side), detector in detectors.items():
+            detector.detect(frames[0][0]) # Warm-up (DNN init, first allocation)
+            best_ms = float("inf")
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                detections = [detector.detect(frame) for frame, _ in frames]
+                best_ms = min(best_ms, (time.perf_counter() - started) * 1000.0 / len(frames))
+            found = false_positives = planted = 0
+            for (_, truth), boxes in zip(frames, detections):
+                tp, fp = match(truth, boxes, args.iou)
+                found, false_positives, planted = found + tp, false_positives + fp, planted + len(truth)
+            recall = found / planted if planted else None
+            results.append({"frames": set_name, "detector": name, "max_side": max_side, "ms_per_frame": best_ms,
+                            "recall": recall, "false_positives_per_frame": false_positives / len(frames)})
+            print(f"{set_name:>26} | {name:>12} | {max_side or 'full':>8} | {best_ms:>8.1f} | "
+                  f"{'-' if recall is None else f'{recall:.2f}':>6} | {false_positives / len(frames):>8.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Bytes on the wire and server CPU per frame for the /predict_webcam response modes.
+
+    image  decode, detect, classify, draw labels and re-encode a JPEG (the original mode)
+    json   decode, detect, classify and serialize the detections only (?format=json)
+    batch  like json, but --batch-size frames per request with their faces classified together
+           (/predict_webcam_batch)
+
+CPU is process time (all threads) spent in the server-side work of each mode, so model
+threads are included. Without --images the frames are synthetic, with --faces schematic
+faces each (see synthetic.py); pass a folder of real webcam frames for realistic sizes.
+
+Run from the emotionapp/ directory:
+    python -m benchmarks.bench_response_modes --images path/to/frames --limit 200
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from app import processing
+from benchmarks.synthetic import synthetic_frame
+
+
+def load_jpegs(images_dir: str, limit: int, faces: int = 1, width: int = 640, height: int = 480):
+    """JPEG-encoded client frames, read from a folder or synthesized."""
+    if images_dir:
+        paths = sorted(glob.glob(os.path.join(images_dir, '**', '*.jpg'), recursive=True))[:limit]
+        if not paths:
+            raise SystemExit(f"No .jpg images found under {images_dir}")
+        return [open(p, 'rb').read() for p in paths]
+    jpegs = []
+    for i in range(limit):
+        frame, _ = synthetic_frame(width, height, faces, seed=i)
+        jpegs.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+    return jpegs
+
+
+def json_payload(frame: np.ndarray, detections: list) -> bytes:
+    """The body /predict_webcam returns in JSON mode."""
+    return json.dumps({"width": frame.shape[1], "height": frame.shape[0],
+                       "detections": processing.compact_detections(detections)}).encode()
+
+
+def serve_image(jpegs):
+    sizes = []
+    for data in jpegs:
+        frame, faces = processing.decode_and_detect(data)
+        detections = processing.predict_emotions_for_faces(frame, faces)
+        sizes.append(len(processing.draw_and_encode_jpeg(frame, detections)))
+    return sizes
+
+
+def serve_json(jpegs):
+    sizes = []
+    for data in jpegs:
+        frame, faces = processing.decode_and_detect(data)
+        detections = processing.predict_emotions_for_faces(frame, faces)
+        sizes.append(len(json_payload(frame, detections)))
+    return sizes
+
+
+def serve_batch(jpegs, batch_size: int):
+    sizes = []
+    for start in range(0, len(jpegs), batch_size):
+        decoded = [processing.decode_and_detect(data) for data in jpegs[start:start + batch_size]]
+        prepared = [processing.prepare_faces(frame, faces) for frame, faces in decoded]
+        batches = [batch for _, batch, _ in prepared if len(batch)]
+        predictions = processing.classify_face_batch(np.concatenate(batches)) if batches else np.zeros((0, len(processing.EMOTION_LABELS)))
+        results, offset = [], 0
+        for (frame, _), (faces, batch, valid) in zip(decoded, prepared):
+            detections = processing.detections_from_predictions(faces, valid, predictions[offset:offset + len(batch)])
+            offset += len(batch)
+            results.append({"width": frame.shape[1], "height": frame.shape[0],
+                            "detections": processing.compact_detections(detections)})
+        # One response per request, spread evenly over its frames
+        size = len(json.dumps({"results": results}).encode())
+        sizes.extend([size / len(decoded)] * len(decoded))
+    return sizes
+
+
+def measure(fn, *args):
+    fn(*args) # Warm-up
+    wall, cpu = time.perf_counter(), time.process_time()
+    sizes = fn(*args)
+    return sizes, (time.process_time() - cpu) * 1000.0 / len(sizes), (time.perf_counter() - wall) * 1000.0 / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Folder of .jpg frames; synthetic frames if omitted")
+    parser.add_argument("--faces", type=int, default=1, help="Faces per synthetic frame")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    processing.load_resources()
+    jpegs = load_jpegs(args.images, args.limit, args.faces)
+    upload = np.mean([len(j) for j in jpegs])
+
+    print(f"{len(jpegs)} frames, mean upload {upload / 1024:.1f} KiB")
+    print(f"{'mode':>6} | {'response KiB':>12} | {'CPU ms/frame':>12} | {'wall ms/frame':>13}")
+    for mode, fn, extra in (("image", serve_image, ()), ("json", serve_json, ()),
+                            ("batch", serve_batch, (args.batch_size,))):
+        sizes, cpu_ms, wall_ms = measure(fn, jpegs, *extra)
+        print(f"{mode:>6} | {np.mean(sizes) / 1024:>12.2f} | {cpu_ms:>12.1f} | {wall_ms:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""
+Reproducible benchmark suite for the inference and video paths.
+
+Synthetic frames and clips are generated offline with fixed seeds (see synthetic.py) for
+every combination of --resolutions and --faces, and each case is measured with:
+
+    frame   predict_emotions_on_frame_data, called in-process on one frame at a time
+    webcam  the /predict_webcam round trip: JPEG upload to labelled response
+    video   /predict_video throughput: upload, processing by the job pool and completion
+
+Every case reports frames/sec, latency p50/p95/p99 (per frame, per request or per video),
+the faces the detector found against the faces planted, and the peak RSS of the process
+and its children. Results go to one JSON file tagged with the git commit; --compare
+diffs two such files and exits non-zero on regressions, e.g. between a branch and main.
+
+The HTTP cases run the app in-process through FastAPI's TestClient (needs httpx), so no
+server or network is involved; --url targets a running server instead. Only the CPU is
+used, and the result cache is disabled so repeated uploads are really processed.
+The in-process app never touches the real state: its job, upload and cache databases
+and its detection log live in a temporary directory (BENCH_WORKDIR), which is also the
+working directory for the staged and processed videos, and rollups are disabled.
+Peak RSS is a high-water mark: cases run in order of size, and --isolate runs each case
+in a fresh interpreter to get a per-case figure.
+
+Run from the emotionapp/ directory:
+    python -m benchmarks.bench_suite --output bench-results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_suite --benchmarks frame --resolutions 640x480 --faces 0 1 4
+    python -m benchmarks.bench_suite --compare bench-results/old.json bench-results/new.json
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Before the app (and TensorFlow) are imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+# Keep the in-process app away from the production jobs, uploads, logs and analytics.
+# --isolate children inherit BENCH_WORKDIR, so only the parent creates and removes it.
+if "BENCH_WORKDIR" not in os.environ:
+    os.environ["BENCH_WORKDIR"] = tempfile.mkdtemp(prefix="emotion-bench-")
+    atexit.register(shutil.rmtree, os.environ["BENCH_WORKDIR"], True)
+WORKDIR = os.environ["BENCH_WORKDIR"]
+for _name, _file in (("JOBS_DB_PATH", "video_jobs.sqlite3"), ("UPLOADS_DB_PATH", "uploads.sqlite3"),
+                     ("RESULT_CACHE_DB_PATH", "result_cache.sqlite3"), ("ANALYTICS_DB_PATH", "emotion_rollups.sqlite3"),
+                     ("LOG_DB_PATH", "emotion_detections.sqlite3")):
+    os.environ.setdefault(_name, os.path.join(WORKDIR, _file))
+os.environ.setdefault("ANALYTICS_ROLLUPS_ENABLED", "false")
+os.environ.setdefault("LOG_BACKEND", "sqlite") # Throwaway LOG_DB_PATH instead of app/logs/emotion_log.csv
+
+import cv2
+import numpy as np
+
+from app import config, processing
+from benchmarks.synthetic import synthetic_frame, write_synthetic_video
+
+BENCHMARKS = ("frame", "webcam", "video")
+RESULTS_VERSION = 1
+
+
+# --- Measurements ---
+def latency_summary(seconds: list) -> dict:
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        "mean": float(ms.mean()),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0,
+    }
+
+
+def case_frames(case: dict, count: int, face_image):
+    return [synthetic_frame(case["width"], case["height"], case["faces"], seed=i, face_image=face_image)[0]
+            for i in range(count)]
+
+
+def bench_frame(case: dict, args, face_image, client=None) -> dict:
+    frames = case_frames(case, args.distinct_frames, face_image)
+    for i in range(args.warmup):
+        processing.predict_emotions_on_frame_data(frames[i % len(frames)])
+    latencies, detected = [], []
+    started = time.perf_counter()
+    for i in range(args.iterations):
+        t0 = time.perf_counter()
+        detections = processing.predict_emotions_on_frame_data(frames[i % len(frames)])
+        latencies.append(time.perf_counter() - t0)
+        detected.append(len(detections))
+    elapsed = time.perf_counter() - started
+    return {"samples": len(latencies), "fps": len(latencies) / elapsed,
+            "latency_ms": latency_summary(latencies), "faces_detected_mean": float(np.mean(detected))}
+
+
+def bench_webcam(case: dict, args, face_image, client=None) -> dict:
+    jpegs = [cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+             for frame in case_frames(case, args.distinct_frames, face_image)]
+    params = {"format": "json"} if args.webcam_format == "json" else {}
+
+    def post(data: bytes):
+        response = client.post("/predict_webcam", params=params, files={"file": ("frame.jpg", data, "image/jpeg")})
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict_webcam answered {response.status_code}: {response.text[:200]}")
+        return response
+
+    for i in range(args.warmup):
+        post(jpegs[i % len(jpegs)])
+    latencies, response_bytes = [], []
+    started = time.perf_counter()
+    for i in range(args.iterations):
+        t0 = time.perf_counter()
+        response = post(jpegs[i % len(jpegs)])
+        latencies.append(time.perf_counter() - t0)
+        response_bytes.append(len(response.content))
+    elapsed = time.perf_counter() - started
+    return {"samples": len(latencies), "fps": len(latencies) / elapsed, "latency_ms": latency_summary(latencies),
+            "upload_bytes_mean": float(np.mean([len(j) for j in jpegs])),
+            "response_bytes_mean": float(np.mean(response_bytes))}
+
+
+def bench_video(case: dict, args, face_image, client=None) -> dict:
+    durations, job_fps = [], []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for run in range(args.video_runs):
+            # A new seed per run: identical content could be answered from a server's result cache
+            path = os.path.join(tmp_dir, f"bench_{case['width']}x{case['height']}_{case['faces']}_{run}.mp4")
+            write_synthetic_video(path, args.video_frames, case["width"], case["height"], case["faces"],
+                                  seed=1000 + run, face_image=face_image)
+            started = time.perf_counter()
+            with open(path, "rb") as f:
+                response = client.post("/predict_video", files={"file": (os.path.basename(path), f, "video/mp4")})
+            if response.status_code not in (200, 202):
+                raise RuntimeError(f"/predict_video answered {response.status_code}: {response.text[:200]}")
+            queued = response.json()
+            if queued.get("cached"):
+                raise RuntimeError("/predict_video answered from the result cache; disable RESULT_CACHE_ENABLED on the server.")
+            while True:
+                job = client.get(queued["status_url"]).json()
+                if job["status"] in ("done", "failed"):
+                    break
+                time.sleep(args.poll_interval)
+            if job["status"] == "failed":
+                raise RuntimeError(f"Video job failed: {job['error']}")
+            durations.append(time.perf_counter() - started)
+            job_fps.append(job["fps"] or 0.0)
+    frames = args.video_frames * len(durations)
+    return {"samples": len(durations), "frames_per_video": args.video_frames,
+            "fps": frames / sum(durations), # End to end: upload, queueing, processing, polling
+            "job_fps_mean": float(np.mean(job_fps)), # As reported by the job itself
+            "latency_ms": latency_summary(durations)}
+
+
+BENCHMARK_FUNCTIONS = {"frame": bench_frame, "webcam": bench_webcam, "video": bench_video}
+
+
+# --- Running ---
+def build_cases(args) -> list:
+    cases = []
+    for benchmark in args.benchmarks:
+        for resolution in sorted(args.resolutions, key=lambda r: [int(v) for v in r.split("x")]):
+            width, height = (int(v) for v in resolution.split("x"))
+            for faces in sorted(args.faces):
+                cases.append({"benchmark": benchmark, "width": width, "height": height, "faces": faces})
+    return cases
+
+
+def open_client(args):
+    """
+    httpx client for the HTTP cases: the in-process app (lifespan included) or --url.
+    The in-process app resolves temp_videos_api/ and processed_videos_api/ against the
+    working directory, so the caller must be in WORKDIR while it runs.
+    """
+    if args.url:
+        import httpx
+        return httpx.Client(base_url=args.url, timeout=600)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
+
+
+def run_cases(cases: list, args) -> list:
+    face_image = cv2.imread(args.face_image) if args.face_image else None
+    if args.face_image and face_image is None:
+        raise SystemExit(f"Cannot read --face-image {args.face_image}")
+    if any(case["benchmark"] == "frame" for case in cases):
+        processing.load_resources()
+    needs_client = any(case["benchmark"] != "frame" for case in cases)
+    cwd = os.getcwd()
+    os.chdir(WORKDIR)
+    results = []
+    client = None
+    try:
+        client = open_client(args) if needs_client else None
+        if client is not None:
+            client.__enter__() # Runs the app's lifespan: model, inference scheduler, job pool
+        for case in cases:
+            print(f"Running {case['benchmark']} {case['width']}x{case['height']} faces={case['faces']}...",
+                  file=sys.stderr, flush=True)
+            try:
+                result = BENCHMARK_FUNCTIONS[case["benchmark"]](case, args, face_image, client)
+            except Exception as e:
+                result = {"error": str(e)}
+            results.append({**case, **result, "peak_rss_mb": peak_rss_mb()})
+    finally:
+        if client is not None:
+            client.__exit__(None, None, None)
+        os.chdir(cwd)
+    return results
+
+
+def run_isolated(cases: list, argv: list) -> list:
+    results = []
+    for case in cases:
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_suite", *argv, "--run-case", json.dumps(case)],
+                                   capture_output=True, text=True)
+        sys.stderr.write(completed.stderr[-2000:] if completed.returncode else "")
+        if completed.returncode != 0 or not completed.stdout.strip():
+            results.append({**case, "error": f"Isolated run exited with {completed.returncode}"})
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def git_revision() -> dict:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "model": processing.model_info(),
+        "config": {
+            "MODEL_NUM_THREADS": config.MODEL_NUM_THREADS,
+            "CPU_EXECUTOR_KIND": config.CPU_EXECUTOR_KIND,
+            "INFERENCE_BATCHING_ENABLED": config.INFERENCE_BATCHING_ENABLED,
+            "VIDEO_JOB_WORKERS": config.VIDEO_JOB_WORKERS,
+            "FACE_DETECTOR": config.FACE_DETECTOR,
+            "DETECT_MAX_SIDE": config.DETECT_MAX_SIDE,
+            "PROCESS_EVERY_N_FRAMES": config.PROCESS_EVERY_N_FRAMES,
+            "VIDEO_TRACKING_ENABLED": config.VIDEO_TRACKING_ENABLED,
+        },
+    }
+
+
+# --- Comparing ---
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Prints fps and p95 changes per case; returns the number of regressions beyond threshold."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    key = lambda r: (r["benchmark"], r["width"], r["height"], r["faces"])
+    old_results = {key(r): r for r in old["results"] if "error" not in r}
+    print(f"{(old['commit'] or '?')[:10]} -> {(new['commit'] or '?')[:10]}")
+    print(f"{'case':>28} | {'fps old':>9} | {'fps new':>9} | {'fps':>7} | {'p95 ms old':>10} | {'p95 ms new':>10} | {'p95':>7}")
+    regressions = 0
+    for result in new["results"]:
+        before = old_results.get(key(result))
+        if before is None or "error" in result:
+            continue
+        fps_change = result["fps"] / before["fps"] - 1.0
+        p95_change = result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1.0
+        regressed = fps_change < -threshold or p95_change > threshold
+        regressions += regressed
+        name = f"{result['benchmark']} {result['width']}x{result['height']} f={result['faces']}"
+        print(f"{name:>28} | {before['fps']:>9.1f} | {result['fps']:>9.1f} | {fps_change:>+7.1%} | "
+              f"{before['latency_ms']['p95']:>10.1f} | {result['latency_ms']['p95']:>10.1f} | {p95_change:>+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--faces", nargs="+", type=int, default=[0, 1, 4])
+    parser.add_argument("--iterations", type=int, default=100, help="Measured calls per frame/webcam case")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--distinct-frames", type=int, default=10, help="Synthetic frames cycled through per case")
+    parser.add_argument("--webcam-format", choices=["image", "json"], default="image")
+    parser.add_argument("--video-frames", type=int, default=150)
+    parser.add_argument("--video-runs", type=int, default=3)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--face-image", help="Real face crop pasted at every face position instead of a drawn face")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--isolate", action="store_true", help="Run every case in its own interpreter")
+    parser.add_argument("--output", help="JSON results file (default: print to stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files and exit")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS) # Used by --isolate
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    if args.run_case:
+        print(json.dumps(run_cases([json.loads(args.run_case)], args)[0]))
+        return
+
+    cases = build_cases(args)
+    if args.isolate:
+        argv = [a for a in sys.argv[1:] if a != "--isolate"]
+        results = run_isolated(cases, argv)
+    else:
+        results = run_cases(cases, args)
+
+    report = {
+        "version": RESULTS_VERSION,
+        **git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("compare", "run_case", "output")},
+        "results": results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(body)
+
+    print(f"{'case':>28} | {'fps':>9} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'peak RSS MiB':>12}", file=sys.stderr)
+    for result in results:
+        name = f"{result['benchmark']} {result['width']}x{result['height']} f={result['faces']}"
+        if "error" in result:
+            print(f"{name:>28} | error: {result['error']}", file=sys.stderr)
+            continue
+        latency = result["latency_ms"]
+        print(f"{name:>28} | {result['fps']:>9.1f} | {latency['p50']:>8.1f} | {latency['p95']:>8.1f} | "
+              f"{latency['p99']:>8.1f} | {result['peak_rss_mb']['self']:>12.0f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Throughput (frames/sec) of the sequential video loop against the pipelined engine, with
+face tracking (VIDEO_TRACKING_ENABLED) on and off.
+
+With tracking, the pipeline runs one tracking stage in frame order instead of
+PIPELINE_DETECT_WORKERS parallel detect workers with cross-frame face batching, so the
+two modes trade detection passes saved against detection parallelism.
+
+Pass a reference clip with --video; without one a synthetic clip with --faces drifting
+schematic faces is generated (see synthetic.py).
+
+Run from the emotionapp/ directory:
+    python -m benchmarks.bench_video_pipeline --video reference.mp4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app import processing
+from app.video import process_video
+from benchmarks.synthetic import write_synthetic_video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Reference clip; a synthetic one is generated if omitted")
+    parser.add_argument("--faces", type=int, default=2, help="Faces in the synthetic clip")
+    parser.add_argument("--engines", nargs="+", default=["sequential", "pipeline"])
+    parser.add_argument("--tracking", nargs="+", choices=["on", "off"], default=["off", "on"])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    processing.load_resources()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(tmp_dir, "synthetic.mp4")
+            write_synthetic_video(video_path, frames=300, width=1280, height=720, faces=args.faces)
+
+        results = {}
+        for tracking in args.tracking:
+            for engine in args.engines:
+                best_fps = 0.0
+                for run in range(args.repeats):
+                    output_path = os.path.join(tmp_dir, f"out_{engine}_{tracking}_{run}.mp4")
+                    start = time.perf_counter()
+                    frames = process_video(video_path, output_path, os.path.basename(video_path), engine=engine,
+                                           tracking=tracking == "on")
+                    best_fps = max(best_fps, frames / (time.perf_counter() - start))
+                results[engine, tracking] = best_fps
+                print(f"{engine:>10}, tracking {tracking:>3}: {best_fps:7.1f} frames/sec "
+                      f"({frames} frames, best of {args.repeats})")
+
+        for (engine, tracking), fps in results.items():
+            if engine != "sequential" and ("sequential", tracking) in results:
+                print(f"{engine} speedup over sequential, tracking {tracking}: "
+                      f"{fps / results['sequential', tracking]:.2f}x")
+        for engine in args.engines:
+            if (engine, "on") in results and (engine, "off") in results:
+                print(f"{engine} with tracking vs without: {results[engine, 'on'] / results[engine, 'off']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Load generator simulating many concurrent webcam users against a running server.
+
+Each simulated client follows webcam-module.js: one frame in flight at a time, the next
+JPEG captured when the previous answer arrives (at most --camera-fps per client), and a
+500 ms back-off after an error. Clients talk either to /predict_webcam (a session_id per
+client, --format json or image) or to the /ws/webcam WebSocket.
+
+The client count is ramped through --clients; every step runs for --settle seconds
+(discarded) plus --step-duration seconds (measured) while the earlier clients keep
+running. Per step it reports throughput, fps per client (mean and slowest), latency
+p50/p95/p99, error and busy (503 or "busy" message) rates, and the server's own view
+from /stats: frames rejected by the frame executor, inference queue depth and batch
+size. The saturation point is the first step that breaks the --slo-ms p95 target,
+exceeds --max-error-rate, or stops adding throughput; the step before it is the
+number of users one instance can take.
+
+Needs httpx, and websockets for --transport ws. Start the server, then run from the
+emotionapp/ directory:
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.load_webcam --url http://127.0.0.1:8000 --clients 1 2 4 8 16 32
+    python -m benchmarks.load_webcam --transport ws --width 1280 --height 720 --output load.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+
+import cv2
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import synthetic_frame
+
+ERROR_BACKOFF_S = 0.5 # Same as the setTimeout in webcam-module.js
+
+
+def load_jpegs(args) -> list:
+    if args.images:
+        paths = sorted(glob.glob(os.path.join(args.images, '**', '*.jpg'), recursive=True))[:args.distinct_frames]
+        if not paths:
+            raise SystemExit(f"No .jpg images found under {args.images}")
+        frames = [cv2.resize(cv2.imread(p), (args.width, args.height)) for p in paths]
+    else:
+        frames = [synthetic_frame(args.width, args.height, args.faces, seed=i)[0] for i in range(args.distinct_frames)]
+    return [cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])[1].tobytes() for frame in frames]
+
+
+class Recorder:
+    """Outcome of every request: (finished_at, client_id, latency_s, outcome)."""
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, client_id: int, started: float, outcome: str):
+        finished = time.perf_counter()
+        self.samples.append((finished, client_id, finished - started, outcome))
+
+    def between(self, start: float, end: float) -> list:
+        return [s for s in self.samples if start <= s[0] < end]
+
+
+async def pace(started: float, outcome: str, args):
+    """Waits for the next camera frame, or backs off after a failure."""
+    if outcome != "ok":
+        await asyncio.sleep(ERROR_BACKOFF_S)
+        return
+    remaining = started + 1.0 / args.camera_fps - time.perf_counter()
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+
+
+async def http_client(client_id: int, args, jpegs: list, recorder: Recorder, stop: asyncio.Event):
+    params = {"session_id": f"load-{client_id}"}
+    if args.format == "json":
+        params["format"] = "json"
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        i = client_id # Clients start at different frames
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = await client.post("/predict_webcam", params=params,
+                                             files={"file": ("webcam_frame.jpg", jpegs[i % len(jpegs)], "image/jpeg")})
+                outcome = "ok" if response.status_code == 200 else "busy" if response.status_code == 503 else "error"
+            except httpx.HTTPError:
+                outcome = "error"
+            recorder.record(client_id, started, outcome)
+            i += 1
+            await pace(started, outcome, args)
+
+
+async def ws_client(client_id: int, args, jpegs: list, recorder: Recorder, stop: asyncio.Event):
+    import websockets
+    url = args.url.replace("http", "ws", 1).rstrip("/") + "/ws/webcam"
+    i = client_id
+    while not stop.is_set():
+        try:
+            async with websockets.connect(url, max_size=None, open_timeout=args.timeout) as socket:
+                json.loads(await socket.recv()) # hello
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    await socket.send(jpegs[i % len(jpegs)])
+                    message = json.loads(await asyncio.wait_for(socket.recv(), args.timeout))
+                    outcome = {"detections": "ok", "busy": "busy"}.get(message.get("type"), "error")
+                    recorder.record(client_id, started, outcome)
+                    i += 1
+                    await pace(started, outcome, args)
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+            # Reconnect like a page reload would; counted as one failed frame
+            recorder.record(client_id, time.perf_counter(), "error")
+            await asyncio.sleep(ERROR_BACKOFF_S)
+
+
+async def fetch_stats(url: str):
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=10) as client:
+            return (await client.get("/stats")).json()
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+def summarize(samples: list, clients: int, duration: float, stats_before, stats_after) -> dict:
+    ok = [s for s in samples if s[3] == "ok"]
+    attempts = max(len(samples), 1)
+    per_client = [sum(1 for s in ok if s[1] == c) / duration for c in range(clients)]
+    latencies = np.asarray([s[2] for s in ok]) * 1000.0 if ok else np.asarray([np.nan])
+    step = {
+        "clients": clients,
+        "duration_s": duration,
+        "requests": len(samples),
+        "throughput_fps": len(ok) / duration,
+        "fps_per_client_mean": float(np.mean(per_client)),
+        "fps_per_client_min": float(np.min(per_client)),
+        "latency_ms": {p: float(np.percentile(latencies, q)) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "error_rate": sum(1 for s in samples if s[3] == "error") / attempts,
+        "busy_rate": sum(1 for s in samples if s[3] == "busy") / attempts,
+    }
+    if stats_before and stats_after:
+        scheduler, executor = stats_after["inference_scheduler"], stats_after["frame_executor"]
+        step["server"] = {
+            "frames_rejected": executor["rejected"] - stats_before["frame_executor"]["rejected"],
+            "frame_executor_in_flight": executor["in_flight"],
+            "inference_queue_faces": scheduler["queue_depth_faces"],
+            "inference_avg_batch_size": scheduler["avg_batch_size"],
+        }
+    return step
+
+
+def find_saturation(steps: list, slo_ms: float, max_error_rate: float):
+    """First step that misses the latency target, fails too often or adds no throughput."""
+    previous = None
+    for step in steps:
+        reasons = []
+        if step["latency_ms"]["p95"] > slo_ms:
+            reasons.append(f"p95 {step['latency_ms']['p95']:.0f} ms > {slo_ms:.0f} ms")
+        if step["error_rate"] + step["busy_rate"] > max_error_rate:
+            reasons.append(f"{step['error_rate'] + step['busy_rate']:.1%} of requests failed or were rejected")
+        if step.get("server", {}).get("frames_rejected"):
+            reasons.append(f"server rejected {step['server']['frames_rejected']} frames")
+        if previous is not None and step["throughput_fps"] < previous["throughput_fps"] * 1.05:
+            reasons.append("throughput stopped growing")
+        if reasons:
+            return {"clients": step["clients"], "max_clients_within_slo": previous["clients"] if previous else None,
+                    "reasons": reasons}
+        previous = step
+    return None
+
+
+async def run(args) -> dict:
+    jpegs = load_jpegs(args)
+    recorder, stop = Recorder(), asyncio.Event()
+    client_fn = ws_client if args.transport == "ws" else http_client
+    tasks, steps = [], []
+    try:
+        for clients in sorted(args.clients):
+            while len(tasks) < clients:
+                tasks.append(asyncio.create_task(client_fn(len(tasks), args, jpegs, recorder, stop)))
+            await asyncio.sleep(args.settle)
+            stats_before, start = await fetch_stats(args.url), time.perf_counter()
+            await asyncio.sleep(args.step_duration)
+            end, stats_after = time.perf_counter(), await fetch_stats(args.url)
+            step = summarize(recorder.between(start, end), clients, end - start, stats_before, stats_after)
+            steps.append(step)
+            print(f"{clients:>7} | {step['throughput_fps']:>8.1f} | {step['fps_per_client_mean']:>8.1f} | "
+                  f"{step['fps_per_client_min']:>7.1f} | {step['latency_ms']['p50']:>7.0f} | {step['latency_ms']['p95']:>7.0f} | "
+                  f"{step['latency_ms']['p99']:>7.0f} | {step['error_rate']:>6.1%} | {step['busy_rate']:>6.1%}", flush=True)
+            if args.stop_at_saturation and find_saturation(steps, args.slo_ms, args.max_error_rate):
+                break
+    finally:
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "url": args.url,
+        "transport": args.transport,
+        "format": args.format,
+        "frame": {"width": args.width, "height": args.height, "quality": args.quality, "faces": args.faces,
+                  "jpeg_bytes_mean": float(np.mean([len(j) for j in jpegs]))},
+        "camera_fps": args.camera_fps,
+        "steps": steps,
+        "saturation": find_saturation(steps, args.slo_ms, args.max_error_rate),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--transport", choices=["http", "ws"], default="http")
+    parser.add_argument("--format", choices=["json", "image"], default="json", help="/predict_webcam response mode")
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds after each ramp step before measuring")
+    parser.add_argument("--step-duration", type=float, default=20.0)
+    parser.add_argument("--camera-fps", type=float, default=30.0, help="Capture rate cap per client")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality (the browser sends 0.8)")
+    parser.add_argument("--faces", type=int, default=1, help="Faces per synthetic frame")
+    parser.add_argument("--images", help="Folder of real .jpg frames instead of synthetic ones")
+    parser.add_argument("--distinct-frames", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--slo-ms", type=float, default=250.0, help="p95 latency target")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--stop-at-saturation", action="store_true")
+    parser.add_argument("--output", help="Write the steps and saturation point as JSON")
+    args = parser.parse_args()
+
+    print(f"{'clients':>7} | {'fps':>8} | {'fps/cl':>8} | {'min/cl':>7} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'p99 ms':>7} | {'errors':>6} | {'busy':>6}")
+    report = asyncio.run(run(args))
+    saturation = report["saturation"]
+    if saturation is None:
+        print(f"No saturation up to {max(args.clients)} clients.")
+    else:
+        print(f"Saturated at {saturation['clients']} clients ({'; '.join(saturation['reasons'])}); "
+              f"max within SLO: {saturation['max_clients_within_slo']}.")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Deterministic synthetic frames and clips for the benchmarks, generated offline.
+
+Faces are drawn as schematic frontal faces (skin-toned oval, brows, eyes, nose, mouth),
+which the Haar cascade usually picks up; the detected count is reported next to the
+planted one. For realistic detection rates pass a real face crop as face_image and it is
+pasted at every face position instead.
+"""
+import math
+
+import cv2
+import numpy as np
+
+SKIN_TONES = [(140, 170, 215), (110, 145, 195), (90, 120, 170), (70, 95, 140)] # BGR
+
+
+def face_boxes(width: int, height: int, faces: int, rng, face_size: int = None) -> list:
+    """
+    Non-overlapping (x, y, w, h) boxes on a grid, one face per cell, jittered inside it.
+    Faces fill 70% of their cell unless face_size (pixels) is given.
+    """
+    if faces <= 0:
+        return []
+    cols = math.ceil(math.sqrt(faces * width / height))
+    rows = math.ceil(faces / cols)
+    cell_w, cell_h = width / cols, height / rows
+    size = face_size or max(48, int(min(cell_w, cell_h) * 0.7))
+    size = min(size, int(min(cell_w, cell_h)))
+    boxes = []
+    for i in range(faces):
+        col, row = i % cols, i // cols
+        slack_x, slack_y = max(0, int(cell_w - size)), max(0, int(cell_h - size))
+        x = int(col * cell_w) + int(rng.integers(0, slack_x + 1))
+        y = int(row * cell_h) + int(rng.integers(0, slack_y + 1))
+        boxes.append((min(x, width - size), min(y, height - size), size, size))
+    return boxes
+
+
+def draw_face(frame: np.ndarray, box, tone, face_image: np.ndarray = None):
+    x, y, s, _ = box
+    if face_image is not None:
+        frame[y:y + s, x:x + s] = cv2.resize(face_image, (s, s))
+        return
+    cx = x + s // 2
+    cv2.ellipse(frame, (cx, y + int(0.40 * s)), (int(0.40 * s), int(0.36 * s)), 0, 180, 360, (30, 30, 40), -1) # Hair
+    cv2.ellipse(frame, (cx, y + s // 2), (int(0.36 * s), int(0.47 * s)), 0, 0, 360, tone, -1)
+    for side in (-1, 1):
+        ex = cx + side * int(0.16 * s)
+        cv2.line(frame, (ex - int(0.09 * s), y + int(0.31 * s)), (ex + int(0.09 * s), y + int(0.30 * s)),
+                 (40, 40, 50), max(1, s // 40))
+        cv2.ellipse(frame, (ex, y + int(0.40 * s)), (int(0.08 * s), int(0.04 * s)), 0, 0, 360, (250, 250, 250), -1)
+        cv2.circle(frame, (ex, y + int(0.40 * s)), max(1, int(0.03 * s)), (30, 20, 20), -1)
+    nose = np.array([[cx, y + int(0.45 * s)], [cx - int(0.05 * s), y + int(0.62 * s)],
+                     [cx + int(0.05 * s), y + int(0.62 * s)]], dtype=np.int32)
+    cv2.fillPoly(frame, [nose], tuple(max(0, c - 25) for c in tone))
+    cv2.ellipse(frame, (cx, y + int(0.76 * s)), (int(0.14 * s), int(0.05 * s)), 0, 0, 360, (60, 60, 150), -1)
+    roi = frame[y:y + s, x:x + s]
+    roi[:] = cv2.GaussianBlur(roi, (0, 0), max(0.5, s / 120))
+
+
+def background(width: int, height: int, rng) -> np.ndarray:
+    """Gradient plus mild noise: compresses and decodes like a camera frame, unlike pure noise."""
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = np.linspace(60, 190, width, dtype=np.uint8)[None, :, None]
+    frame[:] = np.clip(frame.astype(np.int16) + rng.integers(-12, 13, size=(height, width, 1), dtype=np.int16), 0, 255)
+    return frame
+
+
+def synthetic_frame(width: int, height: int, faces: int, seed: int = 0, face_image: np.ndarray = None,
+                    face_size: int = None):
+    """A BGR frame with `faces` planted faces; returns (frame, boxes)."""
+    rng = np.random.default_rng(seed)
+    frame = background(width, height, rng)
+    boxes = face_boxes(width, height, faces, rng, face_size)
+    for i, box in enumerate(boxes):
+        draw_face(frame, box, SKIN_TONES[i % len(SKIN_TONES)], face_image)
+    return frame, boxes
+
+
+def write_synthetic_video(path: str, frames: int, width: int, height: int, faces: int, fps: int = 25,
+                          seed: int = 0, face_image: np.ndarray = None) -> list:
+    """
+    Writes an mp4 whose faces drift slowly across a panning background, so every frame
+    differs (nothing is trivially cached or compressed away). Returns the initial face boxes.
+    """
+    rng = np.random.default_rng(seed)
+    base = background(width, height, rng)
+    boxes = face_boxes(width, height, faces, rng)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        for i in range(frames):
+            frame = np.roll(base, shift=i * 2, axis=1)
+            dx = int(6 * math.sin(i / 10.0))
+            for j, (x, y, s, _) in enumerate(boxes):
+                moved = (min(max(0, x + dx), width - s), y, s, s)
+                draw_face(frame, moved, SKIN_TONES[j % len(SKIN_TONES)], face_image)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return boxes
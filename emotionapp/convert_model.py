@@ -0,0 +1,59 @@
+"""
+Exports the Keras model trained by cnn.py (model_optimal.h5) to lightweight runtimes.
+
+    python convert_model.py --formats tflite onnx
+
+writes app/models/model_optimal.tflite and app/models/model_optimal.onnx next to the .h5.
+The server picks one with MODEL_BACKEND=tflite|onnx (see app/backends.py).
+ONNX export needs `pip install tf2onnx`. Check the exports with
+`python -m benchmarks.bench_backends` before deploying them.
+"""
+import argparse
+import os
+
+import tensorflow as tf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, 'app', 'models', 'model_optimal.h5')
+targetx = 100 # Must match cnn.py
+targety = 100
+
+
+def export_tflite(model, output_path: str):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output_path: str, opset: int = 13):
+    import tf2onnx
+    # Batch dimension left dynamic so the server can classify any number of faces at once
+    input_signature = [tf.TensorSpec((None, targetx, targety, 3), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=opset, output_path=output_path)
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='Keras .h5 model to convert')
+    parser.add_argument('--formats', nargs='+', choices=sorted(EXPORTERS), default=sorted(EXPORTERS))
+    parser.add_argument('--out-dir', help='Defaults to the directory of --model')
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    out_dir = args.out_dir or os.path.dirname(os.path.abspath(args.model))
+    base_name = os.path.splitext(os.path.basename(args.model))[0]
+
+    for fmt in args.formats:
+        output_path = os.path.join(out_dir, f'{base_name}.{fmt}')
+        EXPORTERS[fmt](model, output_path)
+        print(f'{fmt}: wrote {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
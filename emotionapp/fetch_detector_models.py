@@ -0,0 +1,61 @@
+"""
+Downloads the model files of the DNN face detectors in app/detectors.py into app/models/.
+
+    python fetch_detector_models.py              # yunet and ssd
+    python fetch_detector_models.py --detectors yunet
+
+yunet: face_detection_yunet_2023mar.onnx from the OpenCV model zoo (MIT license, ~230 KB).
+ssd:   res10_300x300_ssd_iter_140000.caffemodel + deploy.prototxt from the OpenCV samples
+       (BSD-style license, ~10 MB).
+The server uses them with FACE_DETECTOR=yunet|ssd; the default Haar cascade needs nothing.
+Files already present are kept. Compare the detectors afterwards with
+`python -m benchmarks.bench_detectors`.
+"""
+import argparse
+import os
+import urllib.request
+
+from app.detectors import MODEL_DIR, SSD_CONFIG_PATH, SSD_MODEL_PATH, YUNET_MODEL_PATH
+
+MODEL_URLS = {
+    'yunet': [
+        (YUNET_MODEL_PATH, 'https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/'
+                           'face_detection_yunet_2023mar.onnx'),
+    ],
+    'ssd': [
+        (SSD_MODEL_PATH, 'https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20170830/'
+                         'res10_300x300_ssd_iter_140000.caffemodel'),
+        (SSD_CONFIG_PATH, 'https://raw.githubusercontent.com/opencv/opencv/4.x/samples/dnn/face_detector/deploy.prototxt'),
+    ],
+}
+
+
+def fetch(url: str, path: str):
+    partial_path = path + '.part'
+    with urllib.request.urlopen(url, timeout=60) as response, open(partial_path, 'wb') as f:
+        while True:
+            block = response.read(1 << 20)
+            if not block:
+                break
+            f.write(block)
+    os.replace(partial_path, path) # Never leave a truncated model behind
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--detectors', nargs='+', choices=sorted(MODEL_URLS), default=sorted(MODEL_URLS))
+    args = parser.parse_args()
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    for name in args.detectors:
+        for path, url in MODEL_URLS[name]:
+            if os.path.exists(path):
+                print(f"{name}: {os.path.basename(path)} already present")
+                continue
+            print(f"{name}: downloading {url}")
+            fetch(url, path)
+            print(f"{name}: wrote {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
+
+
+if __name__ == '__main__':
+    main()
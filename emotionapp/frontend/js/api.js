@@ -1,12 +1,14 @@
 // (Your existing api.js content - ensure API_BASE_URL is correct)
 const API_BASE_URL = 'http://127.0.0.1:8000'; // Or http://127.0.0.1:8000
 
-async function predictWebcamFrame(imageDataBlob) {
+async function predictWebcamFrame(imageDataBlob, sessionId) {
     const formData = new FormData();
     formData.append('file', imageDataBlob, 'webcam_frame.jpg');
+    // The session lets the server track faces and reuse cached emotions between frames
+    const query = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : '';
 
     try {
-        const response = await fetch(`${API_BASE_URL}/predict_webcam`, {
+        const response = await fetch(`${API_BASE_URL}/predict_webcam${query}`, {
             method: 'POST',
             body: formData,
         });
@@ -23,19 +25,44 @@ async function predictWebcamFrame(imageDataBlob) {
     }
 }
 
-async function uploadVideoForProcessing(videoFile) {
+async function predictWebcamDetections(imageDataBlob, sessionId) {
     const formData = new FormData();
-    formData.append('file', videoFile);
+    formData.append('file', imageDataBlob, 'webcam_frame.jpg');
+    const params = new URLSearchParams({ format: 'json' });
+    if (sessionId) params.set('session_id', sessionId);
 
     try {
-        const response = await fetch(`${API_BASE_URL}/predict_video`, {
+        const response = await fetch(`${API_BASE_URL}/predict_webcam?${params}`, {
             method: 'POST',
             body: formData,
         });
 
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({ detail: 'Unknown error occurred' }));
-            console.error('Error from /predict_video:', response.status, errorData);
+            console.error('Error from /predict_webcam:', response.status, errorData);
+            throw new Error(`Server error: ${response.status} - ${errorData.detail || 'Failed to process frame'}`);
+        }
+        return await response.json(); // { width, height, detections: [{ roi, emotion, probabilities }] }
+    } catch (error) {
+        console.error('Network or other error in predictWebcamDetections:', error);
+        throw error;
+    }
+}
+
+async function uploadVideoForProcessing(videoFile) {
+    // Raw body instead of multipart: the server starts decoding while the upload is still arriving
+    const query = new URLSearchParams({ filename: videoFile.name });
+
+    try {
+        const response = await fetch(`${API_BASE_URL}/predict_video_stream?${query}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/octet-stream' },
+            body: videoFile,
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ detail: 'Unknown error occurred' }));
+            console.error('Error from /predict_video_stream:', response.status, errorData);
             throw new Error(`Server error: ${response.status} - ${errorData.detail || 'Failed to process video'}`);
         }
         return await response.json();
@@ -43,4 +70,85 @@ async function uploadVideoForProcessing(videoFile) {
         console.error('Network or other error in uploadVideoForProcessing:', error);
         throw error;
     }
-}
\ No newline at end of file
+}
+
+async function sha256Hex(blob) {
+    if (!(window.crypto && crypto.subtle)) return null; // Only available in secure contexts (https, localhost)
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadJson(url, options) {
+    const response = await fetch(url, options);
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({ detail: 'Unknown error occurred' }));
+        const error = new Error(`Server error: ${response.status} - ${errorData.detail || 'Upload failed'}`);
+        error.status = response.status;
+        throw error;
+    }
+    return await response.json();
+}
+
+async function uploadVideoResumable(videoFile, onProgress, maxRetries = 5) {
+    // Chunked upload (POST /uploads, PUT chunks at offsets, finalize) for large files:
+    // a dropped connection only costs the chunk in flight, the rest is resumed from
+    // the ranges the server reports as received.
+    try {
+        const upload = await uploadJson(`${API_BASE_URL}/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: videoFile.name, size: videoFile.size }),
+        });
+        const uploadUrl = `${API_BASE_URL}${upload.upload_url}`;
+        let received = [];
+        let retries = 0;
+
+        for (;;) {
+            // First missing byte, given the received [start, end) ranges sorted by start
+            let offset = 0;
+            for (const [start, end] of received) {
+                if (start > offset) break;
+                offset = Math.max(offset, end);
+            }
+            if (offset >= videoFile.size) break;
+
+            const chunk = videoFile.slice(offset, Math.min(offset + upload.chunk_size, videoFile.size));
+            const headers = { 'Content-Type': 'application/octet-stream' };
+            const checksum = await sha256Hex(chunk);
+            if (checksum) headers['X-Chunk-SHA256'] = checksum;
+            try {
+                const result = await uploadJson(`${uploadUrl}?offset=${offset}`, { method: 'PUT', headers, body: chunk });
+                received.push([offset, offset + result.length]);
+                received.sort((a, b) => a[0] - b[0]);
+                retries = 0;
+                if (onProgress) onProgress(result.received_bytes / videoFile.size);
+            } catch (error) {
+                if (++retries > maxRetries || (error.status && error.status < 500 && error.status !== 422)) throw error;
+                console.warn(`Chunk at offset ${offset} failed (${error.message}), resuming...`);
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                received = (await uploadJson(uploadUrl)).received;
+            }
+        }
+
+        return await uploadJson(`${uploadUrl}/finalize`, { method: 'POST' });
+    } catch (error) {
+        console.error('Network or other error in uploadVideoResumable:', error);
+        throw error;
+    }
+}
+
+async function getVideoJobStatus(statusUrl) {
+    try {
+        const response = await fetch(`${API_BASE_URL}${statusUrl}`);
+
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ detail: 'Unknown error occurred' }));
+            console.error(`Error from ${statusUrl}:`, response.status, errorData);
+            throw new Error(`Server error: ${response.status} - ${errorData.detail || 'Failed to get job status'}`);
+        }
+        return await response.json();
+    } catch (error) {
+        console.error('Network or other error in getVideoJobStatus:', error);
+        throw error;
+    }
+}
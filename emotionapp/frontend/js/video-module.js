@@ -1,4 +1,7 @@
 const VideoModule = (() => {
+    const JOB_POLL_INTERVAL_MS = 1000;
+    const RESUMABLE_UPLOAD_MIN_BYTES = 100 * 1024 * 1024;
+
     // DOM Elements
     let videoFileInput, selectVideoFileBtn, selectedFileName, processVideoBtn,
         videoUploadStatus, videoResultArea, resultVideoPlayer, downloadResultLink;
@@ -39,8 +42,16 @@ const VideoModule = (() => {
         downloadResultLink.style.display = 'none';
 
         try {
-            const result = await uploadVideoForProcessing(file); // from api.js
-            videoUploadStatus.textContent = `Server: ${result.message || 'Processing complete.'}`;
+            // Large files go through the resumable chunked upload, which survives dropped connections
+            const queued = file.size >= RESUMABLE_UPLOAD_MIN_BYTES
+                ? await uploadVideoResumable(file, fraction => { // from api.js
+                    videoUploadStatus.textContent = `Uploading... ${Math.round(fraction * 100)}%`;
+                })
+                : await uploadVideoForProcessing(file); // from api.js
+            videoUploadStatus.textContent = `Server: ${queued.message || 'Video queued.'}`;
+            // A re-uploaded video may be answered straight from the server's result cache
+            const result = queued.cached ? queued : await waitForJob(queued.status_url);
+            videoUploadStatus.textContent = 'Server: Video processed successfully.';
             
             if (result.download_url) {
                 const fullDownloadUrl = `${API_BASE_URL}${result.download_url}`; // API_BASE_URL from api.js
@@ -64,6 +75,24 @@ const VideoModule = (() => {
         }
     }
     
+    async function waitForJob(statusUrl) {
+        // Poll the background job until it is done, showing frames processed and ETA
+        while (true) {
+            const job = await getVideoJobStatus(statusUrl); // from api.js
+            if (job.status === 'done') return job;
+            if (job.status === 'failed') throw new Error(job.error || 'Video processing failed.');
+
+            if (job.status === 'running' && job.total_frames) {
+                const percent = Math.floor(100 * job.frames_done / job.total_frames);
+                const eta = job.eta_seconds != null ? `, about ${Math.ceil(job.eta_seconds)}s left` : '';
+                videoUploadStatus.textContent = `Processing... ${job.frames_done}/${job.total_frames} frames (${percent}%)${eta}`;
+            } else {
+                videoUploadStatus.textContent = `Video ${job.status}, waiting for a worker...`;
+            }
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        }
+    }
+
     function resetVideoUploadUI() {
         if (!videoFileInput) queryDOMElements();
         videoFileInput.value = ''; // Clear selected file
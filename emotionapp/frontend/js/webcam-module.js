@@ -2,6 +2,10 @@ const WebcamModule = (() => {
     let stream = null;
     let animationFrameId = null;
     let isProcessingFrame = false;
+    let sessionId = null;
+    let socket = null;
+    let useWebSocket = true; // Falls back to per-frame HTTP POSTs if the socket fails
+    let captureCanvas = null;
 
     // DOM Elements (will be queried when page is active)
     let webcamVideoFeed, webcamOverlayCanvas, webcamStatusMessage, startWebcamBtn, stopWebcamBtn;
@@ -24,6 +28,7 @@ const WebcamModule = (() => {
         try {
             if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
                 stream = await navigator.mediaDevices.getUserMedia({ video: { facingMode: "user" } });
+                sessionId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
                 webcamVideoFeed.srcObject = stream;
                 webcamStatusMessage.textContent = 'Webcam active. Initializing...';
                 startWebcamBtn.style.display = 'none';
@@ -33,6 +38,7 @@ const WebcamModule = (() => {
                     webcamOverlayCanvas.width = webcamVideoFeed.videoWidth;
                     webcamOverlayCanvas.height = webcamVideoFeed.videoHeight;
                     webcamStatusMessage.textContent = 'Processing frames...';
+                    if (useWebSocket) openSocket();
                     startFrameProcessingLoop();
                 };
             } else {
@@ -60,6 +66,11 @@ const WebcamModule = (() => {
             cancelAnimationFrame(animationFrameId);
             animationFrameId = null;
         }
+        if (socket) {
+            socket.onclose = null;
+            socket.close();
+            socket = null;
+        }
         if (webcamVideoFeed) webcamVideoFeed.srcObject = null;
         if (webcamOverlayContext) webcamOverlayContext.clearRect(0, 0, webcamOverlayCanvas.width, webcamOverlayCanvas.height);
         
@@ -70,62 +81,109 @@ const WebcamModule = (() => {
     }
 
     
-    async function processCurrentFrame() {
+    function openSocket() {
+        socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/ws/webcam`); // API_BASE_URL from api.js
+        socket.binaryType = 'arraybuffer';
+        socket.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'detections') {
+                drawDetections(message.detections, message.width, message.height);
+            } else if (message.type === 'error' || message.type === 'busy') {
+                console.warn('Webcam socket:', message);
+            }
+            if (message.type !== 'hello') isProcessingFrame = false;
+        };
+        socket.onerror = () => console.warn('Webcam WebSocket error.');
+        socket.onclose = () => {
+            // Keep working over HTTP if the streaming endpoint is unavailable
+            console.warn('Webcam WebSocket closed, falling back to HTTP uploads.');
+            useWebSocket = false;
+            socket = null;
+            isProcessingFrame = false;
+        };
+    }
+
+    function drawDetections(detections, frameWidth, frameHeight) {
+        if (!webcamOverlayContext || !webcamOverlayCanvas) return;
+        const sx = webcamOverlayCanvas.width / frameWidth;
+        const sy = webcamOverlayCanvas.height / frameHeight;
+        webcamOverlayContext.clearRect(0, 0, webcamOverlayCanvas.width, webcamOverlayCanvas.height);
+        webcamOverlayContext.lineWidth = 2;
+        webcamOverlayContext.strokeStyle = '#00ff00';
+        webcamOverlayContext.fillStyle = '#00ff00';
+        webcamOverlayContext.font = '18px sans-serif';
+        detections.forEach(({ roi, emotion }) => {
+            const [x, y, w, h] = roi;
+            webcamOverlayContext.strokeRect(x * sx, y * sy, w * sx, h * sy);
+            // The canvas is mirrored with CSS, so mirror the text back to keep it readable
+            webcamOverlayContext.save();
+            webcamOverlayContext.scale(-1, 1);
+            webcamOverlayContext.fillText(emotion, -(x + w) * sx, y * sy - 8);
+            webcamOverlayContext.restore();
+        });
+    }
+
+    function captureFrame(callback) {
+        if (!captureCanvas) captureCanvas = document.createElement('canvas');
+        captureCanvas.width = webcamVideoFeed.videoWidth;
+        captureCanvas.height = webcamVideoFeed.videoHeight;
+        captureCanvas.getContext('2d').drawImage(webcamVideoFeed, 0, 0, captureCanvas.width, captureCanvas.height);
+        captureCanvas.toBlob(callback, 'image/jpeg', 0.8);
+    }
+
+    function scheduleNextFrame() {
+        if (stream) animationFrameId = requestAnimationFrame(processCurrentFrame);
+    }
+
+    function processCurrentFrame() {
         if (!stream || webcamVideoFeed.paused || webcamVideoFeed.ended || isProcessingFrame) {
-            if (stream) animationFrameId = requestAnimationFrame(processCurrentFrame);
+            scheduleNextFrame();
             return;
         }
-        isProcessingFrame = true;
+        if (useWebSocket) {
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                // One frame in flight: the next one is sent when its detections arrive
+                isProcessingFrame = true;
+                captureFrame((blob) => {
+                    if (blob && socket && socket.readyState === WebSocket.OPEN) socket.send(blob);
+                    else isProcessingFrame = false;
+                });
+            }
+            scheduleNextFrame();
+            return;
+        }
+        processCurrentFrameOverHttp();
+    }
 
-        const tempCanvas = document.createElement('canvas');
-        tempCanvas.width = webcamVideoFeed.videoWidth;
-        tempCanvas.height = webcamVideoFeed.videoHeight;
-        const tempCtx = tempCanvas.getContext('2d');
-        
-        // REMOVE/COMMENT OUT THESE MIRRORING LINES:
-        // tempCtx.translate(tempCanvas.width, 0);
-        // tempCtx.scale(-1, 1); 
-        
-        tempCtx.drawImage(webcamVideoFeed, 0, 0, tempCanvas.width, tempCanvas.height);
-        
-        // And no need to reset transform if it wasn't applied for capture
-        // tempCtx.setTransform(1, 0, 0, 1, 0, 0); 
+    async function processCurrentFrameOverHttp() {
+        isProcessingFrame = true;
 
         try {
-            tempCanvas.toBlob(async (blob) => {
+            captureFrame(async (blob) => {
                 if (blob) {
-                    const processedImageBlob = await predictWebcamFrame(blob); // from api.js
-                    const imageUrl = URL.createObjectURL(processedImageBlob);
-                    
-                    const img = new Image();
-                    img.onload = () => {
-                        if (webcamOverlayContext && webcamOverlayCanvas) { // Check if context and canvas are still valid
-                            webcamOverlayContext.clearRect(0, 0, webcamOverlayCanvas.width, webcamOverlayCanvas.height);
-                            webcamOverlayContext.drawImage(img, 0, 0, webcamOverlayCanvas.width, webcamOverlayCanvas.height);
-                        }
-                        URL.revokeObjectURL(imageUrl);
+                    try {
+                        // Detections-only JSON: no server-side drawing or JPEG re-encode
+                        const result = await predictWebcamDetections(blob, sessionId); // from api.js
+                        drawDetections(result.detections, result.width, result.height);
                         isProcessingFrame = false;
-                        if (stream) animationFrameId = requestAnimationFrame(processCurrentFrame);
-                    };
-                    img.onerror = () => {
-                        console.error("Error loading processed image onto canvas.");
+                        scheduleNextFrame();
+                    } catch (error) {
+                        console.error('Error processing frame:', error);
+                        if (webcamStatusMessage) webcamStatusMessage.textContent = `Error: ${error.message}. Retrying...`;
                         isProcessingFrame = false;
-                        if (stream) animationFrameId = requestAnimationFrame(processCurrentFrame);
-                    };
-                    img.src = imageUrl;
+                        setTimeout(scheduleNextFrame, 500);
+                    }
                 } else {
                     console.warn("Failed to create blob from canvas for webcam frame.");
                     isProcessingFrame = false;
-                    if (stream) animationFrameId = requestAnimationFrame(processCurrentFrame);
+                    scheduleNextFrame();
                 }
-            }, 'image/jpeg');
+            });
         } catch (error) {
             console.error('Error processing frame:', error);
             if(webcamStatusMessage) webcamStatusMessage.textContent = `Error: ${error.message}. Retrying...`;
             isProcessingFrame = false;
-            setTimeout(() => {
-                if (stream) animationFrameId = requestAnimationFrame(processCurrentFrame);
-            }, 500);
+            setTimeout(scheduleNextFrame, 500);
         }
     }
 
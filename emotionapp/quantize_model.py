@@ -0,0 +1,136 @@
+"""
+Post-training quantization of model_optimal.h5 with an accuracy gate.
+
+    python quantize_model.py --mode int8 --max-accuracy-drop 0.01
+
+Modes:
+    dynamic  int8 weights, float activations (no calibration data needed)
+    int8     full integer model calibrated on a representative sample of data/DATASET/train
+
+The quantized model is evaluated on the same test_generator split as cnn.py (second
+half of data/DATASET/test) and compared with the float Keras model. It is published as
+app/models/model_optimal_<mode>.tflite (plus a .json report) only if the accuracy drop
+is within --max-accuracy-drop; otherwise nothing is written and the exit status is 1.
+Serve it with MODEL_BACKEND=tflite MODEL_PRECISION=<mode>.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from app.backends import TFLiteBackend
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, 'app', 'models', 'model_optimal.h5')
+
+targetx = 100 # Must match cnn.py
+targety = 100
+batch_size = 64
+train_dir = "data/DATASET/train"
+test_dir = "data/DATASET/test"
+
+
+def representative_dataset(num_samples: int):
+    """Calibration images from the training set, preprocessed like the server (rescale only, no augmentation)."""
+    generator = ImageDataGenerator(rescale=1./255).flow_from_directory(
+        train_dir,
+        target_size=(targetx, targety),
+        batch_size=1,
+        class_mode=None,
+        shuffle=True,
+        seed=0,
+    )
+
+    def gen():
+        for _ in range(num_samples):
+            yield [next(generator).astype(np.float32)]
+    return gen
+
+
+def test_generator():
+    """The test split of cnn.py: the 'validation' half of test_dir."""
+    test_datagen = ImageDataGenerator(rescale=1./255, validation_split=0.5)
+    return test_datagen.flow_from_directory(
+        test_dir,
+        target_size=(targetx, targety),
+        batch_size=batch_size,
+        class_mode='categorical',
+        shuffle=False,
+        subset="validation",
+    )
+
+
+def quantize(model, mode: str, calibration_samples: int) -> bytes:
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'int8':
+        converter.representative_dataset = representative_dataset(calibration_samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def tflite_accuracy(model_path: str) -> float:
+    backend = TFLiteBackend(model_path)
+    generator = test_generator()
+    correct = 0
+    for _ in range(len(generator)):
+        images, labels = next(generator)
+        predictions = backend.predict(images.astype(np.float32))
+        correct += int(np.sum(np.argmax(predictions, axis=1) == np.argmax(labels, axis=1)))
+    return correct / generator.samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--mode', choices=['dynamic', 'int8'], default='int8')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help='Largest allowed absolute drop in test accuracy (0.01 = 1 point)')
+    parser.add_argument('--calibration-samples', type=int, default=300)
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    _, float_accuracy = model.evaluate(test_generator(), verbose=0)
+    print("float32 test accuracy = {:.2f}".format(float_accuracy * 100))
+
+    out_dir = os.path.dirname(os.path.abspath(args.model))
+    with tempfile.NamedTemporaryFile(suffix='.tflite', dir=out_dir, delete=False) as tmp:
+        tmp.write(quantize(model, args.mode, args.calibration_samples))
+        candidate_path = tmp.name
+    try:
+        quantized_accuracy = tflite_accuracy(candidate_path)
+        drop = float_accuracy - quantized_accuracy
+        print("{} test accuracy = {:.2f} (drop {:.2f} points, allowed {:.2f})".format(
+            args.mode, quantized_accuracy * 100, drop * 100, args.max_accuracy_drop * 100))
+
+        if drop > args.max_accuracy_drop:
+            print(f"REFUSED: {args.mode} model not published, accuracy drop exceeds the margin.")
+            sys.exit(1)
+
+        base_name = os.path.splitext(os.path.basename(args.model))[0]
+        output_path = os.path.join(out_dir, f'{base_name}_{args.mode}.tflite')
+        os.replace(candidate_path, output_path)
+        with open(os.path.splitext(output_path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'source_model': os.path.basename(args.model),
+                'mode': args.mode,
+                'float_accuracy': float(float_accuracy),
+                'quantized_accuracy': quantized_accuracy,
+                'max_accuracy_drop': args.max_accuracy_drop,
+                'size_bytes': os.path.getsize(output_path),
+            }, f, indent=2)
+        print(f"Published {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+    finally:
+        if os.path.exists(candidate_path):
+            os.remove(candidate_path)
+
+
+if __name__ == '__main__':
+    main()
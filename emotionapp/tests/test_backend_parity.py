@@ -0,0 +1,63 @@
+"""
+Keras vs TFLite/ONNX parity: every exported model (convert_model.py) must classify a fixed
+batch like the original Keras model. Backends whose runtime or model file is missing are
+skipped. benchmarks/bench_backends.py measures the same on real images, with latency.
+
+Run from the emotionapp/ directory:
+    python -m pytest tests
+"""
+import importlib.util
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("tensorflow") # The Keras model is the reference
+
+from app import processing
+from app.backends import load_backend
+
+BATCH_SIZE = 64
+MIN_TOP1_AGREEMENT = 0.99
+MAX_PROBABILITY_DIFF = 1e-3 # Float32 exports only differ by rounding
+
+
+def runtime_available(backend: str) -> bool:
+    if backend == "tflite":
+        return importlib.util.find_spec("tflite_runtime") is not None or importlib.util.find_spec("tensorflow") is not None
+    if backend == "onnx":
+        return importlib.util.find_spec("onnxruntime") is not None
+    return True
+
+
+def load_or_skip(backend: str):
+    if not runtime_available(backend):
+        pytest.skip(f"No runtime installed for the {backend} backend")
+    model_path = processing.model_path_for(backend, precision="float32")
+    if not os.path.exists(model_path):
+        pytest.skip(f"{model_path} not found; export it with convert_model.py")
+    return load_backend(backend, model_path)
+
+
+@pytest.fixture(scope="module")
+def batch() -> np.ndarray:
+    width, height = processing.CNN_INPUT_SIZE
+    return np.random.default_rng(0).random((BATCH_SIZE, height, width, 3), dtype=np.float32)
+
+
+@pytest.fixture(scope="module")
+def reference(batch) -> np.ndarray:
+    return load_or_skip("keras").predict(batch)
+
+
+@pytest.mark.parametrize("backend", ["tflite", "onnx"])
+def test_backend_matches_keras(backend, batch, reference):
+    # Odd-sized chunks also exercise the tflite tensor resize
+    model = load_or_skip(backend)
+    output = np.concatenate([model.predict(batch[i:i + 24]) for i in range(0, len(batch), 24)])
+
+    assert output.shape == reference.shape
+    agreement = np.mean(np.argmax(output, axis=1) == np.argmax(reference, axis=1))
+    assert agreement >= MIN_TOP1_AGREEMENT, f"top-1 agreement {agreement:.2%}"
+    assert np.max(np.abs(output - reference)) <= MAX_PROBABILITY_DIFF
@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from app.chunked import _seek_before, plan_chunks
+
+FPS = 25
+
+
+@pytest.mark.parametrize("total_frames,num_chunks,every_n", [(1000, 4, 5), (997, 3, 5), (120, 8, 7), (500, 1, 5)])
+def test_chunks_cover_the_video_and_start_on_the_cadence(total_frames, num_chunks, every_n):
+    chunks = plan_chunks(total_frames, num_chunks, every_n)
+
+    assert chunks[0][0] == 0 and chunks[-1][1] == total_frames
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    assert all(start < end for start, end in chunks)
+    # Every later chunk starts on a processed frame, so it never needs the previous chunk's detections
+    assert all((start + 1) % every_n == 0 for start, _ in chunks[1:])
+    assert len(chunks) <= num_chunks
+
+
+def test_tiny_videos_are_not_split_below_the_cadence():
+    assert plan_chunks(6, 4, 5) == [(0, 4), (4, 6)]
+    assert plan_chunks(3, 4, 5) == [(0, 3)]
+
+
+@pytest.fixture
+def numbered_clip(tmp_path):
+    """A clip whose frame i is a flat gray of brightness 8 * i, so decoded frames identify themselves."""
+    path = str(tmp_path / "numbered.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), FPS, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("No mp4v encoder in this OpenCV build")
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_seek_positions_the_capture_on_the_chunk_start(numbered_clip):
+    cap = cv2.VideoCapture(numbered_clip)
+    try:
+        if not _seek_before(cap, 19, FPS):
+            pytest.skip("This OpenCV backend cannot seek the clip frame-accurately")
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+    assert ret
+    assert abs(float(frame.mean()) - 8 * 19) < 4
+
+
+def test_seek_is_rejected_when_the_timestamps_disagree(numbered_clip):
+    # With the wrong fps the timestamp of the grabbed frame cannot match, so the caller skips instead
+    cap = cv2.VideoCapture(numbered_clip)
+    try:
+        assert not _seek_before(cap, 19, FPS * 2)
+    finally:
+        cap.release()
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.emotion_cache import EmotionCache, dhash, hamming
+
+HAPPY = np.array([0.1, 0.9], dtype=np.float32)
+SAD = np.array([0.9, 0.1], dtype=np.float32)
+
+
+def gradient_crop(reverse: bool = False):
+    row = np.linspace(0, 255, 48, dtype=np.uint8)
+    crop = np.repeat(np.tile(row[::-1] if reverse else row, (48, 1))[:, :, None], 3, axis=2)
+    return np.ascontiguousarray(crop)
+
+
+def test_dhash_is_stable_under_small_changes():
+    crop = gradient_crop()
+    brighter = np.clip(crop.astype(np.int16) + 10, 0, 255).astype(np.uint8)
+    assert hamming(dhash(crop), dhash(brighter)) <= 2
+    assert hamming(dhash(crop), dhash(gradient_crop(reverse=True))) > 32
+
+
+def test_lookup_hits_while_the_crop_is_similar_and_fresh():
+    cache = EmotionCache(alpha=0.5, hash_threshold=4, max_age_frames=10)
+    assert cache.lookup(1, 0b1111, frame_index=0) is None # Nothing cached yet
+    cache.update(1, 0b1111, HAPPY, frame_index=0)
+
+    assert np.allclose(cache.lookup(1, 0b1111, frame_index=5), HAPPY)
+    assert np.allclose(cache.lookup(1, 0b0111_1111, frame_index=5), HAPPY) # 4 bits off
+    assert cache.lookup(2, 0b1111, frame_index=5) is None # Another track
+
+
+def test_changed_crop_invalidates():
+    cache = EmotionCache(hash_threshold=4, max_age_frames=10)
+    cache.update(1, 0, HAPPY, frame_index=0)
+    assert cache.lookup(1, 0b11111, frame_index=1) is None
+
+
+def test_entries_expire_after_max_age():
+    cache = EmotionCache(max_age_frames=10)
+    cache.update(1, 0, HAPPY, frame_index=0)
+    assert cache.lookup(1, 0, frame_index=9) is not None
+    assert cache.lookup(1, 0, frame_index=10) is None
+    cache.update(1, 0, HAPPY, frame_index=10) # A fresh classification restarts the age
+    assert cache.lookup(1, 0, frame_index=19) is not None
+
+
+def test_update_smooths_and_forget_resets():
+    cache = EmotionCache(alpha=0.25)
+    assert np.allclose(cache.update(1, 0, HAPPY, frame_index=0), HAPPY)
+    assert np.allclose(cache.update(1, 0, SAD, frame_index=1), 0.25 * SAD + 0.75 * HAPPY)
+    cache.forget(1)
+    assert cache.lookup(1, 0, frame_index=2) is None
+    assert np.allclose(cache.update(1, 0, SAD, frame_index=2), SAD)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.executor import BoundedExecutor, ServerBusyError
+
+
+def executor(max_in_flight: int = 4) -> BoundedExecutor:
+    return BoundedExecutor("test", "thread", max_workers=1, max_in_flight=max_in_flight, retry_after=7)
+
+
+def test_admit_rejects_instead_of_queueing():
+    pool = executor(max_in_flight=2)
+
+    async def scenario():
+        async with pool.admit(), pool.admit():
+            with pytest.raises(ServerBusyError) as excinfo:
+                async with pool.admit():
+                    pass
+            assert excinfo.value.retry_after == 7
+        async with pool.admit(): # Slots are given back on exit
+            pass
+
+    asyncio.run(scenario())
+    assert pool.stats()["admitted"] == 3 and pool.stats()["rejected"] == 1 and pool.stats()["in_flight"] == 0
+
+
+def test_admit_reserves_several_slots_at_once():
+    pool = executor(max_in_flight=4)
+
+    async def scenario():
+        async with pool.admit(slots=3):
+            assert pool.stats()["in_flight"] == 3
+            with pytest.raises(ServerBusyError):
+                async with pool.admit(slots=2):
+                    pass
+            async with pool.admit():
+                pass
+        # Larger than the whole limit: still runs on an idle executor, alone
+        async with pool.admit(slots=10):
+            assert pool.stats()["in_flight"] == 4
+
+    asyncio.run(scenario())
+    assert pool.stats()["in_flight"] == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    testclient = pytest.importorskip("fastapi.testclient")
+    from app import main
+    # Saturate the frame executor without running anything
+    monkeypatch.setattr(main.frame_executor, "_in_flight", main.frame_executor.max_in_flight)
+    return testclient.TestClient(main.app)
+
+
+def test_saturated_executor_answers_503_with_retry_after(client):
+    from app import config
+    response = client.post("/predict_webcam", files={"file": ("frame.jpg", b"not decoded", "image/jpeg")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(config.BUSY_RETRY_AFTER_S)
+
+    response = client.post("/predict_webcam_batch",
+                           files=[("files", (f"{i}.jpg", b"not decoded", "image/jpeg")) for i in range(2)])
+    assert response.status_code == 503
@@ -0,0 +1,79 @@
+import sqlite3
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.jobs import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobStore
+
+STALE_AFTER_S = 60
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def enqueue(store, name="clip.mp4"):
+    return store.enqueue(name, f"/staged/{name}", f"/processed/{name}", f"id-{name}")
+
+
+def age_heartbeat(store, job_id, seconds):
+    with sqlite3.connect(store.db_path) as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - seconds, job_id))
+
+
+def test_claims_oldest_queued_job_for_its_owner(store):
+    first, second = enqueue(store, "a.mp4"), enqueue(store, "b.mp4")
+    job = store.claim_next(owner="host:1")
+    assert job["id"] == first
+    assert store.get(first)["status"] == JOB_RUNNING and store.get(first)["owner"] == "host:1"
+    assert store.claim_next(owner="host:2")["id"] == second
+    assert store.claim_next(owner="host:3") is None
+
+
+def test_live_jobs_are_not_requeued(store):
+    job_id = enqueue(store)
+    store.claim_next(owner="host:1")
+    age_heartbeat(store, job_id, STALE_AFTER_S * 2)
+    assert store.heartbeat(owner="host:1") == 1 # The owner is still alive
+    assert store.requeue_interrupted(STALE_AFTER_S) == 0
+    assert store.get(job_id)["status"] == JOB_RUNNING
+
+
+def test_stale_jobs_are_requeued_and_their_owner_loses_them(store):
+    job_id = enqueue(store)
+    store.claim_next(owner="host:1")
+    age_heartbeat(store, job_id, STALE_AFTER_S * 2)
+
+    assert store.requeue_interrupted(STALE_AFTER_S) == 1
+    job = store.get(job_id)
+    assert job["status"] == JOB_QUEUED and job["owner"] is None and job["frames_done"] == 0
+    # The old owner's late progress and result no longer apply
+    assert not store.update_progress(job_id, 10, 100, owner="host:1")
+    assert not store.finish(job_id, owner="host:1")
+    assert store.claim_next(owner="host:2")["id"] == job_id
+    assert store.update_progress(job_id, 10, 100, owner="host:2")
+    assert store.finish(job_id, owner="host:2")
+    assert store.get(job_id)["status"] == JOB_DONE
+
+
+def test_stale_streamed_jobs_fail_instead(store):
+    job = store.start_streaming("live.mp4", "/processed/live.mp4", "id-live", owner="host:1")
+    age_heartbeat(store, job["id"], STALE_AFTER_S * 2)
+    store.requeue_interrupted(STALE_AFTER_S)
+    assert store.get(job["id"])["status"] == JOB_FAILED
+
+
+def test_release_hands_back_only_the_owners_jobs(store):
+    mine, theirs = enqueue(store, "a.mp4"), enqueue(store, "b.mp4")
+    store.claim_next(owner="host:1")
+    store.claim_next(owner="host:2")
+    streamed = store.start_streaming("live.mp4", "/processed/live.mp4", "id-live", owner="host:1")
+
+    assert store.release(owner="host:1") == 1
+    assert store.get(mine)["status"] == JOB_QUEUED
+    assert store.get(theirs)["status"] == JOB_RUNNING
+    assert store.get(streamed["id"])["status"] == JOB_FAILED
@@ -0,0 +1,63 @@
+import itertools
+import os
+import types
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app import result_cache as result_cache_module
+from app.result_cache import ResultCache
+from app.timeline import timeline_path_for
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A clock that always advances, so last_access never ties
+    clock = itertools.count(1000)
+    monkeypatch.setattr(result_cache_module, "time", types.SimpleNamespace(time=lambda: float(next(clock))))
+    return ResultCache(str(tmp_path / "results.sqlite3"), max_bytes=250)
+
+
+def processed(tmp_path, name: str, size: int = 100) -> str:
+    path = str(tmp_path / f"{name}.mp4")
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+def test_hit_and_miss(cache, tmp_path):
+    assert cache.lookup("a") is None
+    cache.put("a", "id-a", processed(tmp_path, "a"), "a.mp4")
+    entry = cache.lookup("a")
+    assert entry["processed_video_id"] == "id-a"
+    assert entry["size_bytes"] == 100
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted_with_its_files(cache, tmp_path):
+    paths = {}
+    for key in ("a", "b"):
+        paths[key] = processed(tmp_path, key)
+        cache.put(key, f"id-{key}", paths[key], f"{key}.mp4")
+    with open(timeline_path_for(paths["b"]), "wb") as f:
+        f.write(b"\0")
+    cache.lookup("a") # b is now the least recently used
+
+    cache.put("c", "id-c", processed(tmp_path, "c"), "c.mp4")
+
+    assert cache.lookup("b") is None
+    assert not os.path.exists(paths["b"]) and not os.path.exists(timeline_path_for(paths["b"]))
+    assert cache.lookup("a") is not None and cache.lookup("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] == 200
+
+
+def test_entry_whose_output_was_deleted_is_a_miss(cache, tmp_path):
+    path = processed(tmp_path, "a")
+    cache.put("a", "id-a", path, "a.mp4")
+    os.remove(path)
+    assert cache.lookup("a") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,94 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.rollups import RollupStore, parse_time
+
+
+def record(timestamp, emotion="HAPPY", confidence=0.8, source="video", video="a.mp4"):
+    return {"timestamp": timestamp, "source": source, "emotion": emotion, "video_filename": video,
+            "confidence": confidence}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RollupStore(str(tmp_path / "rollups.sqlite3"))
+
+
+def test_parse_time_converts_offsets_to_local_naive_time():
+    aware = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert parse_time("2024-05-01T12:00:00Z") == aware.astimezone().replace(tzinfo=None)
+    assert parse_time("2024-05-01T19:00:00+07:00") == aware.astimezone().replace(tzinfo=None)
+    assert parse_time("2024-05-01T12:00:00") == datetime(2024, 5, 1, 12, 0)
+
+
+def test_parse_time_mixes_with_naive_times():
+    # An aware 'from' against the naive datetime.now() default must compare without a TypeError
+    assert parse_time("2000-01-01T00:00:00Z") < datetime.now()
+
+
+def test_parse_time_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
+
+
+def test_upserts_add_up_across_batches(store):
+    minute = datetime(2024, 5, 1, 12, 0, 10)
+    store.write([record(minute), record(minute, emotion="SAD")])
+    store.write([record(minute + timedelta(seconds=20))])
+
+    summary = store.summary(minute - timedelta(hours=1), minute + timedelta(hours=1))
+    assert summary["counts"] == {"HAPPY": 2, "SAD": 1}
+    assert summary["total"] == 3
+    assert summary["distribution"]["HAPPY"] == pytest.approx(2 / 3)
+    videos = store.videos()
+    assert [(v["video"], v["total"]) for v in videos] == [("a.mp4", 3)]
+
+
+def test_summary_buckets_and_filters(store):
+    start = datetime(2024, 5, 1, 12, 0)
+    store.write([record(start + timedelta(minutes=m), source="webcam" if m == 7 else "video") for m in range(10)])
+
+    summary = store.summary(start, start + timedelta(minutes=10), bucket="5m")
+    assert [bucket["total"] for bucket in summary["series"]] == [5, 5]
+    assert store.summary(start, start + timedelta(minutes=10), source="webcam")["total"] == 1
+    assert store.summary(start, start + timedelta(minutes=10), video="other.mp4")["total"] == 0
+
+
+def test_summary_includes_the_partial_last_minute(store):
+    now = datetime(2024, 5, 1, 12, 30, 40)
+    store.write([record(now - timedelta(seconds=30))])
+    assert store.summary(now - timedelta(minutes=5), now)["total"] == 1
+    # A range ending on a minute boundary stays half-open
+    boundary = datetime(2024, 5, 1, 12, 31)
+    store.write([record(boundary)])
+    assert store.summary(now - timedelta(minutes=5), boundary)["total"] == 1
+
+
+def test_mean_confidence_ignores_detections_without_one(store):
+    minute = datetime(2024, 5, 1, 12, 0)
+    store.write([record(minute, confidence=0.9), record(minute, confidence=None),
+                 record(minute, emotion="SAD", confidence=None)])
+
+    summary = store.summary(minute, minute + timedelta(minutes=1))
+    assert summary["counts"] == {"HAPPY": 2, "SAD": 1}
+    assert summary["mean_confidence"]["HAPPY"] == pytest.approx(0.9)
+    assert summary["mean_confidence"]["SAD"] is None
+
+
+def test_stores_without_confidence_counts_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE minute_counts (minute INTEGER NOT NULL, source TEXT NOT NULL, "
+                     "video_filename TEXT NOT NULL, emotion TEXT NOT NULL, count INTEGER NOT NULL, "
+                     "confidence_sum REAL NOT NULL, PRIMARY KEY (minute, source, video_filename, emotion)) WITHOUT ROWID")
+        minute = int(datetime(2024, 5, 1, 12, 0).timestamp() // 60)
+        conn.execute("INSERT INTO minute_counts VALUES (?, 'video', 'a.mp4', 'HAPPY', 2, 1.6)", (minute,))
+    conn.close()
+
+    store = RollupStore(path)
+    store.write([record(datetime(2024, 5, 1, 12, 0, 30), confidence=None)])
+    summary = store.summary(datetime(2024, 5, 1, 12, 0), datetime(2024, 5, 1, 12, 1))
+    assert summary["counts"] == {"HAPPY": 3}
+    assert summary["mean_confidence"]["HAPPY"] == pytest.approx(0.8)
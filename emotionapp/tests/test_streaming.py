@@ -0,0 +1,42 @@
+import struct
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.streaming import needs_seeking
+
+
+def box(box_type: bytes, payload_size: int = 8) -> bytes:
+    return struct.pack(">I4s", 8 + payload_size, box_type) + b"\0" * payload_size
+
+
+FTYP = box(b"ftyp", 16)
+
+
+def test_faststart_mp4_streams():
+    assert not needs_seeking(FTYP + box(b"moov", 64) + box(b"mdat", 256))
+
+
+def test_fragmented_mp4_streams():
+    assert not needs_seeking(FTYP + box(b"moof", 32) + box(b"mdat", 64))
+
+
+def test_moov_after_mdat_needs_seeking():
+    assert needs_seeking(FTYP + box(b"free") + box(b"mdat", 256) + box(b"moov", 64))
+
+
+def test_64_bit_box_sizes_are_followed():
+    large_free = struct.pack(">I4sQ", 1, b"free", 24) + b"\0" * 8
+    assert not needs_seeking(FTYP + large_free + box(b"moov"))
+
+
+def test_header_beyond_the_probed_bytes_needs_seeking():
+    # The ftyp claims more bytes than were read, so moov cannot be found in the head
+    assert needs_seeking(FTYP + struct.pack(">I4s", 1 << 20, b"free"))
+
+
+@pytest.mark.parametrize("head", [b"", b"\x1aE\xdf\xa3" + b"\0" * 60, b"RIFF\0\0\0\0AVI LIST"])
+def test_other_containers_stream(head):
+    assert not needs_seeking(head)
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.processing import EMOTION_LABELS
+from app.timeline import VideoTimeline, query_timeline, timeline_path_for
+
+FPS = 10.0
+
+
+def face(emotion: str, track_id: int = None):
+    detection = {"roi": [1, 2, 30, 30], "emotion": emotion}
+    if track_id is not None:
+        detection["track_id"] = track_id
+    return detection
+
+
+@pytest.fixture
+def timeline_path(tmp_path):
+    """Detections recorded on frames 0, 5, 10 and 15 (t = 0.0, 0.5, 1.0, 1.5 s); nobody on frame 10."""
+    timeline = VideoTimeline(fps=FPS)
+    first = [face(EMOTION_LABELS[0], track_id=1)]
+    timeline.add(0, first)
+    timeline.add(1, first) # Reused detections are not recorded again
+    timeline.add(5, [face(EMOTION_LABELS[1], track_id=1), face("Error", track_id=2)])
+    timeline.add(10, [])
+    timeline.add(15, [face(EMOTION_LABELS[2])])
+    path = timeline_path_for(str(tmp_path / "video.mp4"))
+    assert timeline.save(path) == 5
+    return path
+
+
+def frame_indexes(frames):
+    return [frame["frame_index"] for frame in frames]
+
+
+def test_timeline_path_sits_next_to_the_video():
+    assert timeline_path_for("processed/abc.mp4") == "processed/abc.timeline.npy"
+
+
+def test_whole_timeline(timeline_path):
+    frames = query_timeline(timeline_path)
+    assert frame_indexes(frames) == [0, 5, 10, 15]
+    assert [d["track_id"] for d in frames[1]["detections"]] == [1, 2]
+    assert frames[1]["detections"][1]["emotion"] == "Error"
+    assert frames[2]["detections"] == [] # Everybody left
+    assert "track_id" not in frames[3]["detections"][0]
+
+
+def test_range_is_half_open(timeline_path):
+    assert frame_indexes(query_timeline(timeline_path, 0.5, 1.5)) == [5, 10]
+    assert frame_indexes(query_timeline(timeline_path, end_s=0.5)) == [0]
+
+
+def test_start_between_recorded_frames_includes_the_frame_in_effect(timeline_path):
+    # Frames 6..9 reuse frame 5's detections, so a range starting at 0.7 s begins with frame 5
+    assert frame_indexes(query_timeline(timeline_path, 0.7, 1.2)) == [5, 10]
+    assert frame_indexes(query_timeline(timeline_path, 0.5, 1.2)) == [5, 10]
+
+
+def test_ranges_past_either_end(timeline_path):
+    assert frame_indexes(query_timeline(timeline_path, 9.0)) == [15] # Last frame stays in effect
+    assert query_timeline(timeline_path, end_s=0.0) == []
+    assert frame_indexes(query_timeline(timeline_path, -1.0, 0.1)) == [0]
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from app.tracker import FaceTracker, Track, box_iou
+
+
+def tracker_with(*boxes, iou_threshold: float = 0.3) -> FaceTracker:
+    tracker = FaceTracker(iou_threshold=iou_threshold)
+    tracker.tracks = [Track(track_id, box, frame_index=0) for track_id, box in enumerate(boxes, start=1)]
+    return tracker
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == pytest.approx(1.0)
+    assert box_iou([0, 0, 10, 10], [5, 0, 10, 10]) == pytest.approx(50 / 150)
+    assert box_iou([0, 0, 10, 10], [20, 20, 10, 10]) == 0.0
+    assert box_iou([0, 0, 0, 0], [0, 0, 0, 0]) == 0.0
+
+
+def test_overlapping_detections_follow_their_tracks():
+    tracker = tracker_with([0, 0, 100, 100], [300, 0, 100, 100])
+    matches, unmatched = tracker._associate([[305, 5, 100, 100], [5, 0, 100, 100]])
+    assert sorted(matches) == [(0, 1), (1, 0)]
+    assert unmatched == []
+
+
+def test_fast_motion_falls_back_to_centroid_distance():
+    # Moved diagonally by a third of its size: IoU ~0.29 is below the threshold, but the
+    # centres are ~57 px apart, less than half the box width
+    tracker = tracker_with([0, 0, 120, 120])
+    assert box_iou([0, 0, 120, 120], [40, 40, 120, 120]) < 0.3
+    matches, unmatched = tracker._associate([[40, 40, 120, 120]])
+    assert matches == [(0, 0)]
+    assert unmatched == []
+
+
+def test_far_detections_start_new_tracks():
+    tracker = tracker_with([0, 0, 100, 100])
+    matches, unmatched = tracker._associate([[400, 300, 100, 100]])
+    assert matches == []
+    assert unmatched == [0]
+
+
+def test_each_track_and_face_is_matched_once_best_iou_first():
+    tracker = tracker_with([0, 0, 100, 100])
+    matches, unmatched = tracker._associate([[30, 0, 100, 100], [5, 0, 100, 100]])
+    assert matches == [(0, 1)]
+    assert unmatched == [0]
+
+
+def test_iou_matches_win_over_centroid_matches():
+    # Face 0 only reaches track 0 by centroid distance; face 1 overlaps it properly
+    tracker = tracker_with([0, 0, 100, 100])
+    matches, unmatched = tracker._associate([[35, 35, 100, 100], [10, 0, 100, 100]])
+    assert matches == [(0, 1)]
+    assert unmatched == [0]
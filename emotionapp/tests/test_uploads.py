@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+import pytest
+
+from app.uploads import UPLOAD_FINALIZED, UPLOAD_OPEN, UploadError, UploadStore, merge_ranges
+
+DATA = bytes(range(256)) * 40 # 10 KiB
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / "uploads.sqlite3"), str(tmp_path / "staging"), ttl_s=3600)
+
+
+def put_chunk(store, upload, offset, data):
+    """What PUT /uploads/{id} does once a chunk's body has been read and checked."""
+    store.open_chunk(upload["upload_id"], offset, len(data))
+    path = store.get(upload["upload_id"])["path"]
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        store.write_at(fd, data, offset)
+    finally:
+        os.close(fd)
+    store.commit_chunk(upload["upload_id"], offset, len(data))
+
+
+def test_merge_ranges_coalesces_overlapping_and_adjacent_chunks():
+    assert merge_ranges([]) == []
+    assert merge_ranges([(100, 50), (0, 100), (300, 10)]) == [[0, 150], [300, 310]]
+    assert merge_ranges([(0, 100), (50, 20), (0, 100)]) == [[0, 100]] # Contained and retried chunks
+
+
+def test_out_of_order_chunks_complete_the_upload(store):
+    upload = store.create("clip.mp4", len(DATA), hashlib.sha256(DATA).hexdigest())
+    for offset in (8192, 0, 4096):
+        put_chunk(store, upload, offset, DATA[offset:offset + 4096])
+
+    status = store.status(upload["upload_id"])
+    assert status["received"] == [[0, len(DATA)]]
+    assert status["complete"]
+    row, sha256 = store.finalize(upload["upload_id"])
+    assert sha256 == hashlib.sha256(DATA).hexdigest()
+    assert store.get(upload["upload_id"])["status"] == UPLOAD_FINALIZED
+    with open(row["path"], "rb") as f:
+        assert f.read() == DATA
+
+
+def test_chunks_outside_the_file_are_rejected(store):
+    upload = store.create("clip.mp4", len(DATA))
+    with pytest.raises(UploadError) as excinfo:
+        store.open_chunk(upload["upload_id"], len(DATA) - 10, 20)
+    assert excinfo.value.status_code == 416
+    with pytest.raises(UploadError) as excinfo:
+        store.open_chunk("missing", 0, 10)
+    assert excinfo.value.status_code == 404
+
+
+def test_discarded_chunk_has_to_be_sent_again(store):
+    # A chunk whose X-Chunk-SHA256 did not match was already written in place
+    upload = store.create("clip.mp4", len(DATA))
+    put_chunk(store, upload, 0, DATA[:4096])
+    put_chunk(store, upload, 4096, DATA[4096:])
+    store.discard_range(upload["upload_id"], 4096, 1000)
+
+    status = store.status(upload["upload_id"])
+    assert status["received"] == [[0, 4096]]
+    assert not status["complete"]
+    with pytest.raises(UploadError) as excinfo:
+        store.finalize(upload["upload_id"])
+    assert excinfo.value.status_code == 409
+
+
+def test_finalize_rejects_a_whole_file_checksum_mismatch(store):
+    upload = store.create("clip.mp4", len(DATA), hashlib.sha256(b"something else").hexdigest())
+    put_chunk(store, upload, 0, DATA[:5000])
+    put_chunk(store, upload, 5000, b"\0" * (len(DATA) - 5000))
+
+    with pytest.raises(UploadError) as excinfo:
+        store.finalize(upload["upload_id"])
+    assert excinfo.value.status_code == 422
+    # Back to open, so the client can re-send chunks and finalize again
+    assert store.get(upload["upload_id"])["status"] == UPLOAD_OPEN
+
+
+def test_stale_uploads_expire_with_their_staging_file(store):
+    upload = store.create("clip.mp4", len(DATA))
+    path = store.get(upload["upload_id"])["path"]
+    store.ttl_s = -1
+    assert store.expire_stale() == 1
+    assert store.get(upload["upload_id"]) is None
+    assert not os.path.exists(path)